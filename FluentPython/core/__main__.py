@@ -1,9 +1,25 @@
 from pathlib import Path
 
 from loguru import logger
-from typer import Typer
+from typer import Typer, confirm
 
+from FluentPython.core.agent import RemoteConfig, run_agent
+from FluentPython.core.cleanup import (GcPolicy, environment_usage, plan_gc,
+                                       protected_environments, run_gc)
 from FluentPython.core.config import _GlobalConfig
+from FluentPython.core.jobs import Priority, get_scheduler
+from FluentPython.core.kernels import get_host_version, sync_kernelspecs
+from FluentPython.core.packages import (parse_requirements_file, plan_sync,
+                                        sync_environment)
+from FluentPython.core.pkgindex import get_package_index
+from FluentPython.core.pool import get_pool
+from FluentPython.core.precompile import precompile_environment
+from FluentPython.core.readiness import launch_history
+from FluentPython.core.server import serve
+from FluentPython.core.sessions import (live_sessions, set_keep_alive,
+                                        stop_session)
+from FluentPython.core.snapshot import (export_environment,
+                                        import_environment)
 from FluentPython.core.utils import query_interpreter_version
 
 app = Typer()
@@ -42,7 +58,10 @@ def remake_config():
 
 @app.command("create")
 def create_env(name: str):
-    ver = cfg.create_environment(name)
+    ver = get_scheduler().run(f"create {name}",
+                              lambda job: cfg.create_environment(name),
+                              priority=Priority.INTERACTIVE,
+                              resources=("disk", ))
     logger.info(f"Created environment {name} with version {ver}.")
 
 
@@ -66,9 +85,237 @@ def remove_env():
         logger.error("Invalid choice.")
         return
 
-    cfg.remove_environment(versions[choice])
+    ver = versions[choice]
+    get_scheduler().run(f"remove {ver.name}",
+                        lambda job: cfg.remove_environment(ver),
+                        priority=Priority.INTERACTIVE,
+                        resources=("disk", ))
     logger.info(f"Removed environment {versions[choice]}.")
 
 
+@app.command("kernels")
+def sync_kernels(create_host: bool = False):
+    host = get_host_version(cfg, create=create_host)
+    if host is None:
+        logger.error(
+            f"Jupyter host environment {cfg.cfg.jupyter_host_environment} does not exist; use --create-host"
+        )
+        return
+
+    added, removed = sync_kernelspecs(cfg, host)
+    logger.info(
+        f"Kernelspecs synced into {host.name}: {len(added)} added, {len(removed)} removed."
+    )
+
+
+@app.command("sync")
+def sync_env(env: str, requirements: Path, dry_run: bool = False):
+    ver = cfg.get_version(env)
+    if ver is None:
+        logger.error(f"Environment {env} not found.")
+        return
+
+    if dry_run:
+        plan = plan_sync(ver, parse_requirements_file(requirements))
+    else:
+        cfg.mark_used(ver)
+        plan = get_scheduler().run(
+            f"sync {ver.name}",
+            lambda job: sync_environment(ver, requirements, cfg.cfg, job),
+            resources=(f"pip:{ver.name}", ))
+
+    for req in plan.install:
+        logger.info(f"+ {req}")
+    for name in plan.remove:
+        logger.info(f"- {name}")
+    logger.info(
+        f"{'Would sync' if dry_run else 'Synced'} {ver.name}: {len(plan.install)} to install, {len(plan.remove)} to remove."
+    )
+
+
+@app.command("doctor")
+def doctor(purge: bool = False):
+    restored, purged = cfg.doctor(purge=purge)
+    logger.info(
+        f"Doctor finished: {len(restored)} restored, {len(purged)} purged.")
+    if not purge:
+        logger.info("Run with --purge to delete what could not be restored.")
+
+
+@app.command("export")
+def export_env(env: str, out: Path, level: int = 3, threads: int = -1):
+    ver = cfg.get_version(env)
+    if ver is None:
+        logger.error(f"Environment {env} not found.")
+        return
+
+    manifest = get_scheduler().run(
+        f"export {ver.name}",
+        lambda job: export_environment(ver, out, level=level, threads=threads),
+        priority=Priority.BULK,
+        resources=("disk", ))
+    logger.info(
+        f"Exported {ver.name} ({len(manifest.distributions)} distributions) to {out}."
+    )
+
+
+@app.command("import")
+def import_env(archive: Path,
+               name: str | None = None,
+               interpreter: str | None = None):
+    ver = get_scheduler().run(
+        f"import {archive.name}",
+        lambda job: import_environment(
+            cfg, archive, name=name, interpreter=interpreter),
+        priority=Priority.BULK,
+        resources=("disk", ))
+    logger.info(f"Imported environment {ver.name} with version {ver.version}.")
+
+
+@app.command("precompile")
+def precompile_env(env: str, workers: int = 0, optimize: list[int] = [0]):
+    ver = cfg.get_version(env)
+    if ver is None:
+        logger.error(f"Environment {env} not found.")
+        return
+
+    get_scheduler().run(f"precompile {ver.name}",
+                        lambda job: precompile_environment(
+                            ver, workers=workers, optimize_levels=optimize),
+                        priority=Priority.BULK,
+                        resources=("disk", ))
+
+
+@app.command("launches")
+def list_launches(env: str | None = None, last: int = 20):
+    for rec in launch_history(env)[-last:]:
+        logger.info(
+            f"{rec.environment} [{rec.kind}]: ready in {rec.seconds:.2f}s")
+
+
+@app.command("sessions")
+def list_sessions(stop: str | None = None,
+                  keep_alive: str | None = None,
+                  release: str | None = None):
+    for session_id, pinned in ((keep_alive, True), (release, False)):
+        if session_id is not None and not set_keep_alive(session_id, pinned):
+            logger.error(f"Session {session_id} not found")
+
+    for record in live_sessions():
+        if stop is not None and record.id == stop:
+            logger.info(f"Stopping session {record.id}")
+            stop_session(record)
+            continue
+        logger.info(
+            f"{record.id} [pid {record.pid}]{' [keep-alive]' if record.keep_alive else ''}: "
+            f"{record.title} (log: {record.log_dir})")
+
+
+@app.command("which-env")
+def which_env(package: str):
+    index = get_package_index()
+    index.update(cfg.list_versions())
+    matches = index.which(package)
+    for m in matches:
+        logger.info(f"{m.environment}: {m.name}=={m.version}")
+    if not matches:
+        logger.info(f"No environment has {package}")
+
+
+@app.command("serve")
+def serve_sessions(host: str = "127.0.0.1", port: int = 8765):
+    serve(cfg, host, port)
+
+
+@app.command("gc")
+def collect_garbage(unused_days: float | None = None,
+                    keep: int | None = None,
+                    budget_gb: float | None = None,
+                    dry_run: bool = False,
+                    yes: bool = False):
+    policy = GcPolicy(unused_days=unused_days,
+                      keep=keep,
+                      disk_budget=int(budget_gb * 1024**3)
+                      if budget_gb is not None else None)
+    if policy == GcPolicy():
+        logger.error(
+            "Specify at least one of --unused-days, --keep or --budget-gb.")
+        return
+
+    plan = plan_gc(environment_usage(cfg), policy,
+                   protected_environments(cfg))
+    for u, reason in plan.remove:
+        logger.info(
+            f"- {u.version.name}: {u.size / 1024**2:.0f} MB, {reason}")
+    for u in plan.keep:
+        logger.info(f"  {u.version.name}: {u.size / 1024**2:.0f} MB, kept")
+    logger.info(
+        f"{len(plan.remove)} environments to remove, freeing {plan.freed / 1024**2:.0f} MB."
+    )
+
+    if dry_run or not plan.remove:
+        return
+    if not yes and not confirm("Remove these environments?"):
+        return
+
+    for job in run_gc(cfg, plan):
+        try:
+            job.wait()
+        except Exception as e:
+            logger.error(f"{job.title} failed: {e}")
+
+
+@app.command("agent")
+def serve_agent():
+    run_agent(cfg)
+
+
+@app.command("remote")
+def list_remote(host: str):
+    command = cfg.cfg.remote_hosts.get(host)
+    if command is None:
+        logger.error(f"No remote host {host} in remote_hosts")
+        return
+
+    remote = RemoteConfig(command)
+    try:
+        versions, sessions = remote.batch([("list_versions", ),
+                                           ("sessions.list", )])
+    finally:
+        remote.close()
+    for ver in versions:
+        logger.info(f"Version: {ver['name']} {ver['envdir']}")
+    for record in sessions:
+        logger.info(f"Session: {record['id']} [pid {record['pid']}]: "
+                    f"{record['title']}")
+
+
+@app.command("pool")
+def manage_pool(fill: bool = False, drain: bool = False):
+    pool = get_pool(cfg)
+    if drain:
+        pool.drain()
+        logger.info("Drained the environment pool.")
+        return
+    if fill:
+        if not cfg.cfg.pool_size:
+            logger.error("Set pool_size in the config to enable the pool.")
+            return
+        get_scheduler().run("refill environment pool",
+                            pool.refill,
+                            priority=Priority.BULK,
+                            resources=("disk", ))
+
+    for interpreter in pool.wanted_interpreters():
+        try:
+            version = query_interpreter_version(Path(interpreter))
+        except Exception as e:
+            logger.error(f"{interpreter}: {e}")
+            continue
+        logger.info(
+            f"{interpreter}: {len(pool.ready(interpreter, version))}/{cfg.cfg.pool_size} ready"
+        )
+
+
 if __name__ == "__main__":
     app()
@@ -0,0 +1,395 @@
+import inspect
+import itertools
+import json
+import os
+import subprocess
+import sys
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from dataclasses import dataclass
+from typing import TYPE_CHECKING, Any, Callable, Protocol
+
+from loguru import logger
+
+from FluentPython.globals import OperationFailure
+
+if TYPE_CHECKING:
+    from FluentPython.core.config import ConfigObj, _GlobalConfig
+
+# JSON-RPC 2.0 error codes
+PARSE_ERROR = -32700
+INVALID_REQUEST = -32600
+METHOD_NOT_FOUND = -32601
+INVALID_PARAMS = -32602
+OPERATION_FAILED = -32000
+
+
+@dataclass(frozen=True, slots=True)
+class RemoteVersion:
+    """An environment on an agent's host; paths are the host's."""
+
+    name: str
+    version: tuple[int, int, int]
+    hash: str
+    envdir: str
+    py_executable: str
+    site_packages: str
+
+
+class EnvironmentBackend(Protocol):
+    """What the GUI and CLI need from a local or remote environment store."""
+
+    @property
+    def cfg(self) -> "ConfigObj":
+        ...
+
+    def list_versions(self) -> list:
+        ...
+
+    def get_version(self, name: str):
+        ...
+
+    def create_environment(self, name: str, interpreter=None):
+        ...
+
+    def remove_environment(self, version) -> None:
+        ...
+
+
+def _version_dict(ver) -> dict:
+    return {
+        "name": ver.name,
+        "version": list(ver.version),
+        "hash": ver.hash,
+        "envdir": str(ver.envdir),
+        "py_executable": str(ver.py_executable),
+        "site_packages": str(ver.site_packages),
+    }
+
+
+class Agent:
+    """Serves a `_GlobalConfig` as line-delimited JSON-RPC 2.0.
+
+    Each line is a request or a batch (array) of requests. Lines are
+    handled concurrently, so a client may pipeline requests and match the
+    responses by id.
+    """
+
+    def __init__(self, gcfg: "_GlobalConfig", workers: int = 4):
+        self.gcfg = gcfg
+        self._pool = ThreadPoolExecutor(max_workers=workers)
+        # batch items get their own workers: a line's worker blocks on them
+        self._batch_pool = ThreadPoolExecutor(max_workers=workers)
+        self._write_lock = threading.Lock()
+        self.methods: dict[str, Callable[..., Any]] = {
+            "ping": lambda: "pong",
+            "config": lambda: self.gcfg.cfg.model_dump(),
+            "list_versions": self.list_versions,
+            "get_version": self.get_version,
+            "create_environment": self.create_environment,
+            "remove_environment": self.remove_environment,
+            "probe": self.probe,
+            "sessions.list": self.list_sessions,
+            "sessions.start": self.start_session,
+            "sessions.stop": self.stop_session,
+        }
+
+    def list_versions(self):
+        return [_version_dict(v) for v in self.gcfg.list_versions()]
+
+    def get_version(self, name: str):
+        ver = self.gcfg.get_version(name)
+        return _version_dict(ver) if ver is not None else None
+
+    def create_environment(self, name: str, interpreter: str | None = None):
+        return _version_dict(self.gcfg.create_environment(name, interpreter))
+
+    def remove_environment(self, name: str):
+        ver = self.gcfg.get_version(name)
+        if ver is None:
+            raise OperationFailure(f"Environment {name} not found")
+        self.gcfg.remove_environment(ver)
+
+    def probe(self, interpreter: str, modules: list[str] | None = None):
+        from FluentPython.core.introspect import introspect
+        return introspect(interpreter, tuple(modules or ())).model_dump()
+
+    def list_sessions(self):
+        from FluentPython.core.sessions import live_sessions
+        return [r.model_dump() for r in live_sessions()]
+
+    def start_session(self, environment: str, kind: str = "jupyterlab"):
+        from FluentPython.core.server import headless_command
+        from FluentPython.core.sessions import launch_detached
+
+        ver = self.gcfg.get_version(environment)
+        if ver is None:
+            raise OperationFailure(f"Environment {environment} not found")
+        self.gcfg.mark_used(ver)
+        record, _ = launch_detached(headless_command(ver, kind),
+                                    title=f"{kind}[{ver.name}]",
+                                    cfg=self.gcfg.cfg,
+                                    environment=ver.name,
+                                    kind=kind)
+        return record.model_dump()
+
+    def stop_session(self, session_id: str):
+        from FluentPython.core.sessions import live_sessions, stop_session
+        for record in live_sessions():
+            if record.id == session_id:
+                return stop_session(record)
+        raise OperationFailure(f"Session {session_id} not found")
+
+    def handle(self, request) -> dict | None:
+        """One JSON-RPC request; None for notifications, even failed ones."""
+        if not isinstance(request, dict) or not isinstance(
+                request.get("method"), str):
+            return _error(None, INVALID_REQUEST, "Invalid request")
+
+        req_id = request.get("id")
+        result, error = self._call(request)
+        if "id" not in request:
+            if error is not None:
+                logger.warning(f"Notification {request['method']} failed: "
+                               f"{error['message']}")
+            return None
+        if error is not None:
+            return _error(req_id, **error)
+        return {"jsonrpc": "2.0", "id": req_id, "result": result}
+
+    def _call(self, request: dict) -> tuple[Any, dict | None]:
+        method = self.methods.get(request["method"])
+        if method is None:
+            return None, {
+                "code": METHOD_NOT_FOUND,
+                "message": f"Unknown method {request['method']}"
+            }
+
+        params = request.get("params", [])
+        if isinstance(params, dict):
+            args, kwargs = [], params
+        elif isinstance(params, list):
+            args, kwargs = params, {}
+        else:
+            return None, {
+                "code": INVALID_PARAMS,
+                "message": "params must be an array or an object"
+            }
+        # checked up front, so a TypeError raised inside is not mistaken
+        # for a bad call
+        try:
+            inspect.signature(method).bind(*args, **kwargs)
+        except TypeError as e:
+            return None, {"code": INVALID_PARAMS, "message": str(e)}
+
+        try:
+            return method(*args, **kwargs), None
+        except (OperationFailure, OSError, ValueError) as e:
+            return None, {"code": OPERATION_FAILED, "message": str(e)}
+        except Exception as e:
+            logger.exception(e)
+            return None, {"code": OPERATION_FAILED, "message": repr(e)}
+
+    def handle_line(self, line: str) -> list | dict | None:
+        try:
+            message = json.loads(line)
+        except json.JSONDecodeError as e:
+            return _error(None, PARSE_ERROR, str(e))
+
+        if isinstance(message, list):
+            if not message:
+                return _error(None, INVALID_REQUEST, "Empty batch")
+            responses = [
+                r for r in self._batch_pool.map(self.handle, message)
+                if r is not None
+            ]
+            return responses or None
+        return self.handle(message)
+
+    def serve(self, rfile, wfile):
+        def respond(line: str):
+            response = self.handle_line(line)
+            if response is None:
+                return
+            data = json.dumps(response, ensure_ascii=False) + "\n"
+            with self._write_lock:
+                wfile.write(data)
+                wfile.flush()
+
+        for line in rfile:
+            if line.strip():
+                self._pool.submit(respond, line)
+        self._pool.shutdown(wait=True)
+        self._batch_pool.shutdown(wait=True)
+
+
+def _error(req_id, code: int, message: str) -> dict:
+    return {
+        "jsonrpc": "2.0",
+        "id": req_id,
+        "error": {
+            "code": code,
+            "message": message
+        }
+    }
+
+
+def run_agent(gcfg: "_GlobalConfig"):
+    """Serve on stdin/stdout; stray writes to fd 1 are sent to stderr."""
+    protocol_out = os.fdopen(os.dup(sys.stdout.fileno()),
+                             "w",
+                             encoding="utf-8")
+    os.dup2(sys.stderr.fileno(), sys.stdout.fileno())
+    logger.info("FluentPython agent ready")
+    Agent(gcfg, workers=gcfg.cfg.job_workers).serve(
+        sys.stdin, protocol_out)
+
+
+class RemoteConfig:
+    """Client for an agent reachable through `command` (e.g. over ssh).
+
+    Mirrors `_GlobalConfig`'s environment methods and the agent's probe
+    and session calls. Requests are pipelined on one connection; `batch()`
+    sends several calls in one round trip.
+    """
+
+    def __init__(self, command: list[str]):
+        self.command = command
+        self._ids = itertools.count(1)
+        self._pending: dict[int, Future] = {}
+        self._lock = threading.Lock()
+        self._config = None
+
+        self._proc = subprocess.Popen(command,
+                                      stdin=subprocess.PIPE,
+                                      stdout=subprocess.PIPE,
+                                      text=True,
+                                      encoding="utf-8",
+                                      bufsize=1)
+        threading.Thread(target=self._read,
+                         name="RemoteConfigReader",
+                         daemon=True).start()
+
+    def _read(self):
+        assert self._proc.stdout is not None
+        for line in self._proc.stdout:
+            try:
+                message = json.loads(line)
+            except json.JSONDecodeError:
+                logger.warning(f"Malformed agent output: {line!r}")
+                continue
+            for response in message if isinstance(message, list) else [
+                    message
+            ]:
+                with self._lock:
+                    future = self._pending.pop(response.get("id"), None)
+                if future is None:
+                    logger.warning(f"Unexpected agent response: {response}")
+                    continue
+                if "error" in response:
+                    future.set_exception(
+                        OperationFailure(response["error"]["message"]))
+                else:
+                    future.set_result(response.get("result"))
+
+        with self._lock:
+            pending, self._pending = self._pending, {}
+        for future in pending.values():
+            future.set_exception(
+                OperationFailure(f"Agent {self.command} exited"))
+
+    def _send(self, payload):
+        assert self._proc.stdin is not None
+        try:
+            self._proc.stdin.write(json.dumps(payload) + "\n")
+            self._proc.stdin.flush()
+        except (BrokenPipeError, OSError) as e:
+            raise OperationFailure(f"Agent {self.command} is gone: {e}")
+
+    def _request(self, method: str, params) -> tuple[dict, Future]:
+        req_id = next(self._ids)
+        future = Future()
+        with self._lock:
+            self._pending[req_id] = future
+        return {
+            "jsonrpc": "2.0",
+            "id": req_id,
+            "method": method,
+            "params": params
+        }, future
+
+    def submit(self, method: str, *params) -> Future:
+        """Send one call without waiting; later calls are pipelined behind it."""
+        request, future = self._request(method, list(params))
+        self._send(request)
+        return future
+
+    def call(self, method: str, *params):
+        return self.submit(method, *params).result()
+
+    def batch(self, calls: list[tuple]) -> list:
+        """Run `(method, *params)` calls in a single round trip."""
+        requests, futures = [], []
+        for method, *params in calls:
+            request, future = self._request(method, params)
+            requests.append(request)
+            futures.append(future)
+        self._send(requests)
+        return [f.result() for f in futures]
+
+    @property
+    def cfg(self) -> "ConfigObj":
+        if self._config is None:
+            from FluentPython.core.config import ConfigObj
+            self._config = ConfigObj.model_validate(self.call("config"))
+        return self._config
+
+    @staticmethod
+    def _version(raw: dict | None) -> RemoteVersion | None:
+        if raw is None:
+            return None
+        return RemoteVersion(**{**raw, "version": tuple(raw["version"])})
+
+    def list_versions(self) -> list[RemoteVersion]:
+        return [self._version(v) for v in self.call("list_versions")]
+
+    def get_version(self, name: str) -> RemoteVersion | None:
+        return self._version(self.call("get_version", name))
+
+    def create_environment(self, name: str,
+                           interpreter: str | None = None) -> RemoteVersion:
+        return self._version(self.call("create_environment", name,
+                                       interpreter))
+
+    def remove_environment(self, version: RemoteVersion | str):
+        name = version if isinstance(version, str) else version.name
+        self.call("remove_environment", name)
+
+    def probe(self, interpreter: str, modules: list[str] | None = None):
+        from FluentPython.core.introspect import InterpreterInfo
+        return InterpreterInfo.model_validate(
+            self.call("probe", interpreter, modules))
+
+    def list_sessions(self):
+        from FluentPython.core.sessions import SessionRecord
+        return [
+            SessionRecord.model_validate(r)
+            for r in self.call("sessions.list")
+        ]
+
+    def start_session(self, environment: str, kind: str = "jupyterlab"):
+        from FluentPython.core.sessions import SessionRecord
+        return SessionRecord.model_validate(
+            self.call("sessions.start", environment, kind))
+
+    def stop_session(self, session_id: str) -> list[int]:
+        """Stop a session on the agent's host; returns the stragglers."""
+        return self.call("sessions.stop", session_id)
+
+    def close(self):
+        if self._proc.stdin is not None:
+            self._proc.stdin.close()
+        try:
+            self._proc.wait(timeout=10)
+        except subprocess.TimeoutExpired:
+            self._proc.kill()
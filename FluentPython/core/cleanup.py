@@ -0,0 +1,131 @@
+import os
+import time
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import TYPE_CHECKING
+
+from loguru import logger
+
+from FluentPython.core.jobs import Job, Priority, get_scheduler
+from FluentPython.core.sessions import live_sessions
+
+if TYPE_CHECKING:
+    from FluentPython.core.config import FluentPyVersion, _GlobalConfig
+
+DAY = 24 * 3600
+
+
+@dataclass
+class EnvironmentUsage:
+    version: "FluentPyVersion"
+    last_used: float
+    size: int
+
+
+@dataclass
+class GcPolicy:
+    """Which environments to collect; every unset rule is ignored."""
+
+    unused_days: float | None = None
+    keep: int | None = None
+    disk_budget: int | None = None
+
+
+@dataclass
+class GcPlan:
+    remove: list[tuple[EnvironmentUsage, str]] = field(default_factory=list)
+    keep: list[EnvironmentUsage] = field(default_factory=list)
+
+    @property
+    def freed(self) -> int:
+        return sum(u.size for u, _ in self.remove)
+
+
+def directory_size(path: Path) -> int:
+    total = 0
+    stack = [path]
+    while stack:
+        try:
+            entries = os.scandir(stack.pop())
+        except OSError:
+            continue
+        with entries:
+            for entry in entries:
+                try:
+                    if entry.is_dir(follow_symlinks=False):
+                        stack.append(Path(entry.path))
+                    else:
+                        total += entry.stat(follow_symlinks=False).st_size
+                except OSError:
+                    pass
+    return total
+
+
+def environment_usage(gcfg: "_GlobalConfig") -> list[EnvironmentUsage]:
+    """Every environment with its last use and disk size, most recent first."""
+    res = [
+        EnvironmentUsage(ver, gcfg.last_used(ver), directory_size(ver.envdir))
+        for ver in gcfg.list_versions()
+    ]
+    return sorted(res, key=lambda u: u.last_used, reverse=True)
+
+
+def protected_environments(gcfg: "_GlobalConfig") -> set[str]:
+    """Environments gc never removes: the Jupyter host and those in use."""
+    res = {gcfg.cfg.jupyter_host_environment}
+    res.update(r.environment for r in live_sessions()
+               if r.environment is not None)
+    return res
+
+
+def plan_gc(usages: list[EnvironmentUsage], policy: GcPolicy,
+            protected: set[str]) -> GcPlan:
+    """Pick environments to remove; `usages` must be most recent first."""
+    now = time.time()
+    reasons: dict[str, str] = {}
+
+    if policy.unused_days is not None:
+        for u in usages:
+            idle_days = (now - u.last_used) / DAY
+            if idle_days > policy.unused_days:
+                reasons[u.version.name] = f"unused for {idle_days:.0f} days"
+
+    if policy.keep is not None:
+        for u in usages[policy.keep:]:
+            reasons.setdefault(u.version.name,
+                               f"not among the {policy.keep} most recent")
+
+    if policy.disk_budget is not None:
+        total = sum(u.size for u in usages
+                    if u.version.name not in reasons)
+        # evict least recently used first
+        for u in reversed(usages):
+            if total <= policy.disk_budget:
+                break
+            if u.version.name in reasons or u.version.name in protected:
+                continue
+            reasons[u.version.name] = "over the disk budget"
+            total -= u.size
+
+    plan = GcPlan()
+    for u in usages:
+        reason = reasons.get(u.version.name)
+        if reason is None or u.version.name in protected:
+            plan.keep.append(u)
+        else:
+            plan.remove.append((u, reason))
+    return plan
+
+
+def run_gc(gcfg: "_GlobalConfig", plan: GcPlan) -> list[Job]:
+    """Queue the removals as bulk jobs, behind any interactive work."""
+    jobs = []
+    for u, reason in plan.remove:
+        ver = u.version
+        logger.info(f"Removing {ver.name} ({reason})")
+        jobs.append(get_scheduler().submit(
+            f"gc {ver.name}",
+            lambda job, ver=ver: gcfg.remove_environment(ver),
+            priority=Priority.BULK,
+            resources=("disk", )))
+    return jobs
@@ -2,63 +2,124 @@ import json
 import os
 import shutil
 import subprocess
-from dataclasses import dataclass
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from dataclasses import dataclass, field
 from pathlib import Path
 
 from genericpath import isfile
 from loguru import logger
-from pydantic import BaseModel
+from pydantic import BaseModel, ValidationError
 
+from FluentPython.core.introspect import has_module, invalidate
+from FluentPython.core.metrics import FINGERPRINT_LOOKUPS, timed_operation
+from FluentPython.core.precompile import precompile_if_enabled
 from FluentPython.core.utils import (find_python_interpreter, myhash,
                                      query_interpreter_version, safe_rmtree)
+from FluentPython.core.validation import (QUARANTINE_INFO, FingerprintStore,
+                                          quarantine, quarantined)
 from FluentPython.globals import OperationFailure
 
 
+# creation markers older than this were left behind by a dead process
+STALE_CREATE_SECONDS = 3600
+
+# last-used timestamps are only needed at day granularity for gc
+USAGE_RESOLUTION = 3600
+
+
 class ConfigObj(BaseModel):
     preferred_python_interpreter: str
+    jupyter_shared_server: bool = False
+    jupyter_host_environment: str = "jupyter-host"
+    monitor_interval: float = 2.0
+    monitor_history: int = 150
+    log_max_bytes: int = 16 * 1024 * 1024
+    log_keep_segments: int = 20
+    console_max_blocks: int = 10000
+    package_index: str = "https://pypi.tuna.tsinghua.edu.cn/simple"
+    sync_workers: int = 4
+    precompile_after_install: bool = False
+    precompile_workers: int = 0
+    precompile_optimize_levels: list[int] = [0]
+    idle_timeout: float = 0
+    idle_warning: float = 300
+    idle_check_interval: float = 30
+    stall_watchdog: bool = False
+    stall_threshold: float = 0.5
+    serve_max_sessions: int = 16
+    serve_max_rss: int = 0
+    serve_max_cpu: float = 0
+    job_workers: int = 4
+    job_limits: dict[str, int] = {"pip": 2, "disk": 2, "scan": 1}
+    metrics_host: str = "127.0.0.1"
+    metrics_port: int = 0
+    remote_hosts: dict[str, list[str]] = {}
+    pool_size: int = 0
+    pool_interpreters: int = 1
 
 
 class VersionConfig(BaseModel):
     name: str
     interpreter: str
+    last_used: float | None = None
 
 
-@dataclass
+@dataclass(frozen=True, slots=True)
 class FluentPyVersion:
+    """An environment record; paths are derived once, at construction."""
+
     name: str
     version: tuple[int, int, int]
 
-    @property
-    def hash(self):
-        return myhash(self.name)
+    hash: str = field(init=False, repr=False, compare=False)
+    envdir: Path = field(init=False, repr=False, compare=False)
+    py_executable: Path = field(init=False, repr=False, compare=False)
 
-    @property
-    def envdir(self):
-        return _GlobalConfig.get_environments_dir() / self.hash
+    def __post_init__(self):
+        set_ = object.__setattr__
+        set_(self, 'version', tuple(self.version))
+        set_(self, 'hash', myhash(self.name))
+        envdir = _GlobalConfig.get_environments_dir() / self.hash
+        set_(self, 'envdir', envdir)
 
-    @property
-    def py_executable(self):
-        res = self.envdir / 'Scripts' / 'python'
+        # the interpreter's place is fixed per platform, so no need to probe
+        if os.name == 'nt':
+            set_(self, 'py_executable', envdir / 'Scripts' / 'python.exe')
+        else:
+            set_(self, 'py_executable', envdir / 'bin' / 'python')
 
-        if res.exists():
+    @property
+    def site_packages(self) -> Path:
+        """Looked up on use, since listings never need it."""
+        if os.name == 'nt':
+            return self.envdir / 'Lib' / 'site-packages'
+        res = (self.envdir / 'lib' /
+               f'python{self.version[0]}.{self.version[1]}' / 'site-packages')
+        if res.is_dir():
             return res
-
-        res = self.envdir / 'bin' / 'python'
-        assert res.exists()
-        return res
+        # PyPy (lib/pypy3.10) and free-threaded (lib/python3.13t) builds
+        found = sorted(self.envdir.glob('lib/*/site-packages'))
+        return found[0] if found else res
 
 
 class _GlobalConfig:
+    _environments_dir: Path | None = None
 
     @staticmethod
     def user_cfgdir():
         return Path('~/.fluentpython').expanduser()
 
     @classmethod
-    def get_environments_dir(cls):
-        res = cls.user_cfgdir() / 'environments'
-        res.mkdir(parents=True, exist_ok=True)
-        return res
+    def get_environments_dir(cls) -> Path:
+        # created once per process; every FluentPyVersion asks for it
+        if cls._environments_dir is None:
+            res = cls.user_cfgdir() / 'environments'
+            res.mkdir(parents=True, exist_ok=True)
+            cls._environments_dir = res
+        return cls._environments_dir
 
     @property
     def environments_dir(self):
@@ -66,6 +127,13 @@ class _GlobalConfig:
 
     def __init__(self):
         self._base_config_path = self.user_cfgdir() / 'config.json'
+        self._fingerprints = FingerprintStore(self.user_cfgdir() /
+                                              'fingerprints.json')
+        # listing may run on a background thread (GUI store) and the caller's
+        self._list_lock = threading.RLock()
+        self._marked_used: dict[str, float] = {}
+        # per environment, so recording a use never waits for a listing
+        self._use_locks: dict[str, threading.Lock] = {}
 
         self._load_config()
 
@@ -122,10 +190,63 @@ class _GlobalConfig:
     def _list_version_dirs(self):
         return os.listdir(self.environments_dir)
 
+    @property
+    def quarantine_dir(self):
+        return self.user_cfgdir() / 'quarantine'
+
+    def version_configs(self) -> list[VersionConfig]:
+        """fluentpy.json of every environment directory, without validating."""
+        res = []
+        for verdirname in self._list_version_dirs():
+            try:
+                res.append(
+                    VersionConfig.model_validate_json(
+                        (self.environments_dir / verdirname /
+                         'fluentpy.json').read_text("utf-8")))
+            except (OSError, ValidationError):
+                continue
+        return res
+
+    def _validate_version_dir(self, version_dir: Path) -> FluentPyVersion:
+        """Fully validate an environment directory.
+
+        Raises OperationFailure describing why the environment is broken.
+        """
+        ver_config_file = version_dir / 'fluentpy.json'
+        try:
+            ver_config = VersionConfig.model_validate_json(
+                ver_config_file.read_text("utf-8"))
+        except (json.JSONDecodeError, ValidationError):
+            raise OperationFailure(f"Invalid JSON in {ver_config_file}")
+        except FileNotFoundError:
+            raise OperationFailure(
+                f"Version directory {version_dir} is missing fluentpy.json")
+
+        ver_interp = Path(ver_config.interpreter)
+        if not ver_interp.is_file():
+            raise OperationFailure(
+                f"Interpreter {ver_interp} for version {ver_config.name} does not exist"
+            )
+
+        try:
+            ver_pyver = query_interpreter_version(ver_interp)
+        except (subprocess.CalledProcessError, ValueError, OSError) as e:
+            raise OperationFailure(
+                f"Interpreter {ver_interp} for version {ver_config.name} failed to run: {e}"
+            )
+
+        self._fingerprints.record(version_dir, ver_config.name,
+                                  ver_config.interpreter, ver_pyver)
+        return FluentPyVersion(ver_config.name, ver_pyver)
+
+    @timed_operation("list")
     def list_versions(self) -> list[FluentPyVersion]:
+        with self._list_lock:
+            return self._list_versions()
+
+    def _list_versions(self) -> list[FluentPyVersion]:
         res = []
         for verdirname in self._list_version_dirs():
-            corrupted = False
             # check name legallity: 0-9a-f only
             if not all(c in "0123456789abcdef" for c in verdirname):
                 logger.warning(
@@ -138,54 +259,89 @@ class _GlobalConfig:
                     f"Version directory {version_dir} is not a directory; skipping"
                 )
                 continue
-            while True:
-                ver_config_file = version_dir / 'fluentpy.json'
-                try:
-                    ver_config = VersionConfig.model_validate_json(
-                        ver_config_file.read_text("utf-8"))
 
-                except json.JSONDecodeError:
-                    logger.error(
-                        f"Invalid JSON in {ver_config_file}; skipping")
-                    corrupted = True
-                    break
+            fp = self._fingerprints.lookup(version_dir)
+            FINGERPRINT_LOOKUPS.inc(result="miss" if fp is None else "hit")
+            if fp is not None:
+                res.append(FluentPyVersion(fp.name, fp.version))
+                continue
+            if self._being_created(verdirname):
+                logger.debug(f"Version directory {verdirname} is being created")
+                continue
 
-                except FileNotFoundError:
+            try:
+                res.append(self._validate_version_dir(version_dir))
+            except OperationFailure as e:
+                logger.error(f"{e}; quarantining")
+                self._fingerprints.forget(verdirname)
+                try:
+                    quarantine(version_dir, self.quarantine_dir, str(e))
+                except OSError as qe:
                     logger.error(
-                        f"Version directory {version_dir} is missing fluentpy.json; skipping"
+                        f"Failed to quarantine corrupted version directory {version_dir}: {qe}"
                     )
-                    corrupted = True
-                    break
-
-                ver_name = ver_config.name
-                ver_interp = Path(ver_config.interpreter)
-                if not ver_interp.is_file():
-                    logger.warning(
-                        f"Interpreter {ver_interp} for version {ver_name} does not exist; skipping"
-                    )
-                    corrupted = True
-                    break
 
-                ver_pyver = query_interpreter_version(ver_interp)
+        self._fingerprints.save()
+        return res
 
-                break
-            if not corrupted:
-                res.append(FluentPyVersion(ver_name, ver_pyver))
-            else:
-                # remove the corrupted version directory
-                logger.warning(
-                    f"Removing corrupted version directory {version_dir}")
+    def doctor(self, purge: bool = False):
+        """Try to restore quarantined environments; purge the rest if asked.
+
+        Returns the lists of restored and purged quarantine entries.
+        """
+        restored, purged = [], []
+        for entry, info in quarantined(self.quarantine_dir):
+            target = self.environments_dir / info.original
+            if not target.exists():
+                self._repair_interpreter(entry)
                 try:
-                    safe_rmtree(
-                        base_path=self.environments_dir,
-                        target_path=version_dir,
-                    )
-                except ValueError:
-                    logger.error(
-                        f"Failed to remove corrupted version directory {version_dir}: might be an unsafe, not relative to {self.environments_dir}"
-                    )
-        return res
+                    self._validate_version_dir(entry)
+                except OperationFailure as e:
+                    logger.info(f"Cannot restore {entry.name}: {e}")
+                else:
+                    (entry / QUARANTINE_INFO).unlink(missing_ok=True)
+                    shutil.move(str(entry), str(target))
+                    # validated under the quarantine name; re-fingerprint on next listing
+                    self._fingerprints.forget(entry.name)
+                    logger.info(f"Restored {info.original} from quarantine")
+                    restored.append(entry)
+                    continue
+
+            if purge:
+                safe_rmtree(base_path=self.quarantine_dir, target_path=entry)
+                logger.info(f"Purged {entry.name}")
+                purged.append(entry)
+
+        self._fingerprints.save()
+        return restored, purged
 
+    @staticmethod
+    def _repair_interpreter(version_dir: Path):
+        """Point fluentpy.json at the venv's base interpreter if its own is gone."""
+        ver_config_file = version_dir / 'fluentpy.json'
+        try:
+            ver_config = VersionConfig.model_validate_json(
+                ver_config_file.read_text("utf-8"))
+            pyvenv = (version_dir / 'pyvenv.cfg').read_text("utf-8")
+        except (OSError, json.JSONDecodeError, ValidationError):
+            return
+        if Path(ver_config.interpreter).is_file():
+            return
+
+        for line in pyvenv.splitlines():
+            key, _, value = line.partition('=')
+            if key.strip() == 'executable' and Path(value.strip()).is_file():
+                ver_config.interpreter = value.strip()
+                ver_config_file.write_text(
+                    json.dumps(ver_config.model_dump(),
+                               indent=4,
+                               ensure_ascii=False), "utf-8")
+                logger.info(
+                    f"Repointed {version_dir.name} to interpreter {ver_config.interpreter}"
+                )
+                return
+
+    @timed_operation("create")
     def create_environment(self,
                            name: str,
                            interpreter: str | Path | None = None):
@@ -204,22 +360,105 @@ class _GlobalConfig:
 
         logger.debug(f"Interpreter version: {interp_ver}")
 
-        # check if virtualenv is installed
+        namehash = myhash(name)
+        venv_dir = self.environments_dir / namehash
+        # built in place, so no paths need rewriting; listing skips it
+        # until fluentpy.json is written
+        with self._creating(name, venv_dir):
+            if not self._claim_pooled(str(interpreter), interp_ver,
+                                      venv_dir):
+                self._create_venv(interpreter, venv_dir)
+            self._write_version_config(venv_dir, name, interpreter)
+
+        logger.debug(f"Created environment {name} at {venv_dir}")
+        ver = FluentPyVersion(name, interp_ver)
+        precompile_if_enabled(ver, self.cfg)
+
+        if self.cfg.jupyter_shared_server:
+            self._sync_kernelspecs()
+
+        if self.cfg.pool_size:
+            from FluentPython.core.pool import get_pool
+            get_pool(self).schedule_refill()
+
+        return ver
+
+    def _claim_pooled(self, interpreter: str, interp_ver: tuple[int, int,
+                                                                 int],
+                      venv_dir: Path) -> bool:
+        if not self.cfg.pool_size:
+            return False
+        from FluentPython.core.pool import get_pool
+        return get_pool(self).claim(interpreter, interp_ver, venv_dir)
+
+    @property
+    def staging_dir(self):
+        return self.user_cfgdir() / 'tmp'
+
+    def _staging_path(self, prefix: str) -> Path:
+        """A fresh path on the environments' filesystem, not yet created."""
+        self.staging_dir.mkdir(parents=True, exist_ok=True)
+        return self.staging_dir / f"{prefix}-{uuid.uuid4().hex}"
+
+    def _creation_marker(self, verdirname: str) -> Path:
+        return self.staging_dir / f"create-{verdirname}"
+
+    def _being_created(self, verdirname: str) -> bool:
         try:
-            subprocess.check_output(
-                [str(interpreter), "-m", "virtualenv", "--version"])
-        except subprocess.CalledProcessError:
+            mtime = self._creation_marker(verdirname).stat().st_mtime
+        except OSError:
+            return False
+        return time.time() - mtime < STALE_CREATE_SECONDS
+
+    @contextmanager
+    def _creating(self, name: str, venv_dir: Path):
+        """Hide `venv_dir` from listing while the body builds it.
+
+        The marker is created exclusively, so it also keeps two processes
+        from creating the same environment. On failure the directory is
+        removed.
+        """
+        marker = self._creation_marker(venv_dir.name)
+        self.staging_dir.mkdir(parents=True, exist_ok=True)
+        if marker.exists() and not self._being_created(venv_dir.name):
+            # left behind by a process that died while creating
+            marker.unlink(missing_ok=True)
+        try:
+            marker.touch(exist_ok=False)
+        except FileExistsError:
+            raise OperationFailure(f"Environment {name} is being created")
+
+        try:
+            if venv_dir.exists():
+                raise OperationFailure(f"Environment {name} already exists")
+            try:
+                yield
+            except BaseException:
+                if venv_dir.exists():
+                    safe_rmtree(base_path=self.environments_dir,
+                                target_path=venv_dir)
+                raise
+        finally:
+            marker.unlink(missing_ok=True)
+
+    @staticmethod
+    def _write_version_config(venv_dir: Path, name: str,
+                              interpreter: str | Path):
+        ver_config = VersionConfig(name=name, interpreter=str(interpreter))
+        (venv_dir / 'fluentpy.json').write_text(
+            json.dumps(ver_config.model_dump(), indent=4, ensure_ascii=False),
+            "utf-8")
+
+    @staticmethod
+    def _create_venv(interpreter: str | Path, venv_dir: Path):
+        # check if virtualenv is installed
+        if not has_module(interpreter, "virtualenv"):
             # install via pip
             logger.debug(
                 f"Virtualenv not found; installing virtualenv via pip")
             subprocess.check_output(
                 [str(interpreter), "-m", "pip", "install", "virtualenv"])
-
-        # create venv dir
-        namehash = myhash(name)
-        venv_dir = self.environments_dir / namehash
-
-        venv_dir.mkdir(parents=True, exist_ok=True)
+            invalidate(interpreter)
 
         # create venv using target interpreter
         venv_cmd = [str(interpreter), "-m", "venv", str(venv_dir)]
@@ -231,24 +470,71 @@ class _GlobalConfig:
             raise OperationFailure(
                 f"Failed to create venv: {e.output.decode()}")
 
-        # create fluentpy.json
-        ver_config = VersionConfig(name=name, interpreter=str(interpreter))
-        ver_config_file = venv_dir / 'fluentpy.json'
-        ver_config_file.write_text(
-            json.dumps(ver_config.model_dump(), indent=4, ensure_ascii=False),
-            "utf-8")
+    def _sync_kernelspecs(self):
+        from FluentPython.core.kernels import sync_kernelspecs
 
-        logger.debug(f"Created environment {name} at {venv_dir}")
-        return FluentPyVersion(name, interp_ver)
+        try:
+            sync_kernelspecs(self)
+        except OperationFailure as e:
+            logger.warning(f"Failed to sync kernelspecs: {e}")
 
     def get_version(self, name: str) -> FluentPyVersion | None:
         for ver in self.list_versions():
-            if ver.name == name:
-                return ver
-            if ver.hash == name:
+            if ver.name == name or ver.hash == name:
                 return ver
         return None
 
+    def _read_version_config(self, ver: FluentPyVersion) -> VersionConfig:
+        return VersionConfig.model_validate_json(
+            (ver.envdir / 'fluentpy.json').read_text("utf-8"))
+
+    def last_used(self, ver: FluentPyVersion) -> float:
+        """When the environment was last used; its creation time if never."""
+        try:
+            last_used = self._read_version_config(ver).last_used
+        except (OSError, ValidationError):
+            last_used = None
+        if last_used is None:
+            try:
+                return (ver.envdir / 'pyvenv.cfg').stat().st_mtime
+            except OSError:
+                return 0
+        return last_used
+
+    def mark_used(self, ver: FluentPyVersion):
+        """Record a use in fluentpy.json, at most once per USAGE_RESOLUTION."""
+        now = time.time()
+        if now - self._marked_used.get(ver.hash, 0) < USAGE_RESOLUTION:
+            return
+        self._marked_used[ver.hash] = now
+
+        with self._use_locks.setdefault(ver.hash, threading.Lock()):
+            try:
+                ver_config = self._read_version_config(ver)
+            except (OSError, ValidationError) as e:
+                logger.warning(f"Cannot record use of {ver.name}: {e}")
+                return
+            if (ver_config.last_used is not None
+                    and now - ver_config.last_used < USAGE_RESOLUTION):
+                return
+
+            validated = self._fingerprints.lookup(ver.envdir) is not None
+            ver_config.last_used = now
+            # replaced atomically: other processes may be listing
+            tmp = ver.envdir / 'fluentpy.json.tmp'
+            tmp.write_text(
+                json.dumps(ver_config.model_dump(),
+                           indent=4,
+                           ensure_ascii=False), "utf-8")
+            os.replace(tmp, ver.envdir / 'fluentpy.json')
+
+            # rewriting fluentpy.json must not cost a full revalidation
+            if validated:
+                self._fingerprints.record(ver.envdir, ver_config.name,
+                                          ver_config.interpreter, ver.version)
+                self._fingerprints.save()
+
+    @timed_operation("remove")
     def remove_environment(self, version: FluentPyVersion | str | None):
         if version is None:
             raise ValueError("Version not specified")
@@ -262,12 +548,7 @@ class _GlobalConfig:
 
         logger.debug(f"Removing environment {version.name}")
 
-        try:
-            safe_rmtree(
-                base_path=self.environments_dir,
-                target_path=version.envdir,
-            )
-        except ValueError:
+        if not version.envdir.is_relative_to(self.environments_dir):
             logger.error(
                 f"Failed to remove environment {version.name}: might be an unsafe, not relative to {self.environments_dir}"
             )
@@ -275,7 +556,18 @@ class _GlobalConfig:
                 f"Failed to remove environment {version.name}: might be an unsafe, not relative to {self.environments_dir}"
             )
 
+        # moved out first, so listing never sees a half-deleted environment
+        trash = self._staging_path("remove")
+        with self._list_lock:
+            os.replace(version.envdir, trash)
+            self._fingerprints.forget(version.hash)
+            self._fingerprints.save()
+        safe_rmtree(base_path=self.staging_dir, target_path=trash)
+
         logger.debug(f"Removed environment {version.name} successfully")
 
+        if self.cfg.jupyter_shared_server:
+            self._sync_kernelspecs()
+
 
 CFG = _GlobalConfig()
@@ -0,0 +1,181 @@
+import json
+import threading
+import time
+import urllib.error
+import urllib.request
+from dataclasses import dataclass
+from datetime import datetime
+from pathlib import Path
+from typing import TYPE_CHECKING, Callable
+
+from loguru import logger
+
+from FluentPython.core.logs import ACTIVE_SEGMENT
+from FluentPython.core.readiness import ServerInfo, find_server_file
+from FluentPython.core.sessions import (SessionRecord, live_sessions,
+                                        stop_session)
+
+if TYPE_CHECKING:
+    from FluentPython.core.config import ConfigObj
+
+
+@dataclass
+class IdleStatus:
+    record: SessionRecord
+    last_activity: float
+    idle_seconds: float
+    remaining: float
+
+
+def _parse_timestamp(value: str) -> float:
+    # Jupyter reports UTC with a trailing 'Z'
+    return datetime.fromisoformat(value.replace('Z', '+00:00')).timestamp()
+
+
+def _api_request(info: ServerInfo,
+                 endpoint: str,
+                 method: str = "GET",
+                 timeout: float = 2.0):
+    url = f"http://127.0.0.1:{info.port}{info.base_url}{endpoint}"
+    req = urllib.request.Request(
+        url,
+        method=method,
+        headers={"Authorization": f"token {info.token}"},
+        data=b"" if method == "POST" else None)
+    with urllib.request.urlopen(req, timeout=timeout) as resp:
+        return resp.read()
+
+
+def kernel_activity(info: ServerInfo) -> float | None:
+    """Latest kernel activity reported by the server; now if one is busy."""
+    try:
+        kernels = json.loads(_api_request(info, "api/kernels"))
+    except (urllib.error.URLError, OSError, ValueError):
+        return None
+
+    latest = None
+    for kernel in kernels:
+        if kernel.get("execution_state") == "busy":
+            return time.time()
+        try:
+            ts = _parse_timestamp(kernel["last_activity"])
+        except (KeyError, TypeError, ValueError):
+            continue
+        latest = ts if latest is None else max(latest, ts)
+    return latest
+
+
+def shutdown_server(info: ServerInfo) -> bool:
+    """Ask a Jupyter server to stop its kernels and exit."""
+    try:
+        _api_request(info, "api/shutdown", method="POST")
+        return True
+    except (urllib.error.URLError, OSError):
+        return False
+
+
+def output_activity(record: SessionRecord) -> float | None:
+    try:
+        return (record.log_path / ACTIVE_SEGMENT).stat().st_mtime
+    except OSError:
+        return None
+
+
+class IdleMonitor:
+    """Culls sessions that have shown no activity for `cfg.idle_timeout`.
+
+    Activity is the latest of the session's log output, the kernel activity
+    its Jupyter server reports, and `touch()` calls (e.g. a focused console
+    tab). Sessions pinned with `keep_alive` are never culled. `on_warning`
+    fires once per idle period, `cfg.idle_warning` seconds before culling.
+    """
+
+    def __init__(self,
+                 cfg: "ConfigObj",
+                 on_warning: Callable[[IdleStatus], None] | None = None,
+                 on_culled: Callable[[IdleStatus], None] | None = None):
+        self.cfg = cfg
+        self.on_warning = on_warning
+        self.on_culled = on_culled
+
+        self._touched: dict[str, float] = {}
+        self._warned: set[str] = set()
+        self._lock = threading.Lock()
+        self._thread = None
+        self._stop = threading.Event()
+
+    @property
+    def enabled(self):
+        return self.cfg.idle_timeout > 0
+
+    def touch(self, session_id: str):
+        with self._lock:
+            self._touched[session_id] = time.time()
+
+    def last_activity(self, record: SessionRecord) -> float:
+        times = [record.started_at, output_activity(record)]
+        with self._lock:
+            times.append(self._touched.get(record.id))
+        if record.runtime_dir is not None:
+            info = find_server_file(Path(record.runtime_dir))
+            if info is not None:
+                times.append(kernel_activity(info))
+        return max(t for t in times if t is not None)
+
+    def check(self) -> list[IdleStatus]:
+        """Warn about and cull idle sessions; returns the culled ones."""
+        now = time.time()
+        culled = []
+        for record in live_sessions():
+            if record.keep_alive:
+                continue
+
+            last = self.last_activity(record)
+            status = IdleStatus(record, last, now - last,
+                                self.cfg.idle_timeout - (now - last))
+            if status.remaining <= 0:
+                self.cull(record)
+                culled.append(status)
+                if self.on_culled is not None:
+                    self.on_culled(status)
+            elif status.remaining <= self.cfg.idle_warning:
+                if record.id not in self._warned:
+                    self._warned.add(record.id)
+                    if self.on_warning is not None:
+                        self.on_warning(status)
+            else:
+                self._warned.discard(record.id)
+        return culled
+
+    def cull(self, record: SessionRecord):
+        logger.info(f"Shutting down idle session {record.id} ({record.title})")
+        self._warned.discard(record.id)
+        with self._lock:
+            self._touched.pop(record.id, None)
+
+        info = None
+        if record.runtime_dir is not None:
+            info = find_server_file(Path(record.runtime_dir))
+        if info is None or not shutdown_server(info):
+            stop_session(record)
+
+    def start(self):
+        if not self.enabled:
+            return
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run,
+                                        name="IdleMonitor",
+                                        daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+
+    def _run(self):
+        while not self._stop.wait(self.cfg.idle_check_interval):
+            try:
+                self.check()
+            except Exception as e:
+                logger.exception(e)
@@ -0,0 +1,196 @@
+import json
+import os
+import subprocess
+import threading
+from pathlib import Path
+
+from loguru import logger
+from pydantic import BaseModel, ValidationError
+
+from FluentPython.core.metrics import (INTERPRETER_PROBE_SECONDS,
+                                       INTERPRETER_PROBES,
+                                       INTROSPECTION_LOOKUPS)
+
+MODULES_OF_INTEREST = ("pip", "venv", "virtualenv", "ipykernel", "jupyterlab",
+                       "notebook")
+
+# Runs under -I -S so no user or environment customisation is loaded.
+# site.main() is still called explicitly because it is what applies
+# pyvenv.cfg (sys.prefix) and puts site-packages on sys.path.
+INTROSPECT_SCRIPT = """
+import json, sys, sysconfig
+if sys.flags.no_site:
+    import site
+    site.main()
+info = {
+    "version": list(sys.version_info[:3]),
+    "executable": sys.executable,
+    "prefix": sys.prefix,
+    "base_prefix": sys.base_prefix,
+    "in_venv": sys.prefix != sys.base_prefix,
+    "implementation": sys.implementation.name,
+    "cache_tag": sys.implementation.cache_tag,
+    "soabi": sysconfig.get_config_var("SOABI"),
+    "platform": sysconfig.get_platform(),
+    "paths": sysconfig.get_paths(),
+    "modules": {},
+}
+import importlib.util
+for m in sys.argv[1:]:
+    try:
+        info["modules"][m] = importlib.util.find_spec(m) is not None
+    except Exception:
+        info["modules"][m] = False
+print(json.dumps(info))
+"""
+
+
+class InterpreterInfo(BaseModel):
+    version: tuple[int, int, int]
+    executable: str
+    prefix: str
+    base_prefix: str
+    in_venv: bool
+    implementation: str
+    cache_tag: str | None
+    soabi: str | None
+    platform: str
+    paths: dict[str, str]
+    modules: dict[str, bool]
+
+
+class _CacheEntry(BaseModel):
+    stamp: tuple[int, int]
+    purelib_stamp: int | None
+    info: InterpreterInfo
+
+
+def _stamp(path: Path) -> tuple[int, int]:
+    st = path.stat()
+    return st.st_mtime_ns, st.st_size
+
+
+def _purelib_stamp(info: InterpreterInfo) -> int | None:
+    try:
+        return os.stat(info.paths["purelib"]).st_mtime_ns
+    except (KeyError, OSError):
+        return None
+
+
+class _IntrospectionCache:
+    """Interpreter facts, invalidated by the interpreter's and site-packages' mtimes."""
+
+    def __init__(self):
+        self._entries: dict[str, _CacheEntry] | None = None
+        self._lock = threading.Lock()
+
+    @property
+    def path(self):
+        from FluentPython.core.config import _GlobalConfig
+        return _GlobalConfig.user_cfgdir() / 'interpreters.json'
+
+    def _load(self):
+        if self._entries is None:
+            self._entries = {}
+            try:
+                raw = json.loads(self.path.read_text("utf-8"))
+                self._entries = {
+                    k: _CacheEntry.model_validate(v)
+                    for k, v in raw.items()
+                }
+            except FileNotFoundError:
+                pass
+            except (json.JSONDecodeError, ValidationError, AttributeError):
+                logger.warning(
+                    f"Invalid interpreter cache {self.path}; discarding")
+        return self._entries
+
+    def _save(self):
+        assert self._entries is not None
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = self.path.with_suffix('.tmp')
+        tmp.write_text(
+            json.dumps({k: v.model_dump()
+                        for k, v in self._entries.items()}), "utf-8")
+        os.replace(tmp, self.path)
+
+    def get(self, interpreter: Path) -> InterpreterInfo | None:
+        with self._lock:
+            entry = self._load().get(str(interpreter))
+        if entry is None:
+            return None
+        try:
+            if _stamp(interpreter) != entry.stamp:
+                return None
+        except OSError:
+            return None
+        if _purelib_stamp(entry.info) != entry.purelib_stamp:
+            return None
+        return entry.info
+
+    def put(self, interpreter: Path, info: InterpreterInfo):
+        with self._lock:
+            self._load()[str(interpreter)] = _CacheEntry(
+                stamp=_stamp(interpreter),
+                purelib_stamp=_purelib_stamp(info),
+                info=info)
+            self._save()
+
+    def invalidate(self, interpreter: Path):
+        with self._lock:
+            if self._load().pop(str(interpreter), None) is not None:
+                self._save()
+
+
+_CACHE = _IntrospectionCache()
+
+
+def _probe(interpreter: Path, modules: tuple[str, ...]) -> InterpreterInfo:
+    logger.debug(f"Probing interpreter {interpreter}")
+    INTERPRETER_PROBES.inc()
+    with INTERPRETER_PROBE_SECONDS.time():
+        out = _run_probe(interpreter, modules)
+    return InterpreterInfo.model_validate_json(out)
+
+
+def _run_probe(interpreter: Path, modules: tuple[str, ...]) -> bytes:
+    try:
+        return subprocess.check_output(
+            [str(interpreter), "-I", "-S", "-c", INTROSPECT_SCRIPT, *modules])
+    except subprocess.CalledProcessError:
+        # some embedded/old interpreters reject the isolation flags
+        return subprocess.check_output(
+            [str(interpreter), "-c", INTROSPECT_SCRIPT, *modules])
+
+
+def introspect(interpreter: str | Path,
+               modules: tuple[str, ...] = MODULES_OF_INTEREST,
+               refresh: bool = False) -> InterpreterInfo:
+    """Everything FluentPython needs to know about an interpreter, from one probe.
+
+    Results are cached on disk until the interpreter or its site-packages
+    directory changes.
+    """
+    interpreter = Path(interpreter)
+    if not interpreter.exists():
+        raise FileNotFoundError(f"Python interpreter {interpreter} not found")
+
+    if not refresh:
+        info = _CACHE.get(interpreter)
+        if info is not None and all(m in info.modules for m in modules):
+            INTROSPECTION_LOOKUPS.inc(result="hit")
+            return info
+        INTROSPECTION_LOOKUPS.inc(result="miss")
+
+    info = _probe(interpreter, tuple(dict.fromkeys((*MODULES_OF_INTEREST,
+                                                   *modules))))
+    _CACHE.put(interpreter, info)
+    return info
+
+
+def has_module(interpreter: str | Path, module: str) -> bool:
+    return introspect(interpreter, (module, )).modules[module]
+
+
+def invalidate(interpreter: str | Path):
+    _CACHE.invalidate(Path(interpreter))
@@ -0,0 +1,229 @@
+import itertools
+import subprocess
+import threading
+import time
+from enum import IntEnum
+from typing import Any, Callable
+
+from loguru import logger
+
+from FluentPython.globals import OperationFailure
+
+
+class Priority(IntEnum):
+    INTERACTIVE = 0
+    NORMAL = 10
+    BULK = 20
+
+
+class JobCancelled(OperationFailure):
+    pass
+
+
+class Job:
+    """A unit of background work; `fn` receives the job to report progress.
+
+    `resources` are keys like "pip:<env>" or "disk". The part before ':'
+    selects a concurrency limit that applies to each distinct key, so
+    "pip:a" and "pip:b" are limited independently.
+    """
+
+    _ids = itertools.count(1)
+
+    def __init__(self,
+                 title: str,
+                 fn: Callable[["Job"], Any],
+                 priority: Priority = Priority.NORMAL,
+                 resources: tuple[str, ...] = ()):
+        self.id = next(self._ids)
+        self.title = title
+        self.fn = fn
+        self.priority = priority
+        self.resources = resources
+
+        self.state = "queued"
+        self.progress: float | None = None
+        self.message = ""
+        self.result = None
+        self.error: BaseException | None = None
+        self.submitted_at = time.time()
+
+        self.on_progress: list[Callable[[Job], None]] = []
+        self.on_done: list[Callable[[Job], None]] = []
+
+        self._cancelled = threading.Event()
+        self._done = threading.Event()
+        self._process: subprocess.Popen | None = None
+
+    @property
+    def cancelled(self):
+        return self._cancelled.is_set()
+
+    @property
+    def done(self):
+        return self._done.is_set()
+
+    def report(self, progress: float | None = None, message: str = ""):
+        self.progress = progress
+        self.message = message
+        for cb in self.on_progress:
+            cb(self)
+
+    def check_cancelled(self):
+        if self.cancelled:
+            raise JobCancelled(f"Job {self.title} was cancelled")
+
+    def attach_process(self, process: subprocess.Popen | None):
+        """Terminate `process` if the job is cancelled while it runs."""
+        self._process = process
+        if process is not None and self.cancelled:
+            process.terminate()
+
+    def wait(self, timeout: float | None = None):
+        """Block until the job finishes; returns its result or raises its error."""
+        if not self._done.wait(timeout):
+            raise TimeoutError(f"Job {self.title} did not finish in time")
+        if self.error is not None:
+            raise self.error
+        return self.result
+
+    def _finish(self, state: str):
+        self.state = state
+        self._done.set()
+        for cb in self.on_done:
+            try:
+                cb(self)
+            except Exception as e:
+                logger.exception(e)
+
+
+class JobScheduler:
+    """Worker pool that runs jobs by priority within resource limits.
+
+    A queued job whose resources are exhausted is skipped, not waited on,
+    so a busy environment never holds up work on other environments.
+    """
+
+    def __init__(self, workers: int = 4, limits: dict[str, int] | None = None):
+        self.workers = workers
+        self.limits = limits or {}
+
+        self._queue: list[Job] = []
+        self._running: list[Job] = []
+        self._in_use: dict[str, int] = {}
+        self._cond = threading.Condition()
+        self._threads: list[threading.Thread] = []
+
+    def submit(self,
+               title: str,
+               fn: Callable[[Job], Any],
+               priority: Priority = Priority.NORMAL,
+               resources: tuple[str, ...] = (),
+               on_done: Callable[[Job], None] | None = None,
+               on_progress: Callable[[Job], None] | None = None) -> Job:
+        job = Job(title, fn, priority, resources)
+        if on_done is not None:
+            job.on_done.append(on_done)
+        if on_progress is not None:
+            job.on_progress.append(on_progress)
+
+        with self._cond:
+            self._queue.append(job)
+            self._queue.sort(key=lambda j: (j.priority, j.id))
+            self._ensure_workers()
+            self._cond.notify()
+        logger.debug(f"Queued job {job.id}: {title}")
+        return job
+
+    def run(self, title: str, fn: Callable[[Job], Any], **kwargs):
+        """Submit and wait, for callers that need the result right away."""
+        return self.submit(title, fn, **kwargs).wait()
+
+    def cancel(self, job: Job):
+        with self._cond:
+            job._cancelled.set()
+            if job in self._queue:
+                self._queue.remove(job)
+                job.error = JobCancelled(f"Job {job.title} was cancelled")
+                job._finish("cancelled")
+                return
+        if job._process is not None and job._process.poll() is None:
+            job._process.terminate()
+
+    def jobs(self) -> list[Job]:
+        with self._cond:
+            return [*self._running, *self._queue]
+
+    def _limit(self, key: str) -> int | None:
+        return self.limits.get(key.split(':', 1)[0])
+
+    def _available(self, job: Job) -> bool:
+        for key in job.resources:
+            limit = self._limit(key)
+            if limit is not None and self._in_use.get(key, 0) >= limit:
+                return False
+        return True
+
+    def _ensure_workers(self):
+        self._threads = [t for t in self._threads if t.is_alive()]
+        while len(self._threads) < self.workers:
+            t = threading.Thread(target=self._work,
+                                 name=f"JobWorker-{len(self._threads)}",
+                                 daemon=True)
+            t.start()
+            self._threads.append(t)
+
+    def _take(self) -> Job:
+        with self._cond:
+            while True:
+                for job in self._queue:
+                    if self._available(job):
+                        self._queue.remove(job)
+                        self._running.append(job)
+                        for key in job.resources:
+                            self._in_use[key] = self._in_use.get(key, 0) + 1
+                        job.state = "running"
+                        return job
+                self._cond.wait()
+
+    def _release(self, job: Job):
+        with self._cond:
+            self._running.remove(job)
+            for key in job.resources:
+                self._in_use[key] -= 1
+                if not self._in_use[key]:
+                    del self._in_use[key]
+            self._cond.notify_all()
+
+    def _work(self):
+        while True:
+            job = self._take()
+            start = time.monotonic()
+            try:
+                job.check_cancelled()
+                job.result = job.fn(job)
+                state = "done"
+            except JobCancelled as e:
+                job.error = e
+                state = "cancelled"
+            except BaseException as e:
+                logger.exception(e)
+                job.error = e
+                state = "cancelled" if job.cancelled else "failed"
+            self._release(job)
+            logger.debug(
+                f"Job {job.id} ({job.title}) {state} in {time.monotonic() - start:.1f}s"
+            )
+            job._finish(state)
+
+
+_SCHEDULER: JobScheduler | None = None
+
+
+def get_scheduler() -> JobScheduler:
+    global _SCHEDULER
+    if _SCHEDULER is None:
+        from FluentPython.core.config import CFG
+        _SCHEDULER = JobScheduler(workers=CFG.cfg.job_workers,
+                                  limits=CFG.cfg.job_limits)
+    return _SCHEDULER
@@ -0,0 +1,121 @@
+import json
+from pathlib import Path
+from typing import TYPE_CHECKING
+
+from loguru import logger
+
+from FluentPython.core.utils import safe_rmtree
+from FluentPython.globals import OperationFailure
+
+if TYPE_CHECKING:
+    from FluentPython.core.config import FluentPyVersion, _GlobalConfig
+
+KERNEL_PREFIX = "fluentpy-"
+
+
+def kernel_name(ver: "FluentPyVersion") -> str:
+    return KERNEL_PREFIX + ver.hash[:12]
+
+
+def kernelspecs_dir(host: "FluentPyVersion") -> Path:
+    # <sys.prefix>/share/jupyter/kernels is always on the data path of a
+    # Jupyter server running inside the host environment
+    return host.envdir / 'share' / 'jupyter' / 'kernels'
+
+
+def has_ipykernel(ver: "FluentPyVersion") -> bool:
+    return (ver.site_packages / 'ipykernel').is_dir()
+
+
+def write_kernelspec(host: "FluentPyVersion", ver: "FluentPyVersion"):
+    spec_dir = kernelspecs_dir(host) / kernel_name(ver)
+    spec_dir.mkdir(parents=True, exist_ok=True)
+
+    spec = {
+        "argv": [
+            str(ver.py_executable), "-m", "ipykernel_launcher", "-f",
+            "{connection_file}"
+        ],
+        "display_name": f"{ver.name} (Python {'.'.join(map(str, ver.version))})",
+        "language": "python",
+        "metadata": {
+            "fluentpython": {
+                "name": ver.name,
+                "hash": ver.hash,
+            },
+        },
+    }
+    (spec_dir / 'kernel.json').write_text(
+        json.dumps(spec, indent=4, ensure_ascii=False), "utf-8")
+
+
+def get_host_version(cfg: "_GlobalConfig",
+                     create: bool = False) -> "FluentPyVersion | None":
+    host_name = cfg.cfg.jupyter_host_environment
+    host = cfg.get_version(host_name)
+
+    if host is None and create:
+        logger.info(f"Creating Jupyter host environment {host_name}")
+        host = cfg.create_environment(host_name)
+
+    return host
+
+
+def sync_kernelspecs(cfg: "_GlobalConfig",
+                     host: "FluentPyVersion | None" = None):
+    """Make the host's kernelspecs match the environments with ipykernel.
+
+    Returns the names of the added and removed kernelspecs.
+    """
+    versions = cfg.list_versions()
+
+    if host is None:
+        host = next(
+            (v for v in versions
+             if v.name == cfg.cfg.jupyter_host_environment), None)
+        if host is None:
+            logger.debug("Jupyter host environment not created yet; skipping")
+            return [], []
+
+    spec_root = kernelspecs_dir(host)
+    # a kernel without ipykernel would only fail when JupyterLab starts it
+    wanted = {kernel_name(ver): ver for ver in versions if has_ipykernel(ver)}
+    for ver in versions:
+        if kernel_name(ver) not in wanted:
+            logger.debug(f"{ver.name} has no ipykernel; not offering a kernel")
+    existing = set()
+    if spec_root.is_dir():
+        existing = {
+            p.name
+            for p in spec_root.iterdir()
+            if p.is_dir() and p.name.startswith(KERNEL_PREFIX)
+        }
+
+    added = []
+    for name, ver in wanted.items():
+        try:
+            write_kernelspec(host, ver)
+        except OSError as e:
+            raise OperationFailure(
+                f"Failed to write kernelspec for {ver.name}: {e}")
+        if name not in existing:
+            added.append(name)
+
+    removed = []
+    for name in existing - wanted.keys():
+        try:
+            safe_rmtree(base_path=spec_root, target_path=spec_root / name)
+        except (ValueError, OSError) as e:
+            raise OperationFailure(f"Failed to remove kernelspec {name}: {e}")
+        removed.append(name)
+
+    logger.debug(
+        f"Synced kernelspecs in {spec_root}: +{len(added)} -{len(removed)}")
+    return added, removed
+
+
+def shared_server_command(host: "FluentPyVersion") -> list[str]:
+    return [
+        str(host.py_executable), "-m", "jupyter", "lab",
+        "--KernelSpecManager.ensure_native_kernel=False"
+    ]
@@ -0,0 +1,199 @@
+import re
+import threading
+from array import array
+from bisect import bisect_right
+from collections.abc import Iterator
+from enum import IntEnum
+
+CHUNK_LINES = 4096
+
+TAG_URL = 1
+TAG_TOKEN_URL = 2
+TAG_TRACEBACK = 4
+
+
+class Level(IntEnum):
+    UNKNOWN = 0
+    DEBUG = 1
+    INFO = 2
+    WARNING = 3
+    ERROR = 4
+    CRITICAL = 5
+
+
+# Jupyter/tornado style "[W 2024-01-01 ...]" prefixes and plain level words
+_LEVEL_RE = re.compile(
+    r"^\[(?P<short>[DIWEC]) |\b(?P<word>DEBUG|INFO|WARN(?:ING)?|ERROR|CRITICAL|FATAL)\b|(?P<exc>\w+(?:Error|Exception):)"
+)
+_SHORT_LEVELS = {
+    'D': Level.DEBUG,
+    'I': Level.INFO,
+    'W': Level.WARNING,
+    'E': Level.ERROR,
+    'C': Level.CRITICAL,
+}
+_WORD_LEVELS = {
+    'DEBUG': Level.DEBUG,
+    'INFO': Level.INFO,
+    'WARN': Level.WARNING,
+    'WARNING': Level.WARNING,
+    'ERROR': Level.ERROR,
+    'CRITICAL': Level.CRITICAL,
+    'FATAL': Level.CRITICAL,
+}
+URL_RE = re.compile(r"https?://[^\s\"'<>]+")
+TRACEBACK_HEAD = "Traceback (most recent call last)"
+
+
+def detect_level(line: str) -> Level:
+    m = _LEVEL_RE.search(line)
+    if m is None:
+        return Level.UNKNOWN
+    if m['short']:
+        return _SHORT_LEVELS[m['short']]
+    if m['word']:
+        return _WORD_LEVELS[m['word']]
+    return Level.ERROR
+
+
+def detect_tags(line: str) -> int:
+    tags = 0
+    for url in URL_RE.findall(line):
+        tags |= TAG_URL
+        if "token=" in url:
+            tags |= TAG_TOKEN_URL
+    return tags
+
+
+class LineIndex:
+    """Incremental index over streamed console lines.
+
+    Lines are kept in joined chunks so a regex scans a whole chunk in one
+    call; per-line level and tag bytes allow filtering without touching
+    the text at all. Safe to append from one thread while another queries.
+    """
+
+    def __init__(self):
+        self._chunks: list[str] = []
+        self._chunk_offsets: list[array] = []
+        self._open: list[str] = []
+        self._levels = bytearray()
+        self._tags = bytearray()
+        self._in_traceback = False
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._levels)
+
+    def append(self, line: str) -> int:
+        line = line.rstrip('\n').replace('\n', ' ')
+        level = detect_level(line)
+        tags = detect_tags(line)
+
+        if line.startswith(TRACEBACK_HEAD):
+            self._in_traceback = True
+        if self._in_traceback:
+            tags |= TAG_TRACEBACK
+            level = max(level, Level.ERROR)
+            # the exception line is the first unindented one after the head
+            if line and not line[0].isspace() and not line.startswith(
+                    TRACEBACK_HEAD):
+                self._in_traceback = False
+
+        with self._lock:
+            self._open.append(line)
+            self._levels.append(level)
+            self._tags.append(tags)
+            if len(self._open) >= CHUNK_LINES:
+                self._seal()
+            return len(self._levels) - 1
+
+    def _seal(self):
+        offsets = array('I')
+        pos = 0
+        for line in self._open:
+            offsets.append(pos)
+            pos += len(line) + 1
+        self._chunks.append('\n'.join(self._open))
+        self._chunk_offsets.append(offsets)
+        self._open = []
+
+    def line(self, n: int) -> str:
+        with self._lock:
+            chunk, i = divmod(n, CHUNK_LINES)
+            if chunk < len(self._chunks):
+                offsets = self._chunk_offsets[chunk]
+                text = self._chunks[chunk]
+                end = offsets[i + 1] - 1 if i + 1 < len(offsets) else len(text)
+                return text[offsets[i]:end]
+            return self._open[i]
+
+    def level(self, n: int) -> Level:
+        return Level(self._levels[n])
+
+    def tags(self, n: int) -> int:
+        return self._tags[n]
+
+    def _snapshot(self):
+        with self._lock:
+            chunks = list(zip(self._chunks, self._chunk_offsets))
+            if self._open:
+                open_chunk = list(self._open)
+                offsets = array('I')
+                pos = 0
+                for line in open_chunk:
+                    offsets.append(pos)
+                    pos += len(line) + 1
+                chunks.append(('\n'.join(open_chunk), offsets))
+            return chunks, bytes(self._levels), bytes(self._tags)
+
+    def search(self,
+               pattern: str | re.Pattern,
+               start: int = 0,
+               min_level: Level = Level.UNKNOWN,
+               tags: int = 0) -> Iterator[int]:
+        """Yield line numbers >= `start` matching all the given filters."""
+        rx = re.compile(pattern, re.MULTILINE) if isinstance(
+            pattern, str) else pattern
+        chunks, levels, line_tags = self._snapshot()
+
+        def accepted(n):
+            return levels[n] >= min_level and (line_tags[n] & tags) == tags
+
+        for ci in range(start // CHUNK_LINES, len(chunks)):
+            text, offsets = chunks[ci]
+            base = ci * CHUNK_LINES
+            first = max(start - base, 0)
+            if first >= len(offsets):
+                continue
+            pos = offsets[first]
+            while True:
+                m = rx.search(text, pos)
+                if m is None:
+                    break
+                i = bisect_right(offsets, m.start()) - 1
+                if accepted(base + i):
+                    yield base + i
+                # continue from the start of the next line
+                if i + 1 >= len(offsets):
+                    break
+                pos = offsets[i + 1]
+
+    def filter(self,
+               start: int = 0,
+               min_level: Level = Level.UNKNOWN,
+               tags: int = 0) -> Iterator[int]:
+        """Yield line numbers >= `start` by level/tags without scanning text."""
+        _, levels, line_tags = self._snapshot()
+        if tags == 0 and min_level > Level.UNKNOWN:
+            rx = re.compile(b'[' + bytes(range(min_level, Level.CRITICAL + 1)) +
+                            b']')
+            for m in rx.finditer(levels, start):
+                yield m.start()
+            return
+        for n in range(start, len(levels)):
+            if levels[n] >= min_level and (line_tags[n] & tags) == tags:
+                yield n
+
+    def next_error(self, start: int = 0) -> int | None:
+        return next(self.filter(start, min_level=Level.ERROR), None)
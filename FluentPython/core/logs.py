@@ -0,0 +1,248 @@
+import gzip
+import mmap
+import os
+import shutil
+import tempfile
+from collections.abc import Iterator
+from pathlib import Path
+
+ACTIVE_SEGMENT = 'current.log'
+
+
+def get_logs_dir() -> Path:
+    from FluentPython.core.config import _GlobalConfig
+    return _GlobalConfig.user_cfgdir() / 'logs'
+
+
+# Owns a session's log: the session's output is piped into it, and it
+# rotates by closing and renaming current.log, so nothing written is ever
+# lost to a truncate. Runs detached under -I -S with any Python 3, so it
+# outlives FluentPython and needs nothing but the standard library.
+LOG_WRITER_SCRIPT = """
+import gzip, os, shutil, sys
+log_dir, max_bytes, keep = sys.argv[1], int(sys.argv[2]), int(sys.argv[3])
+active = os.path.join(log_dir, "current.log")
+
+def segments():
+    return sorted(n for n in os.listdir(log_dir)
+                  if n != "current.log" and n.split(".")[0].isdigit())
+
+def compress(name):
+    raw = os.path.join(log_dir, name)
+    try:
+        with open(raw, "rb") as src, gzip.open(raw + ".gz", "wb", 6) as dst:
+            shutil.copyfileobj(src, dst, 1024 * 1024)
+        os.unlink(raw)
+    except OSError:
+        pass
+
+def rotate(out):
+    names = segments()
+    # the newest segment stays uncompressed until the next rotation, so a
+    # tailer that fell behind can finish reading it
+    for name in names:
+        if name.endswith(".log"):
+            compress(name)
+    last = max([int(n.split(".")[0]) for n in names] or [0])
+    out.close()
+    try:
+        os.replace(active, os.path.join(log_dir, "%06d.log" % (last + 1)))
+    except OSError:
+        # held open by a reader on Windows; retried on the next line
+        pass
+    old = [n for n in segments() if n.endswith(".gz")]
+    for name in old[:max(len(old) - keep, 0)]:
+        try:
+            os.unlink(os.path.join(log_dir, name))
+        except OSError:
+            pass
+    return open(active, "ab")
+
+out = open(active, "ab")
+size = out.tell()
+while True:
+    data = os.read(0, 65536)
+    if not data:
+        break
+    size += len(data)
+    cut = data.rfind(b"\\n") + 1
+    if size >= max_bytes and cut:
+        out.write(data[:cut])
+        out = rotate(out)
+        data = data[cut:]
+        size = out.tell() + len(data)
+    out.write(data)
+    out.flush()
+out.close()
+"""
+
+
+class SessionLog:
+    """On-disk log of one console session.
+
+    Output goes to an uncompressed `current.log`, written by a detached
+    LOG_WRITER_SCRIPT process. Once it grows past `log_max_bytes` it
+    becomes a numbered segment; older segments are gzipped, keeping at
+    most `log_keep_segments` of them.
+    """
+
+    def __init__(self, log_dir: Path):
+        self.session = log_dir.name
+        self.dir = log_dir
+        self.dir.mkdir(parents=True, exist_ok=True)
+
+    @classmethod
+    def for_session(cls, session: str):
+        return cls(get_logs_dir() / session)
+
+    @property
+    def active_path(self):
+        return self.dir / ACTIVE_SEGMENT
+
+    def segments(self) -> list[Path]:
+        """Rotated segments, oldest first."""
+        return sorted(p for p in self.dir.iterdir()
+                      if p.name != ACTIVE_SEGMENT)
+
+    def writer_command(self, python: str, max_bytes: int,
+                       keep: int) -> list[str]:
+        return [
+            python, "-I", "-S", "-c", LOG_WRITER_SCRIPT,
+            str(self.dir),
+            str(max_bytes),
+            str(keep)
+        ]
+
+    def _numbers(self) -> list[int]:
+        return sorted({
+            int(p.name.split('.')[0])
+            for p in self.segments() if p.name.split('.')[0].isdigit()
+        })
+
+    def next_segment_number(self) -> int:
+        """The number the active segment gets when it is next rotated."""
+        return max(self._numbers(), default=0) + 1
+
+    def rotated(self, before: int) -> Iterator[bytes]:
+        """Contents of the segments numbered below `before`, oldest first."""
+        for number in self._numbers():
+            if number < before:
+                yield self._read_segment(number, 0)
+
+    def _read_segment(self, number: int, offset: int) -> bytes:
+        raw = self.dir / f"{number:06d}.log"
+        for path, opener in ((raw, open), (raw.with_name(raw.name + '.gz'),
+                                           gzip.open)):
+            try:
+                with opener(path, 'rb') as f:
+                    f.seek(offset)
+                    return f.read()
+            except FileNotFoundError:
+                # compressed meanwhile, or dropped past log_keep_segments
+                continue
+        return b''
+
+    def read_rotated(self, number: int, offset: int) -> tuple[bytes, int]:
+        """Everything rotated out since a reader was at `offset` in what
+        became segment `number`, and the number to expect next.
+        """
+        data = b''
+        last = number - 1
+        for n in range(number, self.next_segment_number()):
+            data += self._read_segment(n, offset if n == number else 0)
+            last = n
+        return data, last + 1
+
+
+class MappedLog:
+    """Read-only, memory-mapped view of an uncompressed log segment.
+
+    Positions are byte offsets, so opening never scans the file; only the
+    pages covering the requested window are touched.
+
+    The active segment is copy-truncated while sessions run, and touching
+    a mapping past the end of a truncated file raises SIGBUS. With `live`
+    the file is read into memory instead; it is bounded by `log_max_bytes`.
+    """
+
+    def __init__(self, path: Path, live: bool = False):
+        self.path = path
+        self.live = live
+        self._file = open(path, 'rb')
+        self._map = None
+        self.refresh()
+
+    def refresh(self):
+        """Remap (or re-read) the file if its size changed since opening."""
+        size = os.fstat(self._file.fileno()).st_size
+        if self._map is not None and len(self._map) == size:
+            return
+        if isinstance(self._map, mmap.mmap):
+            self._map.close()
+        if self.live:
+            self._file.seek(0)
+            self._map = self._file.read() or None
+        else:
+            self._map = mmap.mmap(self._file.fileno(), 0,
+                                  access=mmap.ACCESS_READ) if size else None
+
+    @property
+    def size(self) -> int:
+        return len(self._map) if self._map is not None else 0
+
+    def line_start(self, offset: int) -> int:
+        """Offset of the start of the line containing `offset`."""
+        if self._map is None or offset <= 0:
+            return 0
+        offset = min(offset, self.size)
+        return self._map.rfind(b'\n', 0, offset) + 1
+
+    def back(self, offset: int, count: int) -> int:
+        """Offset of the line `count` lines above the one at `offset`."""
+        offset = self.line_start(offset)
+        for _ in range(count):
+            if offset <= 0:
+                return 0
+            offset = self.line_start(offset - 1)
+        return offset
+
+    def window(self, offset: int, count: int) -> tuple[list[str], int]:
+        """Up to `count` lines starting at `offset`, and the offset after them."""
+        if self._map is None:
+            return [], 0
+
+        offset = self.line_start(offset)
+        lines = []
+        while len(lines) < count and offset < self.size:
+            end = self._map.find(b'\n', offset)
+            if end < 0:
+                end = self.size
+            lines.append(self._map[offset:end].decode('utf-8',
+                                                      errors='replace'))
+            offset = end + 1
+        return lines, min(offset, self.size)
+
+    def tail(self, count: int) -> tuple[list[str], int]:
+        start = self.back(max(self.size - 1, 0), count - 1)
+        return self.window(start, count)[0], start
+
+    def close(self):
+        if isinstance(self._map, mmap.mmap):
+            self._map.close()
+        self._map = None
+        self._file.close()
+
+
+def open_segment(path: Path) -> MappedLog:
+    """Map a log segment, inflating compressed segments to a temp file first."""
+    if path.suffix != '.gz':
+        return MappedLog(path, live=path.name == ACTIVE_SEGMENT)
+
+    fd, tmp = tempfile.mkstemp(prefix='fluentpython-', suffix='.log')
+    with os.fdopen(fd, 'wb') as dst, gzip.open(path, 'rb') as src:
+        shutil.copyfileobj(src, dst, 1024 * 1024)
+    res = MappedLog(Path(tmp))
+    # the mapping keeps the data alive; drop the name right away where allowed
+    if os.name != 'nt':
+        os.unlink(tmp)
+    return res
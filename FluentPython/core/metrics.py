@@ -0,0 +1,265 @@
+import bisect
+import functools
+import threading
+import time
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Callable
+
+from loguru import logger
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10,
+                   30, 60, 120, 300)
+
+
+def _escape(value: str) -> str:
+    return value.replace('\\', r'\\').replace('"', r'\"').replace('\n', r'\n')
+
+
+def _format_labels(names: tuple[str, ...], values: tuple[str, ...],
+                   extra: str = "") -> str:
+    parts = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+def _format_value(value: float) -> str:
+    if value == float('inf'):
+        return "+Inf"
+    return repr(float(value)) if value != int(value) else str(int(value))
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, help: str, labels: tuple[str, ...] = ()):
+        self.name = name
+        self.help = help
+        self.labels = labels
+        self._lock = threading.Lock()
+
+    def _key(self, labels: dict[str, str]) -> tuple[str, ...]:
+        return tuple(str(labels.get(n, "")) for n in self.labels)
+
+    def render(self) -> list[str]:
+        return [
+            f"# HELP {self.name} {self.help}",
+            f"# TYPE {self.name} {self.kind}", *self._samples()
+        ]
+
+    def _samples(self) -> list[str]:
+        raise NotImplementedError
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def __init__(self, name: str, help: str, labels: tuple[str, ...] = ()):
+        super().__init__(name, help, labels)
+        self._values: dict[tuple[str, ...], float] = {}
+
+    def inc(self, amount: float = 1, **labels: str):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels: str) -> float:
+        with self._lock:
+            return self._values.get(self._key(labels), 0)
+
+    def _samples(self):
+        with self._lock:
+            return [
+                f"{self.name}{_format_labels(self.labels, k)} {_format_value(v)}"
+                for k, v in sorted(self._values.items())
+            ]
+
+
+class Gauge(_Metric):
+    """A value read from `fn` at scrape time."""
+
+    kind = "gauge"
+
+    def __init__(self, name: str, help: str, fn: Callable[[], float]):
+        super().__init__(name, help)
+        self.fn = fn
+
+    def _samples(self):
+        try:
+            return [f"{self.name} {_format_value(self.fn())}"]
+        except Exception as e:
+            logger.warning(f"Failed to read gauge {self.name}: {e}")
+            return []
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self,
+                 name: str,
+                 help: str,
+                 labels: tuple[str, ...] = (),
+                 buckets: tuple[float, ...] = DEFAULT_BUCKETS):
+        super().__init__(name, help, labels)
+        self.buckets = tuple(sorted(buckets))
+        # per label set: bucket counts (non-cumulative), sum, count
+        self._values: dict[tuple[str, ...], tuple[list[int], float,
+                                                  int]] = {}
+
+    def observe(self, value: float, **labels: str):
+        key = self._key(labels)
+        idx = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            counts, total, n = self._values.get(
+                key, ([0] * (len(self.buckets) + 1), 0.0, 0))
+            counts[idx] += 1
+            self._values[key] = (counts, total + value, n + 1)
+
+    @contextmanager
+    def time(self, **labels: str):
+        start = time.monotonic()
+        try:
+            yield
+        finally:
+            self.observe(time.monotonic() - start, **labels)
+
+    def _samples(self):
+        res = []
+        with self._lock:
+            for key, (counts, total, n) in sorted(self._values.items()):
+                cumulative = 0
+                for bound, count in zip((*self.buckets, float('inf')),
+                                        counts):
+                    cumulative += count
+                    le = f'le="{_format_value(bound)}"'
+                    res.append(
+                        f"{self.name}_bucket{_format_labels(self.labels, key, le)} {cumulative}"
+                    )
+                res.append(
+                    f"{self.name}_sum{_format_labels(self.labels, key)} {_format_value(total)}"
+                )
+                res.append(
+                    f"{self.name}_count{_format_labels(self.labels, key)} {n}")
+        return res
+
+
+class Registry:
+
+    def __init__(self):
+        self._metrics: dict[str, _Metric] = {}
+        self._lock = threading.Lock()
+
+    def _register(self, metric):
+        with self._lock:
+            existing = self._metrics.get(metric.name)
+            if existing is not None:
+                return existing
+            self._metrics[metric.name] = metric
+            return metric
+
+    def counter(self, name: str, help: str,
+                labels: tuple[str, ...] = ()) -> Counter:
+        return self._register(Counter(name, help, labels))
+
+    def histogram(self,
+                  name: str,
+                  help: str,
+                  labels: tuple[str, ...] = (),
+                  buckets: tuple[float, ...] = DEFAULT_BUCKETS) -> Histogram:
+        return self._register(Histogram(name, help, labels, buckets))
+
+    def gauge(self, name: str, help: str, fn: Callable[[], float]) -> Gauge:
+        return self._register(Gauge(name, help, fn))
+
+    def render(self) -> str:
+        with self._lock:
+            metrics = list(self._metrics.values())
+        lines = []
+        for metric in metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+
+ENV_OPERATIONS = REGISTRY.counter(
+    "fluentpython_environment_operations_total",
+    "Environment operations by kind and outcome", ("operation", "result"))
+ENV_OPERATION_SECONDS = REGISTRY.histogram(
+    "fluentpython_environment_operation_seconds",
+    "Duration of environment operations", ("operation", ))
+FINGERPRINT_LOOKUPS = REGISTRY.counter(
+    "fluentpython_fingerprint_lookups_total",
+    "Environment validation cache lookups during listing", ("result", ))
+INTERPRETER_PROBES = REGISTRY.counter(
+    "fluentpython_interpreter_probes_total",
+    "Interpreter introspection subprocesses started")
+INTERPRETER_PROBE_SECONDS = REGISTRY.histogram(
+    "fluentpython_interpreter_probe_seconds",
+    "Duration of interpreter introspection subprocesses")
+INTROSPECTION_LOOKUPS = REGISTRY.counter(
+    "fluentpython_introspection_cache_lookups_total",
+    "Interpreter introspection cache lookups", ("result", ))
+SESSIONS_STARTED = REGISTRY.counter("fluentpython_sessions_started_total",
+                                    "Console sessions started", ("kind", ))
+SESSIONS_STOPPED = REGISTRY.counter(
+    "fluentpython_sessions_stopped_total",
+    "Console sessions stopped by FluentPython", ("result", ))
+SESSION_STOP_SECONDS = REGISTRY.histogram(
+    "fluentpython_session_stop_seconds",
+    "Time to stop a session's whole process tree")
+
+
+def timed_operation(operation: str):
+    """Count and time an environment operation, split by success or error."""
+
+    def decorator(fn):
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            start = time.monotonic()
+            try:
+                res = fn(*args, **kwargs)
+            except BaseException:
+                ENV_OPERATIONS.inc(operation=operation, result="error")
+                raise
+            finally:
+                ENV_OPERATION_SECONDS.observe(time.monotonic() - start,
+                                              operation=operation)
+            ENV_OPERATIONS.inc(operation=operation, result="ok")
+            return res
+
+        return wrapper
+
+    return decorator
+
+
+def start_metrics_server(host: str, port: int,
+                         registry: Registry = REGISTRY) -> ThreadingHTTPServer:
+    """Serve `registry` in Prometheus text format on a background thread."""
+
+    class Handler(BaseHTTPRequestHandler):
+
+        def do_GET(self):
+            if self.path.split('?', 1)[0] != "/metrics":
+                self.send_error(404)
+                return
+            body = registry.render().encode('utf-8')
+            self.send_response(200)
+            self.send_header("Content-Type",
+                             "text/plain; version=0.0.4; charset=utf-8")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass
+
+    httpd = ThreadingHTTPServer((host, port), Handler)
+    threading.Thread(target=httpd.serve_forever,
+                     name="MetricsServer",
+                     daemon=True).start()
+    logger.info(
+        f"Serving metrics on http://{host}:{httpd.server_address[1]}/metrics")
+    return httpd
@@ -0,0 +1,209 @@
+import os
+import threading
+import time
+from collections import deque
+from dataclasses import dataclass
+from pathlib import Path
+
+from loguru import logger
+
+try:
+    import psutil
+except ImportError:
+    psutil = None
+
+PROC = Path('/proc')
+CLK_TCK = os.sysconf('SC_CLK_TCK') if hasattr(os, 'sysconf') else 100
+PAGE_SIZE = os.sysconf('SC_PAGE_SIZE') if hasattr(os, 'sysconf') else 4096
+
+
+@dataclass
+class ResourceSample:
+    timestamp: float
+    rss: int
+    cpu_percent: float
+    children: int
+
+    def describe(self):
+        return (f"RSS {self.rss / 1024 / 1024:.1f} MB | "
+                f"CPU {self.cpu_percent:.1f}% | {self.children} 子进程")
+
+
+def _read_proc_table() -> dict[int, tuple[int, int, int]]:
+    """Map pid -> (ppid, rss bytes, cpu ticks) from a single /proc pass."""
+    table = {}
+    for entry in os.scandir(PROC):
+        if not entry.name.isdigit():
+            continue
+        try:
+            with open(f"/proc/{entry.name}/stat", "rb") as f:
+                stat = f.read()
+        except OSError:
+            # process went away between listing and reading
+            continue
+        # comm may contain spaces and parentheses; fields start after the last ')'
+        fields = stat[stat.rfind(b')') + 2:].split()
+        table[int(entry.name)] = (int(fields[1]), int(fields[21]) * PAGE_SIZE,
+                                  int(fields[11]) + int(fields[12]))
+    return table
+
+
+def _descendants_of(pid: int,
+                    table: dict[int, tuple[int, int, int]]) -> list[int]:
+    children = {}
+    for p, (ppid, _, _) in table.items():
+        children.setdefault(ppid, []).append(p)
+
+    res = []
+    stack = list(children.get(pid, ()))
+    while stack:
+        p = stack.pop()
+        res.append(p)
+        stack.extend(children.get(p, ()))
+    return res
+
+
+def process_tree(pid: int) -> list[int]:
+    """Return the pids of every live descendant of `pid`."""
+    if PROC.is_dir():
+        return _descendants_of(pid, _read_proc_table())
+
+    if psutil is not None:
+        try:
+            return [
+                p.pid for p in psutil.Process(pid).children(recursive=True)
+            ]
+        except psutil.Error:
+            return []
+
+    return []
+
+
+class ResourceSampler:
+
+    def __init__(self, interval: float = 2.0, history: int = 150):
+        self.interval = interval
+        self.history_size = history
+
+        self._sessions: dict[str, int] = {}
+        self._history: dict[str, deque[ResourceSample]] = {}
+        self._last_ticks: dict[str, tuple[float, float]] = {}
+        self._lock = threading.Lock()
+        self._thread = None
+        self._stop = threading.Event()
+
+    @property
+    def available(self):
+        return PROC.is_dir() or psutil is not None
+
+    def watch(self, key: str, pid: int):
+        with self._lock:
+            self._sessions[key] = pid
+            self._history[key] = deque(maxlen=self.history_size)
+            self._last_ticks.pop(key, None)
+        self.start()
+
+    def unwatch(self, key: str):
+        with self._lock:
+            self._sessions.pop(key, None)
+            self._history.pop(key, None)
+            self._last_ticks.pop(key, None)
+
+    def latest(self, key: str) -> ResourceSample | None:
+        with self._lock:
+            hist = self._history.get(key)
+            return hist[-1] if hist else None
+
+    def history(self, key: str) -> list[ResourceSample]:
+        with self._lock:
+            return list(self._history.get(key, ()))
+
+    def start(self):
+        if not self.available:
+            logger.warning(
+                "Neither /proc nor psutil is available; resource monitoring disabled"
+            )
+            return
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run,
+                                        name="ResourceSampler",
+                                        daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            with self._lock:
+                sessions = dict(self._sessions)
+            if not sessions:
+                continue
+            try:
+                self.sample_once(sessions)
+            except Exception as e:
+                logger.exception(e)
+
+    def sample_once(self, sessions: dict[str, int]):
+        now = time.monotonic()
+        # one /proc pass is shared by every watched session
+        table = _read_proc_table() if PROC.is_dir() else None
+
+        for key, pid in sessions.items():
+            if table is not None:
+                if pid not in table:
+                    continue
+                pids = [pid, *_descendants_of(pid, table)]
+                rss = sum(table[p][1] for p in pids)
+                ticks = sum(table[p][2] for p in pids) / CLK_TCK
+            else:
+                res = self._sample_psutil(pid)
+                if res is None:
+                    continue
+                pids, rss, ticks = res
+
+            with self._lock:
+                if key not in self._history:
+                    # unwatched while sampling
+                    continue
+                cpu = 0.0
+                last = self._last_ticks.get(key)
+                if last is not None and now > last[0]:
+                    cpu = max(0.0, (ticks - last[1]) / (now - last[0]) * 100)
+                self._last_ticks[key] = (now, ticks)
+                self._history[key].append(
+                    ResourceSample(time.time(), rss, cpu, len(pids) - 1))
+
+    @staticmethod
+    def _sample_psutil(pid: int):
+        assert psutil is not None
+        try:
+            root = psutil.Process(pid)
+            procs = [root, *root.children(recursive=True)]
+        except psutil.Error:
+            return None
+
+        rss = 0
+        ticks = 0.0
+        for p in procs:
+            try:
+                rss += p.memory_info().rss
+                t = p.cpu_times()
+                ticks += t.user + t.system
+            except psutil.Error:
+                pass
+        return [p.pid for p in procs], rss, ticks
+
+
+_SAMPLER: ResourceSampler | None = None
+
+
+def get_sampler() -> ResourceSampler:
+    global _SAMPLER
+    if _SAMPLER is None:
+        from FluentPython.core.config import CFG
+        _SAMPLER = ResourceSampler(interval=CFG.cfg.monitor_interval,
+                                   history=CFG.cfg.monitor_history)
+    return _SAMPLER
@@ -0,0 +1,257 @@
+import json
+import subprocess
+import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from dataclasses import dataclass, field
+from email.parser import HeaderParser
+from pathlib import Path
+from typing import TYPE_CHECKING
+
+from loguru import logger
+from packaging.requirements import InvalidRequirement, Requirement
+from packaging.utils import canonicalize_name
+
+from FluentPython.core.precompile import precompile_if_enabled
+from FluentPython.globals import OperationFailure
+
+if TYPE_CHECKING:
+    from FluentPython.core.config import ConfigObj, FluentPyVersion
+    from FluentPython.core.jobs import Job
+
+# never removed by a sync, even if the requirements do not mention them
+PROTECTED_DISTRIBUTIONS = {"pip", "setuptools", "wheel"}
+
+
+@dataclass
+class Distribution:
+    name: str
+    version: str
+    requires: list[str]
+    path: Path
+
+
+@dataclass
+class SyncPlan:
+    install: list[Requirement] = field(default_factory=list)
+    remove: list[str] = field(default_factory=list)
+
+    @property
+    def empty(self):
+        return not self.install and not self.remove
+
+
+def installed_distributions(site_packages: Path) -> dict[str, Distribution]:
+    """Read installed distributions from dist-info metadata, without running Python."""
+    res = {}
+    if not site_packages.is_dir():
+        return res
+
+    parser = HeaderParser()
+    for info in site_packages.glob('*.dist-info'):
+        try:
+            with open(info / 'METADATA', encoding='utf-8') as f:
+                meta = parser.parse(f)
+        except (OSError, UnicodeDecodeError):
+            logger.warning(f"Unreadable metadata in {info}; skipping")
+            continue
+        if not meta['Name'] or not meta['Version']:
+            continue
+        name = canonicalize_name(meta['Name'])
+        res[name] = Distribution(name=name,
+                                 version=meta['Version'],
+                                 requires=meta.get_all('Requires-Dist') or [],
+                                 path=info)
+    return res
+
+
+def parse_requirements_file(path: Path) -> list[Requirement]:
+    res = []
+    for lineno, line in enumerate(path.read_text("utf-8").splitlines(), 1):
+        line = line.split(' #', 1)[0].strip()
+        if not line or line.startswith('#'):
+            continue
+        if line.startswith(('-r ', '--requirement ')):
+            res.extend(
+                parse_requirements_file(path.parent / line.split(None, 1)[1]))
+            continue
+        if line.startswith('-'):
+            logger.warning(
+                f"{path}:{lineno}: unsupported option {line!r}; ignoring")
+            continue
+        try:
+            res.append(Requirement(line))
+        except InvalidRequirement as e:
+            raise OperationFailure(f"{path}:{lineno}: {e}")
+    return res
+
+
+def _marker_env(ver: "FluentPyVersion", extra: str = ""):
+    return {
+        "python_version": f"{ver.version[0]}.{ver.version[1]}",
+        "python_full_version": '.'.join(map(str, ver.version)),
+        "extra": extra,
+    }
+
+
+def _applies(req: Requirement, ver: "FluentPyVersion", extra: str = ""):
+    return req.marker is None or req.marker.evaluate(_marker_env(ver, extra))
+
+
+def _closure(roots: list[Requirement], installed: dict[str, Distribution],
+             ver: "FluentPyVersion") -> set[str]:
+    """Names of the roots and everything they (transitively) depend on."""
+    keep = set()
+    seen = set()
+    stack = [(canonicalize_name(r.name), frozenset(r.extras)) for r in roots]
+    while stack:
+        name, extras = stack.pop()
+        if (name, extras) in seen:
+            continue
+        seen.add((name, extras))
+        keep.add(name)
+        dist = installed.get(name)
+        if dist is None:
+            continue
+        for spec in dist.requires:
+            try:
+                req = Requirement(spec)
+            except InvalidRequirement:
+                continue
+            if any(_applies(req, ver, e) for e in ['', *extras]):
+                stack.append(
+                    (canonicalize_name(req.name), frozenset(req.extras)))
+    return keep
+
+
+def plan_sync(ver: "FluentPyVersion",
+              requirements: list[Requirement]) -> SyncPlan:
+    installed = installed_distributions(ver.site_packages)
+    targets = [r for r in requirements if _applies(r, ver)]
+
+    plan = SyncPlan()
+    for req in targets:
+        dist = installed.get(canonicalize_name(req.name))
+        if dist is None or not req.specifier.contains(dist.version,
+                                                      prereleases=True):
+            plan.install.append(req)
+
+    keep = _closure(targets, installed, ver) | PROTECTED_DISTRIBUTIONS
+    plan.remove = sorted(name for name in installed if name not in keep)
+    return plan
+
+
+def index_args(cfg: "ConfigObj") -> list[str]:
+    """pip arguments selecting the configured package index."""
+    index = cfg.package_index
+    if not index:
+        return []
+
+    local = Path(index[len("file://"):] if index.startswith("file://") else
+                 index).expanduser()
+    if local.is_dir():
+        # a plain directory of archives vs. a PEP 503 "simple" tree
+        if any(local.glob('*.whl')) or any(local.glob('*.tar.gz')):
+            return ["--no-index", "--find-links", str(local)]
+        return ["--index-url", local.resolve().as_uri()]
+    if local.is_file():
+        return ["--no-index", "--find-links", str(local)]
+    return ["--index-url", index]
+
+
+def _pip(ver: "FluentPyVersion", *args: str) -> bytes:
+    cmd = [str(ver.py_executable), "-m", "pip", *args]
+    logger.debug(f"Running command: {cmd}")
+    try:
+        return subprocess.check_output(cmd, stderr=subprocess.PIPE)
+    except subprocess.CalledProcessError as e:
+        raise OperationFailure(
+            f"pip {args[0]} failed: {e.stderr.decode(errors='replace')}")
+
+
+def _resolve(ver: "FluentPyVersion", cfg: "ConfigObj",
+             reqs: list[Requirement]) -> list[str] | None:
+    """Ask pip what it would install, as a list of artifact URLs.
+
+    Returns None if this pip cannot produce an installation report.
+    """
+    try:
+        out = _pip(ver, "install", "--dry-run", "--quiet", "--report", "-",
+                   *index_args(cfg), *map(str, reqs))
+    except OperationFailure as e:
+        logger.debug(f"Dry-run resolution unavailable: {e}")
+        return None
+    report = json.loads(out)
+    return [item['download_info']['url'] for item in report['install']]
+
+
+def _install(ver: "FluentPyVersion",
+             reqs: list[Requirement],
+             cfg: "ConfigObj",
+             job: "Job | None" = None):
+    urls = _resolve(ver, cfg, reqs)
+    if urls is None:
+        logger.info(f"Installing {len(reqs)} requirements serially")
+        _pip(ver, "install", *index_args(cfg), *map(str, reqs))
+        return
+
+    # the resolved set is closed under dependencies, so each artifact can be
+    # fetched and built on its own; pip must not run twice in one
+    # environment, so the wheels are installed together afterwards
+    logger.info(
+        f"Building {len(urls)} artifacts with {cfg.sync_workers} workers")
+    lock = threading.Lock()
+    done = 0
+
+    with tempfile.TemporaryDirectory(prefix='fluentpython-wheels-') as tmp:
+
+        def fetch(url: str):
+            nonlocal done
+            _pip(ver, "wheel", "--no-deps", "--quiet", "--wheel-dir", tmp,
+                 *index_args(cfg), url)
+            with lock:
+                done += 1
+                if job is not None:
+                    job.report(done / len(urls), url.rsplit('/', 1)[-1])
+
+        with ThreadPoolExecutor(max_workers=cfg.sync_workers) as pool:
+            futures = [pool.submit(fetch, url) for url in urls]
+            try:
+                for future in as_completed(futures):
+                    future.result()
+                    if job is not None:
+                        job.check_cancelled()
+            except BaseException:
+                for future in futures:
+                    future.cancel()
+                raise
+
+        wheels = sorted(str(w) for w in Path(tmp).glob('*.whl'))
+        logger.info(f"Installing {len(wheels)} wheels")
+        _pip(ver, "install", "--no-deps", "--no-index", *wheels)
+
+
+def sync_environment(ver: "FluentPyVersion",
+                     requirements: Path,
+                     cfg: "ConfigObj",
+                     job: "Job | None" = None) -> SyncPlan:
+    """Install and remove only what differs from `requirements`."""
+    reqs = parse_requirements_file(requirements)
+    plan = plan_sync(ver, reqs)
+    if plan.empty:
+        logger.info(f"Environment {ver.name} is already in sync")
+        return plan
+
+    if plan.install:
+        _install(ver, plan.install, cfg, job)
+        # new requirements may depend on distributions planned for removal
+        plan.remove = plan_sync(ver, reqs).remove
+
+    if plan.remove:
+        logger.info(f"Removing {len(plan.remove)} distributions")
+        _pip(ver, "uninstall", "--yes", *plan.remove)
+
+    if plan.install:
+        precompile_if_enabled(ver, cfg)
+
+    return plan
@@ -0,0 +1,139 @@
+import json
+import os
+from dataclasses import dataclass
+from pathlib import Path
+from typing import TYPE_CHECKING
+
+from loguru import logger
+from packaging.requirements import InvalidRequirement, Requirement
+from packaging.utils import canonicalize_name
+from packaging.version import InvalidVersion, Version
+from pydantic import BaseModel, ValidationError
+
+from FluentPython.core.packages import installed_distributions
+from FluentPython.globals import OperationFailure
+
+if TYPE_CHECKING:
+    from FluentPython.core.config import FluentPyVersion
+
+
+class IndexedEnvironment(BaseModel):
+    site_packages: str
+    mtime: int
+    distributions: dict[str, str]
+
+
+@dataclass
+class PackageMatch:
+    environment: str
+    name: str
+    version: str
+
+
+def _mtime(path: Path) -> int | None:
+    try:
+        return path.stat().st_mtime_ns
+    except OSError:
+        return None
+
+
+class PackageIndex:
+    """Installed distributions of every environment, keyed by name.
+
+    An environment is rescanned only when its site-packages directory's
+    mtime changes, which happens whenever a dist-info directory is added
+    or removed (install, upgrade, uninstall).
+    """
+
+    def __init__(self, path: Path):
+        self.path = path
+        self._entries: dict[str, IndexedEnvironment] | None = None
+        self._dirty = False
+
+    def _load(self) -> dict[str, IndexedEnvironment]:
+        if self._entries is None:
+            self._entries = {}
+            try:
+                raw = json.loads(self.path.read_text("utf-8"))
+                self._entries = {
+                    k: IndexedEnvironment.model_validate(v)
+                    for k, v in raw.items()
+                }
+            except FileNotFoundError:
+                pass
+            except (json.JSONDecodeError, ValidationError, AttributeError):
+                logger.warning(f"Invalid package index {self.path}; rebuilding")
+        return self._entries
+
+    def update(self, versions: list["FluentPyVersion"]):
+        entries = self._load()
+
+        names = {ver.name for ver in versions}
+        for name in list(entries):
+            if name not in names:
+                del entries[name]
+                self._dirty = True
+
+        for ver in versions:
+            site_packages = ver.site_packages
+            mtime = _mtime(site_packages)
+            if mtime is None:
+                continue
+            entry = entries.get(ver.name)
+            if (entry is not None and entry.mtime == mtime
+                    and entry.site_packages == str(site_packages)):
+                continue
+
+            logger.debug(f"Indexing packages of {ver.name}")
+            entries[ver.name] = IndexedEnvironment(
+                site_packages=str(site_packages),
+                mtime=mtime,
+                distributions={
+                    name: dist.version
+                    for name, dist in installed_distributions(
+                        site_packages).items()
+                })
+            self._dirty = True
+
+        self.save()
+
+    def save(self):
+        if not self._dirty or self._entries is None:
+            return
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = self.path.with_suffix('.tmp')
+        tmp.write_text(
+            json.dumps({
+                k: v.model_dump()
+                for k, v in self._entries.items()
+            }), "utf-8")
+        os.replace(tmp, self.path)
+        self._dirty = False
+
+    def which(self, query: str) -> list[PackageMatch]:
+        """Environments with a distribution matching a requirement like `torch>=2`."""
+        try:
+            req = Requirement(query)
+        except InvalidRequirement as e:
+            raise OperationFailure(f"Invalid requirement {query!r}: {e}")
+
+        name = canonicalize_name(req.name)
+        res = []
+        for env, entry in sorted(self._load().items()):
+            version = entry.distributions.get(name)
+            if version is None:
+                continue
+            if req.specifier:
+                try:
+                    if not req.specifier.contains(Version(version),
+                                                  prereleases=True):
+                        continue
+                except InvalidVersion:
+                    continue
+            res.append(PackageMatch(env, name, version))
+        return res
+
+
+def get_package_index() -> PackageIndex:
+    from FluentPython.core.config import _GlobalConfig
+    return PackageIndex(_GlobalConfig.user_cfgdir() / 'packages.json')
@@ -0,0 +1,223 @@
+import json
+import os
+import subprocess
+import threading
+import time
+import uuid
+from collections import Counter
+from pathlib import Path
+from typing import TYPE_CHECKING
+
+from loguru import logger
+
+from FluentPython.core.jobs import Job, Priority, get_scheduler
+from FluentPython.core.snapshot import relocate_environment
+from FluentPython.core.utils import (myhash, query_interpreter_version,
+                                     safe_rmtree)
+from FluentPython.globals import OperationFailure
+
+if TYPE_CHECKING:
+    from FluentPython.core.config import _GlobalConfig
+
+READY_MARKER = 'fluentpy-pool.json'
+# unfinished entries older than this were left behind by a dead process
+STALE_BUILD_SECONDS = 3600
+
+
+class EnvironmentPool:
+    """Ready, unnamed venvs kept per interpreter so create is a rename.
+
+    Entries live in pool/<key>/<id>, where the key covers the interpreter
+    path and version. An entry is claimable once its READY_MARKER exists.
+    Claiming renames it to the new environment's directory, which is
+    atomic and so safe against other FluentPython processes claiming the
+    same one.
+    """
+
+    def __init__(self, gcfg: "_GlobalConfig"):
+        self.gcfg = gcfg
+        self.root = gcfg.user_cfgdir() / 'pool'
+        self._lock = threading.Lock()
+        self._refill: Job | None = None
+
+    @staticmethod
+    def _key(interpreter: str, version: tuple[int, int, int]) -> str:
+        return myhash(f"{interpreter}|{'.'.join(map(str, version))}")
+
+    def ready(self, interpreter: str,
+              version: tuple[int, int, int]) -> list[Path]:
+        slot = self.root / self._key(interpreter, version)
+        try:
+            entries = list(slot.iterdir())
+        except FileNotFoundError:
+            return []
+        return sorted(e for e in entries if (e / READY_MARKER).is_file())
+
+    def claim(self, interpreter: str, version: tuple[int, int, int],
+              target: Path) -> bool:
+        """Move a ready entry to `target` and fix up its paths.
+
+        Returns False if no entry could be claimed.
+        """
+        for entry in self.ready(interpreter, version):
+            try:
+                os.rename(entry, target)
+            except FileNotFoundError:
+                # claimed by another process first
+                continue
+            except OSError as e:
+                logger.warning(f"Cannot claim pooled environment: {e}")
+                return False
+
+            (target / READY_MARKER).unlink(missing_ok=True)
+            relocate_environment(target, str(entry))
+            logger.debug(f"Claimed pooled environment {entry.name}")
+            return True
+        return False
+
+    def build(self, interpreter: str, version: tuple[int, int, int]):
+        entry = self.root / self._key(interpreter,
+                                      version) / uuid.uuid4().hex
+        entry.parent.mkdir(parents=True, exist_ok=True)
+        venv_cmd = [interpreter, "-m", "venv", str(entry)]
+        logger.debug(f"Running command: {' '.join(venv_cmd)}")
+        try:
+            subprocess.check_output(venv_cmd, stderr=subprocess.STDOUT)
+        except subprocess.CalledProcessError as e:
+            safe_rmtree(base_path=self.root, target_path=entry)
+            raise OperationFailure(
+                f"Failed to create pooled venv: {e.output.decode()}")
+
+        (entry / READY_MARKER).write_text(
+            json.dumps({
+                "interpreter": interpreter,
+                "created_at": time.time()
+            }), "utf-8")
+
+    def wanted_interpreters(self) -> list[str]:
+        """The preferred interpreter plus the most used ones, best first.
+
+        Read straight from each environment's fluentpy.json: the number of
+        environments per interpreter, ties broken by the most recent use.
+        """
+        counts = Counter()
+        last_used: dict[str, float] = {}
+        for ver_config in self.gcfg.version_configs():
+            counts[ver_config.interpreter] += 1
+            last_used[ver_config.interpreter] = max(
+                last_used.get(ver_config.interpreter, 0),
+                ver_config.last_used or 0)
+
+        res = [self.gcfg.cfg.preferred_python_interpreter]
+        for interpreter in sorted(counts,
+                                  key=lambda i: (counts[i], last_used[i]),
+                                  reverse=True):
+            if interpreter not in res:
+                res.append(interpreter)
+        return res[:max(self.gcfg.cfg.pool_interpreters, 1)]
+
+    @staticmethod
+    def _slot_interpreter(slot: Path) -> str | None:
+        """The interpreter a slot was built for, from any ready entry."""
+        try:
+            entries = list(slot.iterdir())
+        except FileNotFoundError:
+            return None
+        for entry in entries:
+            try:
+                return json.loads(
+                    (entry / READY_MARKER).read_text("utf-8"))["interpreter"]
+            except (OSError, ValueError, KeyError):
+                continue
+        return None
+
+    def prune(self, wanted: set[str], keys: dict[str, str]):
+        """Drop dead builds and the slots no longer needed.
+
+        A slot goes if its interpreter is not `wanted`, or if `keys` maps
+        its interpreter to another slot (it was upgraded). Slots of wanted
+        interpreters missing from `keys`, whose probe failed, are kept.
+        """
+        if not self.root.is_dir():
+            return
+        now = time.time()
+        for slot in self.root.iterdir():
+            interpreter = self._slot_interpreter(slot)
+            if interpreter is not None and (
+                    interpreter not in wanted
+                    or keys.get(interpreter, slot.name) != slot.name):
+                logger.debug(f"Dropping environment pool {slot.name}")
+                self._remove(slot)
+                continue
+            try:
+                entries = list(slot.iterdir())
+            except FileNotFoundError:
+                continue
+            for entry in entries:
+                try:
+                    if ((entry / READY_MARKER).is_file() or
+                            now - entry.stat().st_mtime < STALE_BUILD_SECONDS):
+                        continue
+                except FileNotFoundError:
+                    # claimed by another process meanwhile
+                    continue
+                self._remove(entry)
+
+    def _remove(self, path: Path):
+        try:
+            safe_rmtree(base_path=self.root, target_path=path)
+        except FileNotFoundError:
+            # claimed or pruned by another process meanwhile
+            pass
+
+    def refill(self, job: Job | None = None):
+        size = self.gcfg.cfg.pool_size
+        wanted = self.wanted_interpreters()
+        targets = []
+        for interpreter in wanted:
+            try:
+                version = query_interpreter_version(Path(interpreter))
+            except (OSError, ValueError, subprocess.CalledProcessError) as e:
+                logger.warning(f"Not pooling {interpreter}: {e}")
+                continue
+            targets.append((interpreter, version))
+        self.prune(set(wanted), {i: self._key(i, v) for i, v in targets})
+
+        missing = [(i, v, size - len(self.ready(i, v))) for i, v in targets]
+        total = sum(max(n, 0) for _, _, n in missing)
+        built = 0
+        for interpreter, version, n in missing:
+            for _ in range(n):
+                if job is not None:
+                    job.check_cancelled()
+                    job.report(built / total,
+                               f"Pooling {interpreter} ({built}/{total})")
+                self.build(interpreter, version)
+                built += 1
+
+    def schedule_refill(self) -> Job | None:
+        """Queue a refill behind all other work, unless one is pending."""
+        if not self.gcfg.cfg.pool_size:
+            return None
+        with self._lock:
+            if self._refill is not None and not self._refill.done:
+                return self._refill
+            self._refill = get_scheduler().submit("refill environment pool",
+                                                  self.refill,
+                                                  priority=Priority.BULK,
+                                                  resources=("disk", ))
+            return self._refill
+
+    def drain(self):
+        if self.root.is_dir():
+            safe_rmtree(base_path=self.root.parent, target_path=self.root)
+
+
+_POOL: EnvironmentPool | None = None
+
+
+def get_pool(gcfg: "_GlobalConfig") -> EnvironmentPool:
+    global _POOL
+    if _POOL is None:
+        _POOL = EnvironmentPool(gcfg)
+    return _POOL
@@ -0,0 +1,57 @@
+import subprocess
+import time
+from typing import TYPE_CHECKING
+
+from loguru import logger
+
+if TYPE_CHECKING:
+    from FluentPython.core.config import ConfigObj, FluentPyVersion
+
+
+def precompile_environment(ver: "FluentPyVersion",
+                           workers: int = 0,
+                           optimize_levels: list[int] | None = None) -> bool:
+    """Byte-compile the environment's site-packages with its own interpreter.
+
+    compileall skips modules whose cached bytecode is up to date, so this is
+    cheap to repeat. `workers=0` uses every core. Returns False if some
+    files failed to compile (common for test fixtures; not fatal).
+    """
+    optimize_levels = optimize_levels or [0]
+    compileall = ["-m", "compileall", "-q", "-j", str(workers)]
+    if ver.version >= (3, 9):
+        cmds = [[str(ver.py_executable), *compileall]]
+        for level in optimize_levels:
+            cmds[0] += ["-o", str(level)]
+    else:
+        # `compileall -o` is new in 3.9; older ones compile for the
+        # interpreter's own -O level, once per level
+        cmds = [[str(ver.py_executable), *["-O"] * level, *compileall]
+                for level in optimize_levels]
+
+    start = time.monotonic()
+    failed = []
+    for cmd in cmds:
+        cmd.append(str(ver.site_packages))
+        logger.debug(f"Running command: {cmd}")
+        res = subprocess.run(cmd,
+                             stdout=subprocess.PIPE,
+                             stderr=subprocess.STDOUT)
+        if res.returncode != 0:
+            failed.append(res.stdout.decode(errors='replace')[-2000:])
+    logger.info(
+        f"Precompiled {ver.name} in {time.monotonic() - start:.1f}s")
+    if failed:
+        logger.warning(
+            f"Some modules in {ver.name} failed to compile:\n{failed[-1]}")
+        return False
+    return True
+
+
+def precompile_if_enabled(ver: "FluentPyVersion", cfg: "ConfigObj"):
+    """Post-create/post-install hook honouring `precompile_after_install`."""
+    if not cfg.precompile_after_install:
+        return
+    precompile_environment(ver,
+                           workers=cfg.precompile_workers,
+                           optimize_levels=cfg.precompile_optimize_levels)
@@ -0,0 +1,166 @@
+import json
+import statistics
+import threading
+import time
+import urllib.error
+import urllib.request
+from pathlib import Path
+from typing import Callable
+
+from loguru import logger
+from pydantic import BaseModel, ValidationError
+
+SERVER_FILE_PATTERNS = ('jpserver-*.json', 'nbserver-*.json')
+
+
+class ServerInfo(BaseModel):
+    url: str
+    port: int
+    token: str = ""
+    pid: int | None = None
+    base_url: str = "/"
+
+    @property
+    def local_url(self):
+        """The server URL on localhost, with the token, as Colab expects it."""
+        return f"http://localhost:{self.port}{self.base_url}?token={self.token}"
+
+
+class LaunchRecord(BaseModel):
+    environment: str
+    kind: str
+    started_at: float
+    seconds: float
+
+
+def get_runtime_dir(session_id: str) -> Path:
+    """Per-session JUPYTER_RUNTIME_DIR, so only our server's files appear in it."""
+    from FluentPython.core.config import _GlobalConfig
+    return _GlobalConfig.user_cfgdir() / 'runtime' / session_id
+
+
+def _launches_file() -> Path:
+    from FluentPython.core.config import _GlobalConfig
+    return _GlobalConfig.user_cfgdir() / 'launches.jsonl'
+
+
+def record_launch(record: LaunchRecord):
+    path = _launches_file()
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with open(path, 'a', encoding='utf-8') as f:
+        f.write(record.model_dump_json() + '\n')
+
+
+def launch_history(environment: str | None = None) -> list[LaunchRecord]:
+    res = []
+    try:
+        with open(_launches_file(), encoding='utf-8') as f:
+            for line in f:
+                try:
+                    rec = LaunchRecord.model_validate_json(line)
+                except ValidationError:
+                    continue
+                if environment is None or rec.environment == environment:
+                    res.append(rec)
+    except FileNotFoundError:
+        pass
+    return res
+
+
+def median_launch_seconds(environment: str, kind: str,
+                          last: int = 10) -> float | None:
+    times = [
+        r.seconds for r in launch_history(environment) if r.kind == kind
+    ][-last:]
+    return statistics.median(times) if times else None
+
+
+def find_server_file(runtime_dir: Path) -> ServerInfo | None:
+    for pattern in SERVER_FILE_PATTERNS:
+        for path in sorted(runtime_dir.glob(pattern)):
+            try:
+                return ServerInfo.model_validate_json(path.read_text("utf-8"))
+            except (OSError, ValidationError, json.JSONDecodeError):
+                # the server may still be writing it
+                continue
+    return None
+
+
+def probe_server(info: ServerInfo, timeout: float = 1.0) -> bool:
+    url = f"http://127.0.0.1:{info.port}{info.base_url}api/status"
+    req = urllib.request.Request(
+        url, headers={"Authorization": f"token {info.token}"})
+    try:
+        with urllib.request.urlopen(req, timeout=timeout) as resp:
+            return resp.status == 200
+    except (urllib.error.URLError, OSError):
+        return False
+
+
+class ReadinessDetector:
+    """Waits for a Jupyter server to publish its runtime file and answer HTTP.
+
+    Runs on its own thread; `on_ready` receives the server info and the
+    seconds elapsed since `start()`.
+    """
+
+    def __init__(self,
+                 runtime_dir: Path,
+                 on_ready: Callable[[ServerInfo, float], None],
+                 on_timeout: Callable[[], None] | None = None,
+                 timeout: float = 300,
+                 environment: str | None = None,
+                 kind: str = "jupyter"):
+        self.runtime_dir = runtime_dir
+        self.on_ready = on_ready
+        self.on_timeout = on_timeout
+        self.timeout = timeout
+        self.environment = environment
+        self.kind = kind
+
+        self._cancelled = threading.Event()
+
+    @staticmethod
+    def prepare(runtime_dir: Path):
+        """Create the runtime dir and drop stale server files from earlier runs."""
+        runtime_dir.mkdir(parents=True, exist_ok=True)
+        for pattern in SERVER_FILE_PATTERNS:
+            for path in runtime_dir.glob(pattern):
+                path.unlink(missing_ok=True)
+
+    def start(self):
+        self._started_wall = time.time()
+        self._started = time.monotonic()
+        threading.Thread(target=self._run,
+                         name=f"Readiness-{self.runtime_dir.name}",
+                         daemon=True).start()
+
+    def cancel(self):
+        self._cancelled.set()
+
+    def _run(self):
+        delay = 0.05
+        deadline = self._started + self.timeout
+        while not self._cancelled.is_set() and time.monotonic() < deadline:
+            info = find_server_file(self.runtime_dir)
+            if info is not None and probe_server(info):
+                elapsed = time.monotonic() - self._started
+                logger.info(
+                    f"Jupyter server on port {info.port} ready in {elapsed:.2f}s"
+                )
+                if self.environment is not None:
+                    record_launch(
+                        LaunchRecord(environment=self.environment,
+                                     kind=self.kind,
+                                     started_at=self._started_wall,
+                                     seconds=elapsed))
+                self.on_ready(info, elapsed)
+                return
+            self._cancelled.wait(delay)
+            delay = min(delay * 2, 1.0)
+
+        if not self._cancelled.is_set():
+            logger.warning(
+                f"Jupyter server did not become ready within {self.timeout}s")
+            if self.on_timeout is not None:
+                self.on_timeout()
@@ -0,0 +1,319 @@
+import json
+import threading
+import time
+import uuid
+from dataclasses import asdict, dataclass, field
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from typing import TYPE_CHECKING
+
+from loguru import logger
+
+from FluentPython.core.idle import IdleMonitor
+from FluentPython.core.introspect import has_module
+from FluentPython.core.metrics import start_metrics_server
+from FluentPython.core.monitor import get_sampler
+from FluentPython.core.readiness import find_server_file
+from FluentPython.core.sessions import (SessionRecord, colab_command,
+                                        jupyter_lab_command, launch_detached,
+                                        live_sessions,
+                                        select_first_unused_port_from,
+                                        set_keep_alive, stop_session_async)
+from FluentPython.globals import OperationFailure
+
+if TYPE_CHECKING:
+    from FluentPython.core.config import _GlobalConfig
+
+SESSION_KINDS = {"jupyterlab": "jupyterlab", "colab": "notebook"}
+
+
+@dataclass
+class SessionRequest:
+    environment: str
+    kind: str
+    keep_alive: bool = False
+    id: str = field(default_factory=lambda: uuid.uuid4().hex[:12])
+    submitted_at: float = field(default_factory=time.time)
+    state: str = "queued"
+    session_id: str | None = None
+    error: str | None = None
+
+
+@dataclass
+class Usage:
+    sessions: int
+    rss: int
+    cpu_percent: float
+
+
+def headless_command(ver, kind: str) -> list[str]:
+    if kind == "colab":
+        return colab_command(ver, select_first_unused_port_from(8888))
+    return [*jupyter_lab_command(ver), "--no-browser"]
+
+
+class SessionServer:
+    """Queues session requests and starts them as capacity allows.
+
+    Limits come from `serve_max_sessions`, `serve_max_rss` and
+    `serve_max_cpu` (0 means unlimited) and cover every live session on
+    the machine, including ones started from the GUI.
+    """
+
+    def __init__(self, gcfg: "_GlobalConfig"):
+        self.gcfg = gcfg
+        self.cfg = gcfg.cfg
+        self.sampler = get_sampler()
+        self.idle = IdleMonitor(self.cfg)
+
+        self._watched: set[str] = set()
+        self._queue: list[SessionRequest] = []
+        self._requests: dict[str, SessionRequest] = {}
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._stop = threading.Event()
+
+    def submit(self, environment: str, kind: str,
+               keep_alive: bool = False) -> SessionRequest:
+        if kind not in SESSION_KINDS:
+            raise OperationFailure(f"Unknown session kind {kind!r}")
+        if self.gcfg.get_version(environment) is None:
+            raise OperationFailure(f"Environment {environment} not found")
+
+        req = SessionRequest(environment, kind, keep_alive)
+        with self._lock:
+            self._queue.append(req)
+            self._requests[req.id] = req
+        logger.info(f"Queued {kind} session for {environment} ({req.id})")
+        self._wakeup.set()
+        return req
+
+    def cancel(self, request_id: str) -> bool:
+        """Drop a queued request, or stop the session a request started."""
+        with self._lock:
+            req = self._requests.get(request_id)
+            if req is None:
+                return False
+            if req.state == "queued":
+                self._queue.remove(req)
+                req.state = "cancelled"
+                return True
+
+        for record in live_sessions():
+            if record.id == req.session_id:
+                stop_session_async(record)
+                req.state = "stopping"
+                return True
+        return False
+
+    def usage(self, records: list[SessionRecord]) -> Usage:
+        rss, cpu = 0, 0.0
+        for record in records:
+            sample = self.sampler.latest(record.id)
+            if sample is not None:
+                rss += sample.rss
+                cpu += sample.cpu_percent
+        return Usage(len(records), rss, cpu)
+
+    def _has_capacity(self, usage: Usage) -> bool:
+        cfg = self.cfg
+        if (cfg.serve_max_sessions
+                and usage.sessions >= cfg.serve_max_sessions):
+            return False
+        if cfg.serve_max_cpu and usage.cpu_percent >= cfg.serve_max_cpu:
+            return False
+        if cfg.serve_max_rss:
+            # leave room for one more session of the usual size
+            estimate = usage.rss / usage.sessions if usage.sessions else 0
+            if usage.rss + estimate >= cfg.serve_max_rss:
+                return False
+        return True
+
+    def _watch(self, records: list[SessionRecord]):
+        live = {r.id for r in records}
+        for record in records:
+            if record.id not in self._watched:
+                self.sampler.watch(record.id, record.pid)
+        for key in self._watched - live:
+            self.sampler.unwatch(key)
+        self._watched = live
+
+    def _launch(self, req: SessionRequest):
+        ver = self.gcfg.get_version(req.environment)
+        if ver is None:
+            raise OperationFailure(f"Environment {req.environment} not found")
+        self.gcfg.mark_used(ver)
+        if not has_module(ver.py_executable, SESSION_KINDS[req.kind]):
+            raise OperationFailure(
+                f"{SESSION_KINDS[req.kind]} is not installed in {ver.name}")
+
+        record, _ = launch_detached(
+            headless_command(ver, req.kind),
+            title=f"{req.kind}[{ver.name}, {'.'.join(map(str, ver.version))}]",
+            cfg=self.cfg,
+            environment=ver.name,
+            kind=req.kind)
+        if req.keep_alive:
+            set_keep_alive(record.id, True)
+        return record
+
+    def schedule_once(self):
+        records = live_sessions()
+        self._watch(records)
+        with self._lock:
+            for req in self._requests.values():
+                if (req.state in ("running", "stopping")
+                        and req.session_id not in self._watched):
+                    req.state = "done"
+
+        while not self._stop.is_set():
+            with self._lock:
+                if not self._queue:
+                    return
+                usage = self.usage(records)
+                if not self._has_capacity(usage):
+                    return
+                req = self._queue.pop(0)
+                req.state = "starting"
+
+            try:
+                record = self._launch(req)
+            except OperationFailure as e:
+                logger.error(f"Session request {req.id} failed: {e}")
+                req.state, req.error = "failed", str(e)
+                continue
+
+            logger.info(f"Started session {record.id} for request {req.id}")
+            req.state, req.session_id = "running", record.id
+            records.append(record)
+            self._watch(records)
+            if self.cfg.serve_max_rss or self.cfg.serve_max_cpu:
+                # a new session has no samples yet; measure before the next
+                return
+
+    def status(self) -> dict:
+        records = live_sessions()
+        sessions = []
+        for record in records:
+            info = None
+            if record.runtime_dir is not None:
+                info = find_server_file(Path(record.runtime_dir))
+            sample = self.sampler.latest(record.id)
+            sessions.append({
+                "id": record.id,
+                "title": record.title,
+                "environment": record.environment,
+                "kind": record.kind,
+                "pid": record.pid,
+                "started_at": record.started_at,
+                "keep_alive": record.keep_alive,
+                "url": info.local_url if info is not None else None,
+                "rss": sample.rss if sample is not None else None,
+                "cpu_percent":
+                sample.cpu_percent if sample is not None else None,
+            })
+
+        with self._lock:
+            queue = [asdict(r) for r in self._queue]
+            requests = [asdict(r) for r in self._requests.values()]
+
+        return {
+            "sessions": sessions,
+            "queue": queue,
+            "requests": requests,
+            "usage": asdict(self.usage(records)),
+            "limits": {
+                "sessions": self.cfg.serve_max_sessions,
+                "rss": self.cfg.serve_max_rss,
+                "cpu_percent": self.cfg.serve_max_cpu,
+            },
+        }
+
+    def run_scheduler(self):
+        self.idle.start()
+        while not self._stop.is_set():
+            try:
+                self.schedule_once()
+            except Exception as e:
+                logger.exception(e)
+            # wake up on new requests, or poll for capacity freeing up
+            self._wakeup.wait(self.cfg.monitor_interval)
+            self._wakeup.clear()
+
+    def stop(self):
+        self._stop.set()
+        self._wakeup.set()
+        self.idle.stop()
+
+
+def _make_handler(server: SessionServer):
+
+    class Handler(BaseHTTPRequestHandler):
+
+        def _reply(self, code: int, payload):
+            body = json.dumps(payload).encode('utf-8')
+            self.send_response(code)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def do_GET(self):
+            if self.path.rstrip('/') in ("", "/status"):
+                self._reply(200, server.status())
+            else:
+                self._reply(404, {"error": "not found"})
+
+        def do_POST(self):
+            if self.path.rstrip('/') != "/sessions":
+                self._reply(404, {"error": "not found"})
+                return
+            try:
+                length = int(self.headers.get("Content-Length", 0))
+                body = json.loads(self.rfile.read(length) or b"{}")
+                req = server.submit(body["environment"],
+                                    body.get("kind", "jupyterlab"),
+                                    bool(body.get("keep_alive", False)))
+            except (ValueError, KeyError, TypeError) as e:
+                self._reply(400, {"error": f"invalid request: {e}"})
+                return
+            except OperationFailure as e:
+                self._reply(400, {"error": str(e)})
+                return
+            self._reply(202, asdict(req))
+
+        def do_DELETE(self):
+            prefix = "/sessions/"
+            if not self.path.startswith(prefix):
+                self._reply(404, {"error": "not found"})
+                return
+            if server.cancel(self.path[len(prefix):].strip('/')):
+                self._reply(200, {"ok": True})
+            else:
+                self._reply(404, {"error": "no such request"})
+
+        def log_message(self, format, *args):
+            logger.debug(f"{self.address_string()} {format % args}")
+
+    return Handler
+
+
+def serve(gcfg: "_GlobalConfig", host: str, port: int):
+    if gcfg.cfg.metrics_port:
+        start_metrics_server(gcfg.cfg.metrics_host, gcfg.cfg.metrics_port)
+
+    server = SessionServer(gcfg)
+    threading.Thread(target=server.run_scheduler,
+                     name="SessionScheduler",
+                     daemon=True).start()
+
+    httpd = ThreadingHTTPServer((host, port), _make_handler(server))
+    logger.info(f"Serving session status on http://{host}:{port}/status")
+    try:
+        httpd.serve_forever()
+    except KeyboardInterrupt:
+        # sessions are detached and keep running; restart serve to manage them
+        logger.info("Shutting down; running sessions are left alive")
+    finally:
+        server.stop()
+        httpd.server_close()
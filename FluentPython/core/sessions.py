@@ -0,0 +1,514 @@
+import os
+import shutil
+import signal
+import socket
+import subprocess
+import threading
+import time
+import uuid
+from datetime import datetime
+from pathlib import Path
+from typing import TYPE_CHECKING, Callable
+
+from loguru import logger
+from pydantic import BaseModel, ValidationError
+
+from FluentPython.core.logs import MappedLog, SessionLog
+from FluentPython.core.metrics import (REGISTRY, SESSION_STOP_SECONDS,
+                                       SESSIONS_STARTED, SESSIONS_STOPPED)
+from FluentPython.core.readiness import ReadinessDetector, get_runtime_dir
+
+if TYPE_CHECKING:
+    from FluentPython.core.config import ConfigObj, FluentPyVersion
+
+try:
+    import psutil
+except ImportError:
+    psutil = None
+
+
+class SessionRecord(BaseModel):
+    id: str
+    title: str
+    cmd: list[str]
+    pid: int
+    log_dir: str
+    started_at: float
+    environment: str | None = None
+    kind: str | None = None
+    runtime_dir: str | None = None
+    keep_alive: bool = False
+    # start time of `pid`, so a reused pid is never taken for the session
+    create_time: float | None = None
+
+    @property
+    def log_path(self):
+        return Path(self.log_dir)
+
+
+def get_sessions_dir() -> Path:
+    from FluentPython.core.config import _GlobalConfig
+    return _GlobalConfig.user_cfgdir() / 'sessions'
+
+
+def select_first_unused_port_from(start_port: int):
+    p = start_port
+
+    while True:
+        with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as s:
+            try:
+                s.bind(('localhost', p))
+                return p
+            except OSError:
+                p += 1
+
+
+def jupyter_lab_command(ver: "FluentPyVersion") -> list[str]:
+    return [str(ver.py_executable), "-m", "jupyter", "lab"]
+
+
+def colab_command(ver: "FluentPyVersion", port: int) -> list[str]:
+    return [
+        str(ver.py_executable), "-m", "jupyter", "notebook",
+        "--NotebookApp.allow_origin='https://colab.research.google.com'",
+        f"--port={port}", "--no-browser"
+    ]
+
+
+def is_alive(pid: int) -> bool:
+    if psutil is not None:
+        try:
+            return psutil.Process(pid).status() != psutil.STATUS_ZOMBIE
+        except psutil.Error:
+            return False
+    if os.name == 'nt':
+        out = subprocess.run(["tasklist", "/FI", f"PID eq {pid}", "/NH"],
+                             capture_output=True,
+                             text=True).stdout
+        return str(pid) in out
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    # a zombie still answers kill(0); check its state where /proc exists
+    try:
+        with open(f"/proc/{pid}/stat", "rb") as f:
+            return f.read().rsplit(b')', 1)[1].split()[0] != b'Z'
+    except OSError:
+        return True
+
+
+def process_start_time(pid: int) -> float | None:
+    """When `pid` started, in seconds since the epoch; None if unknown."""
+    if psutil is not None:
+        try:
+            return psutil.Process(pid).create_time()
+        except psutil.Error:
+            return None
+    try:
+        with open(f"/proc/{pid}/stat", "rb") as f:
+            # field 22, counted after the parenthesised command name
+            ticks = int(f.read().rsplit(b')', 1)[1].split()[19])
+        with open("/proc/stat", "rb") as f:
+            btime = next(
+                int(line.split()[1]) for line in f
+                if line.startswith(b'btime'))
+    except (OSError, ValueError, IndexError, StopIteration):
+        return None
+    return btime + ticks / os.sysconf('SC_CLK_TCK')
+
+
+def session_alive(record: "SessionRecord") -> bool:
+    """Whether the session's process runs, and is still the one launched.
+
+    After a reboot or pid reuse the pid may name an unrelated process;
+    that one started after the session was launched, or at another time
+    than the one recorded.
+    """
+    if not is_alive(record.pid):
+        return False
+    started = process_start_time(record.pid)
+    if started is None:
+        return True
+    if record.create_time is not None:
+        return abs(started - record.create_time) < 1
+    return started <= record.started_at + 1
+
+
+def detached_popen_kwargs() -> dict:
+    """Popen arguments that put the child in its own session/process group."""
+    if os.name == 'nt':
+        return {
+            "creationflags":
+            subprocess.CREATE_NEW_PROCESS_GROUP
+            | subprocess.DETACHED_PROCESS | subprocess.CREATE_NO_WINDOW
+        }
+    return {"start_new_session": True}
+
+
+def save_record(record: SessionRecord):
+    d = get_sessions_dir()
+    d.mkdir(parents=True, exist_ok=True)
+    tmp = d / f"{record.id}.tmp"
+    tmp.write_text(record.model_dump_json(indent=4), "utf-8")
+    os.replace(tmp, d / f"{record.id}.json")
+
+
+def remove_record(session_id: str):
+    (get_sessions_dir() / f"{session_id}.json").unlink(missing_ok=True)
+    shutil.rmtree(get_runtime_dir(session_id), ignore_errors=True)
+
+
+def load_record(session_id: str) -> SessionRecord | None:
+    path = get_sessions_dir() / f"{session_id}.json"
+    try:
+        return SessionRecord.model_validate_json(path.read_text("utf-8"))
+    except (OSError, ValidationError):
+        return None
+
+
+def set_keep_alive(session_id: str, keep_alive: bool) -> bool:
+    """Pin a session so idle culling never stops it."""
+    record = load_record(session_id)
+    if record is None:
+        return False
+    record.keep_alive = keep_alive
+    save_record(record)
+    return True
+
+
+def list_records(prune: bool = True) -> list[SessionRecord]:
+    """Every saved record; unreadable ones are deleted if `prune`."""
+    res = []
+    d = get_sessions_dir()
+    if not d.is_dir():
+        return res
+    for path in d.glob('*.json'):
+        try:
+            res.append(
+                SessionRecord.model_validate_json(path.read_text("utf-8")))
+        except (OSError, ValidationError):
+            if prune:
+                logger.warning(f"Invalid session record {path}; removing")
+                path.unlink(missing_ok=True)
+    return sorted(res, key=lambda r: r.started_at)
+
+
+def live_sessions() -> list[SessionRecord]:
+    """Registered sessions whose process is still running; prunes the rest."""
+    res = []
+    for record in list_records():
+        if session_alive(record):
+            res.append(record)
+        else:
+            logger.debug(f"Session {record.id} is gone; removing record")
+            remove_record(record.id)
+    return res
+
+
+def launch_detached(cmd: list[str],
+                    title: str,
+                    cfg: "ConfigObj",
+                    environment: str | None = None,
+                    kind: str | None = None,
+                    cwd: str | None = None
+                    ) -> tuple[SessionRecord, subprocess.Popen]:
+    """Start `cmd` detached from this process, logging to a session log.
+
+    The child gets its own session/process group and writes straight into
+    the log file, so it keeps running when FluentPython exits.
+    """
+    session_id = uuid.uuid4().hex[:12]
+    log = SessionLog.for_session(
+        f"{datetime.now():%Y%m%d-%H%M%S}-{session_id}")
+
+    env = None
+    runtime_dir = None
+    if kind is not None:
+        runtime_dir = get_runtime_dir(session_id)
+        ReadinessDetector.prepare(runtime_dir)
+        env = dict(os.environ, JUPYTER_RUNTIME_DIR=str(runtime_dir))
+    env = dict(env or os.environ, PYTHONUNBUFFERED="1")
+
+    logger.debug(f"Launching detached session {session_id}: {cmd}")
+    out = _log_writer_fd(log, cfg)
+    try:
+        child = subprocess.Popen(cmd,
+                                 stdin=subprocess.DEVNULL,
+                                 stdout=out,
+                                 stderr=subprocess.STDOUT,
+                                 cwd=cwd or os.getcwd(),
+                                 env=env,
+                                 **detached_popen_kwargs())
+    finally:
+        # the writer sees EOF once every process holding the pipe exits
+        os.close(out)
+
+    record = SessionRecord(id=session_id,
+                           title=title,
+                           cmd=[str(c) for c in cmd],
+                           pid=child.pid,
+                           log_dir=str(log.dir),
+                           started_at=time.time(),
+                           create_time=process_start_time(child.pid),
+                           environment=environment,
+                           kind=kind,
+                           runtime_dir=str(runtime_dir) if runtime_dir else None)
+    save_record(record)
+    SESSIONS_STARTED.inc(kind=kind or "console")
+    return record, child
+
+
+def _log_writer_fd(log: SessionLog, cfg: "ConfigObj") -> int:
+    """A descriptor piped into a detached writer for `log`.
+
+    Falls back to appending to the active segment, unrotated, if the
+    writer cannot be started.
+    """
+    read_fd, write_fd = os.pipe()
+    try:
+        subprocess.Popen(log.writer_command(cfg.preferred_python_interpreter,
+                                            cfg.log_max_bytes,
+                                            cfg.log_keep_segments),
+                         stdin=read_fd,
+                         stdout=subprocess.DEVNULL,
+                         stderr=subprocess.DEVNULL,
+                         **detached_popen_kwargs())
+    except OSError as e:
+        logger.warning(
+            f"Cannot start log writer: {e}; {log.session} will not rotate")
+        os.close(write_fd)
+        return os.open(log.active_path,
+                       os.O_WRONLY | os.O_APPEND | os.O_CREAT
+                       | getattr(os, 'O_BINARY', 0))
+    finally:
+        os.close(read_fd)
+    return write_fd
+
+
+STOP_SIGNALS = (signal.SIGINT, signal.SIGTERM,
+                getattr(signal, 'SIGKILL', signal.SIGTERM))
+
+
+def _wait_gone(pids: set[int], timeout: float) -> set[int]:
+    """Poll until every pid has exited or `timeout` passes; returns the rest."""
+    deadline = time.monotonic() + timeout
+    delay = 0.02
+    alive = {p for p in pids if is_alive(p)}
+    while alive and time.monotonic() < deadline:
+        time.sleep(min(delay, max(deadline - time.monotonic(), 0)))
+        delay = min(delay * 2, 0.25)
+        alive = {p for p in alive if is_alive(p)}
+    return alive
+
+
+def _signal_tree(pgid: int, pids: set[int], sig: int):
+    try:
+        os.killpg(pgid, sig)
+    except (ProcessLookupError, PermissionError):
+        pass
+    # kernels are started in sessions of their own, outside our group
+    for pid in pids:
+        try:
+            os.kill(pid, sig)
+        except (ProcessLookupError, PermissionError):
+            pass
+
+
+def stop_session(record: SessionRecord,
+                 timeouts: tuple[float, float, float] = (5.0, 3.0, 2.0)
+                 ) -> list[int]:
+    """Stop a session and every process it spawned.
+
+    Sends SIGINT, SIGTERM and finally SIGKILL to the session's process group
+    and to each descendant, moving on to the next signal only if something
+    outlives the corresponding timeout. Blocks until done, so call it off
+    the UI thread. Returns the pids still alive afterwards.
+    """
+    from FluentPython.core.monitor import process_tree
+
+    if not session_alive(record):
+        # never signal whatever process reused the pid
+        logger.info(f"Session {record.id} is gone; removing record")
+        remove_record(record.id)
+        return []
+
+    start = time.monotonic()
+    pids = {record.pid, *process_tree(record.pid)}
+
+    if os.name == 'nt':
+        for args, timeout in ((["/T"], timeouts[1]), (["/T", "/F"],
+                                                      timeouts[2])):
+            subprocess.run(["taskkill", *args, "/PID",
+                            str(record.pid)],
+                           capture_output=True)
+            pids = _wait_gone(pids, timeout)
+            if not pids:
+                break
+    else:
+        for sig, timeout in zip(STOP_SIGNALS, timeouts):
+            # orphans get reparented, so collect descendants before each round
+            pids |= {
+                p
+                for pid in pids if is_alive(pid) for p in process_tree(pid)
+            }
+            logger.debug(
+                f"Sending {signal.Signals(sig).name} to session {record.id}: "
+                f"{sorted(pids)}")
+            _signal_tree(record.pid, pids, sig)
+            pids = _wait_gone(pids, timeout)
+            if not pids:
+                break
+
+    SESSION_STOP_SECONDS.observe(time.monotonic() - start)
+    if pids:
+        SESSIONS_STOPPED.inc(result="stragglers")
+        logger.warning(
+            f"Session {record.id} left processes behind: {sorted(pids)}")
+    else:
+        SESSIONS_STOPPED.inc(result="clean")
+        logger.info(f"Session {record.id} stopped")
+    return sorted(pids)
+
+
+def stop_session_async(record: SessionRecord,
+                       on_done: Callable[[list[int]], None] | None = None):
+    """Run `stop_session` on a thread; `on_done` receives the stragglers."""
+
+    def run():
+        stragglers = stop_session(record)
+        if on_done is not None:
+            on_done(stragglers)
+
+    threading.Thread(target=run, name=f"Stop-{record.id}", daemon=True).start()
+
+
+# read-only: a scrape from another process must not prune records
+REGISTRY.gauge("fluentpython_sessions_live",
+               "Registered sessions whose process is running",
+               lambda: sum(1 for r in list_records(prune=False)
+                           if session_alive(r)))
+
+
+class LogTailer:
+    """Follows a detached session's active log segment on a thread.
+
+    The segment is reopened on every poll. When the log writer has rotated
+    it, the rest of the old segment is read before the new one. With
+    `on_history`, everything logged before the backlog is passed to it in
+    batches first, so a reattached console can index the whole session.
+    """
+
+    def __init__(self,
+                 record: SessionRecord,
+                 on_line: Callable[[str], None],
+                 on_exit: Callable[[int | None], None],
+                 child: subprocess.Popen | None = None,
+                 backlog: int = 0,
+                 interval: float = 0.2,
+                 on_history: Callable[[list[str]], None] | None = None):
+        self.record = record
+        self.on_line = on_line
+        self.on_exit = on_exit
+        self.on_history = on_history
+        self.child = child
+        self.backlog = backlog
+        self.interval = interval
+        self.log = SessionLog(record.log_path)
+        self._stop = threading.Event()
+
+    def start(self):
+        threading.Thread(target=self._run,
+                         name=f"LogTailer-{self.record.id}",
+                         daemon=True).start()
+
+    def stop(self):
+        self._stop.set()
+
+    def _alive(self):
+        if self.child is not None:
+            return self.child.poll() is None
+        return session_alive(self.record)
+
+    def _run(self):
+        path = self.log.active_path
+        offset = 0
+        segment = self.log.next_segment_number()
+        if self.backlog > 0 and path.is_file():
+            mapped = MappedLog(path, live=True)
+            _, offset = mapped.tail(self.backlog)
+            mapped.close()
+        if self.on_history is not None:
+            self._read_history(segment, offset)
+
+        identity = None
+        pending = b''
+        while not self._stop.is_set():
+            alive = self._alive()
+            data = b''
+            try:
+                with open(path, 'rb') as f:
+                    st = os.fstat(f.fileno())
+                    if identity is None:
+                        identity = (st.st_dev, st.st_ino)
+                    elif identity != (st.st_dev, st.st_ino):
+                        data, segment = self.log.read_rotated(
+                            segment, offset)
+                        identity = (st.st_dev, st.st_ino)
+                        offset = 0
+                    elif st.st_size < offset:
+                        # truncated by an older FluentPython
+                        offset = 0
+                    f.seek(offset)
+                    new = f.read()
+                    offset += len(new)
+                    data += new
+            except FileNotFoundError:
+                pass
+
+            pending += data
+            *lines, pending = pending.split(b'\n')
+            for line in lines:
+                self.on_line(_decode_line(line))
+
+            if not alive:
+                if pending:
+                    self.on_line(pending.decode('utf-8', errors='replace'))
+                remove_record(self.record.id)
+                self.on_exit(self.child.returncode
+                             if self.child is not None else None)
+                return
+
+            self._stop.wait(self.interval)
+
+    def _read_history(self, segment: int, end: int):
+        """Rotated segments below `segment`, then the active one up to `end`."""
+        assert self.on_history is not None
+        for data in self.log.rotated(segment):
+            if self._stop.is_set():
+                return
+            self.on_history(_split_lines(data))
+        if end > 0:
+            try:
+                with open(self.log.active_path, 'rb') as f:
+                    data = f.read(end)
+            except FileNotFoundError:
+                return
+            self.on_history(_split_lines(data))
+
+
+def _decode_line(line: bytes) -> str:
+    try:
+        text = line.decode('utf-8')
+    except UnicodeDecodeError:
+        text = line.decode('gbk', errors='replace')
+    return text.rstrip('\r')
+
+
+def _split_lines(data: bytes) -> list[str]:
+    lines = data.split(b'\n')
+    if lines and not lines[-1]:
+        lines.pop()
+    return [_decode_line(line) for line in lines]
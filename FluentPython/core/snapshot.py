@@ -0,0 +1,263 @@
+import io
+import json
+import os
+import shutil
+import tarfile
+import time
+import uuid
+from pathlib import Path, PurePosixPath
+from typing import TYPE_CHECKING
+
+import zstandard
+from loguru import logger
+from pydantic import BaseModel
+
+from FluentPython.core.introspect import introspect
+from FluentPython.core.packages import installed_distributions
+from FluentPython.core.utils import myhash
+from FluentPython.globals import OperationFailure
+
+if TYPE_CHECKING:
+    from FluentPython.core.config import FluentPyVersion, _GlobalConfig
+
+MANIFEST = 'fluentpy-snapshot.json'
+ENV_ROOT = 'env'
+STREAM_BUFSIZE = 1024 * 1024
+# text files larger than this are never rewritten during relocation
+RELOCATE_MAX_BYTES = 1024 * 1024
+
+
+class SnapshotManifest(BaseModel):
+    format: int = 1
+    name: str
+    version: tuple[int, int, int]
+    implementation: str
+    platform: str
+    soabi: str | None
+    envdir: str
+    config: dict
+    distributions: dict[str, str]
+    created_at: float
+
+
+def export_environment(ver: "FluentPyVersion",
+                       out: Path,
+                       level: int = 3,
+                       threads: int = -1) -> SnapshotManifest:
+    """Stream an environment into a .tar.zst archive.
+
+    The tarball is produced straight into a multi-threaded zstd writer, so
+    memory use does not depend on the environment size.
+    """
+    info = introspect(ver.py_executable)
+    manifest = SnapshotManifest(
+        name=ver.name,
+        version=ver.version,
+        implementation=info.implementation,
+        platform=info.platform,
+        soabi=info.soabi,
+        envdir=str(ver.envdir),
+        config=json.loads((ver.envdir / 'fluentpy.json').read_text("utf-8")),
+        distributions={
+            d.name: d.version
+            for d in installed_distributions(ver.site_packages).values()
+        },
+        created_at=time.time())
+    manifest_bytes = manifest.model_dump_json(indent=4).encode("utf-8")
+
+    cctx = zstandard.ZstdCompressor(level=level, threads=threads)
+    with open(out, 'wb') as f, cctx.stream_writer(f) as zw, tarfile.open(
+            fileobj=zw, mode='w|', bufsize=STREAM_BUFSIZE) as tar:
+        ti = tarfile.TarInfo(MANIFEST)
+        ti.size = len(manifest_bytes)
+        ti.mtime = int(manifest.created_at)
+        tar.addfile(ti, io.BytesIO(manifest_bytes))
+
+        tar.add(ver.envdir,
+                arcname=ENV_ROOT,
+                filter=lambda ti: None
+                if '__pycache__' in ti.name.split('/') else ti)
+
+    logger.info(f"Exported {ver.name} to {out}")
+    return manifest
+
+
+def _is_text(path: Path) -> bool:
+    with open(path, 'rb') as f:
+        return b'\0' not in f.read(8192)
+
+
+def _relocate_launcher(path: Path, old_prefix: str, new_prefix: str):
+    """Rewrite the interpreter line of a Windows console-script launcher.
+
+    A launcher is a stub executable, a '#!<python>' line and a zip of the
+    script. The stub finds the line just before the zip, which it locates
+    from the end of the file, so the line may change length.
+    """
+    data = path.read_bytes()
+    eocd = data.rfind(b'PK\x05\x06')
+    if eocd < 0 or len(data) < eocd + 22:
+        return
+    cd_size = int.from_bytes(data[eocd + 12:eocd + 16], 'little')
+    cd_offset = int.from_bytes(data[eocd + 16:eocd + 20], 'little')
+    zip_start = eocd - cd_size - cd_offset
+    line_start = data.rfind(b'#!', 0, zip_start)
+    if zip_start < 0 or line_start < 0:
+        return
+    shebang = data[line_start:zip_start]
+    if old_prefix.encode() not in shebang:
+        return
+    path.write_bytes(data[:line_start] +
+                     shebang.replace(old_prefix.encode(), new_prefix.encode()) +
+                     data[zip_start:])
+
+
+def relocate_environment(envdir: Path,
+                         old_prefix: str,
+                         interpreter: str | None = None,
+                         new_prefix: Path | None = None):
+    """Rewrite absolute paths in the venv at `envdir`.
+
+    `new_prefix` is where the venv will finally live (defaults to
+    `envdir`), so a staged copy can be fixed up before being moved into
+    place. Covers pyvenv.cfg, the interpreter symlinks, script shebangs,
+    launchers and activation scripts, and .pth/.egg-link files in
+    site-packages. Only paths under `old_prefix` change, unless
+    `interpreter` is given: then the venv is also pointed at it, for venvs
+    that come from another machine.
+    """
+    new_prefix = new_prefix or envdir
+    old, new = old_prefix.encode(), str(new_prefix).encode()
+
+    cfg_path = envdir / 'pyvenv.cfg'
+    lines = []
+    for line in cfg_path.read_text("utf-8").splitlines():
+        key = line.partition('=')[0].strip()
+        if interpreter is not None and key == 'home':
+            line = f"home = {Path(interpreter).parent}"
+        elif interpreter is not None and key == 'executable':
+            line = f"executable = {interpreter}"
+        elif interpreter is not None and key == 'command':
+            line = f"command = {interpreter} -m venv {new_prefix}"
+        else:
+            line = line.replace(old_prefix, str(new_prefix))
+        lines.append(line)
+    cfg_path.write_text('\n'.join(lines) + '\n', "utf-8")
+
+    scripts = envdir / ('Scripts' if os.name == 'nt' else 'bin')
+    candidates = [p for p in scripts.iterdir()] if scripts.is_dir() else []
+    for site in envdir.glob('[Ll]ib/**/site-packages'):
+        candidates.extend(site.glob('*.pth'))
+        candidates.extend(site.glob('*.egg-link'))
+
+    for path in candidates:
+        if path.is_symlink():
+            target = os.readlink(path)
+            if not path.name.startswith('python') or not os.path.isabs(
+                    target):
+                continue
+            if interpreter is not None:
+                target = interpreter
+            elif target.startswith(old_prefix):
+                target = str(new_prefix) + target[len(old_prefix):]
+            else:
+                continue
+            path.unlink()
+            path.symlink_to(target)
+            continue
+        if not path.is_file() or path.stat().st_size > RELOCATE_MAX_BYTES:
+            continue
+        if path.suffix.lower() == '.exe':
+            _relocate_launcher(path, old_prefix, str(new_prefix))
+            continue
+        if not _is_text(path):
+            continue
+        data = path.read_bytes()
+        if old in data:
+            path.write_bytes(data.replace(old, new))
+
+
+def _is_interpreter_link(name: str) -> bool:
+    parts = PurePosixPath(name).parts
+    return (len(parts) == 3 and parts[0] == ENV_ROOT
+            and parts[1] in ('bin', 'Scripts')
+            and parts[2].startswith('python'))
+
+
+def import_environment(cfg: "_GlobalConfig",
+                       archive: Path,
+                       name: str | None = None,
+                       interpreter: str | None = None) -> "FluentPyVersion":
+    from FluentPython.core.config import FluentPyVersion, VersionConfig
+
+    interpreter = interpreter or cfg.cfg.preferred_python_interpreter
+    info = introspect(interpreter)
+
+    staging_root = cfg.user_cfgdir() / 'tmp'
+    staging_root.mkdir(parents=True, exist_ok=True)
+    staging = staging_root / f"import-{uuid.uuid4().hex}"
+    staging.mkdir()
+
+    try:
+        dctx = zstandard.ZstdDecompressor()
+        with open(archive, 'rb') as f, dctx.stream_reader(f) as zr, tarfile.open(
+                fileobj=zr, mode='r|', bufsize=STREAM_BUFSIZE) as tar:
+            first = tar.next()
+            if first is None or first.name != MANIFEST:
+                raise OperationFailure(
+                    f"{archive} is not a FluentPython snapshot")
+            fobj = tar.extractfile(first)
+            assert fobj is not None
+            manifest = SnapshotManifest.model_validate_json(fobj.read())
+
+            target_name = name or manifest.name
+            if cfg.get_version(target_name) is not None:
+                raise OperationFailure(
+                    f"Environment {target_name} already exists")
+            if (info.implementation != manifest.implementation
+                    or info.version[:2] != manifest.version[:2]):
+                raise OperationFailure(
+                    f"Snapshot needs {manifest.implementation} {'.'.join(map(str, manifest.version[:2]))}, "
+                    f"but {interpreter} is {info.implementation} {'.'.join(map(str, info.version[:2]))}"
+                )
+
+            external_links = []
+            for member in tar:
+                if member.name == MANIFEST:
+                    continue
+                if member.issym() and os.path.isabs(member.linkname):
+                    # interpreter links point into the source machine;
+                    # recreated below
+                    if _is_interpreter_link(member.name):
+                        external_links.append(staging / member.name)
+                    else:
+                        logger.warning(
+                            f"Skipping {member.name}: links outside the "
+                            f"environment to {member.linkname}")
+                    continue
+                if hasattr(tarfile, 'data_filter'):
+                    tar.extract(member, staging, filter='data')
+                else:
+                    tar.extract(member, staging)
+
+        envdir = staging / ENV_ROOT
+        target = cfg.environments_dir / myhash(target_name)
+        for link in external_links:
+            link.symlink_to(interpreter)
+        # paths are rewritten for the final location before moving into place
+        relocate_environment(envdir,
+                             manifest.envdir,
+                             interpreter,
+                             new_prefix=target)
+
+        ver_config = VersionConfig(name=target_name, interpreter=interpreter)
+        (envdir / 'fluentpy.json').write_text(
+            json.dumps(ver_config.model_dump(), indent=4, ensure_ascii=False),
+            "utf-8")
+
+        os.replace(envdir, target)
+    finally:
+        shutil.rmtree(staging, ignore_errors=True)
+
+    logger.info(f"Imported {target_name} from {archive}")
+    return FluentPyVersion(target_name, info.version)
@@ -4,40 +4,25 @@ import subprocess
 from functools import lru_cache
 from pathlib import Path
 
-from loguru import logger
+from FluentPython.core.introspect import introspect
 
 POSSIBLE_INTERPRETERS = ['python3', 'python']
 
 
 def find_python_interpreter() -> str | None:
     for intp in POSSIBLE_INTERPRETERS:
+        path = shutil.which(intp)
+        if path is None:
+            continue
         try:
-            res = subprocess.check_output(
-                f"{intp} -c \"import sys; print(sys.executable)\"", shell=True)
-            res = res.decode().strip()
-            return res
-        except subprocess.CalledProcessError:
+            return introspect(path).executable
+        except (subprocess.CalledProcessError, OSError):
             pass
     return None
 
 
 def query_interpreter_version(interpreter: Path) -> tuple[int, int, int]:
-    if not interpreter.exists():
-        raise FileNotFoundError(f"Python interpreter {interpreter} not found")
-
-    res = subprocess.check_output(
-        [str(interpreter), "-c", "import sys; print(sys.version_info[:3])"])
-    res = res.decode().strip()
-    # res: (X, Y, Z)
-    res = tuple(int(x) for x in res[1:-1].split(','))
-
-    if len(res) != 3:
-        if len(res) == 2:
-            res = (res[0], res[1], 0)
-        else:
-            logger.error(f"Invalid interpreter version: {res}")
-            raise ValueError("Invalid interpreter version")
-    return res
+    return introspect(interpreter).version
 
 
 def safe_rmtree(base_path: Path, target_path: Path):
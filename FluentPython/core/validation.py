@@ -0,0 +1,151 @@
+import json
+import os
+import shutil
+import threading
+import time
+from pathlib import Path
+
+from loguru import logger
+from pydantic import BaseModel, ValidationError
+
+QUARANTINE_INFO = '.quarantine.json'
+
+
+class EnvFingerprint(BaseModel):
+    pyvenv_cfg: int
+    fluentpy_json: int
+    interpreter: int
+    interpreter_path: str
+    name: str
+    version: tuple[int, int, int]
+
+
+class QuarantineInfo(BaseModel):
+    original: str
+    reason: str
+    quarantined_at: float
+
+
+def _mtime(path: Path) -> int | None:
+    try:
+        return path.stat().st_mtime_ns
+    except OSError:
+        return None
+
+
+def env_mtimes(version_dir: Path,
+               interpreter: str) -> tuple[int, int, int] | None:
+    """Cheap stat-only fingerprint; None if any of the files is missing."""
+    res = (_mtime(version_dir / 'pyvenv.cfg'),
+           _mtime(version_dir / 'fluentpy.json'), _mtime(Path(interpreter)))
+    if None in res:
+        return None
+    return res  # type: ignore
+
+
+class FingerprintStore:
+    """Remembers which environment directories were fully validated.
+
+    Safe to share between threads; the lock is only held for the update
+    itself, never while an environment is probed.
+    """
+
+    def __init__(self, path: Path):
+        self.path = path
+        self._entries: dict[str, EnvFingerprint] | None = None
+        self._dirty = False
+        self._lock = threading.RLock()
+
+    def _load(self) -> dict[str, EnvFingerprint]:
+        with self._lock:
+            return self._load_locked()
+
+    def _load_locked(self) -> dict[str, EnvFingerprint]:
+        if self._entries is None:
+            self._entries = {}
+            try:
+                raw = json.loads(self.path.read_text("utf-8"))
+                self._entries = {
+                    k: EnvFingerprint.model_validate(v)
+                    for k, v in raw.items()
+                }
+            except FileNotFoundError:
+                pass
+            except (json.JSONDecodeError, ValidationError, AttributeError):
+                logger.warning(
+                    f"Invalid fingerprint cache {self.path}; discarding")
+        return self._entries
+
+    def lookup(self, version_dir: Path) -> EnvFingerprint | None:
+        """The cached fingerprint if the directory is unchanged since validation."""
+        fp = self._load().get(version_dir.name)
+        if fp is None:
+            return None
+        if env_mtimes(version_dir, fp.interpreter_path) != (
+                fp.pyvenv_cfg, fp.fluentpy_json, fp.interpreter):
+            return None
+        return fp
+
+    def record(self, version_dir: Path, name: str, interpreter: str,
+               version: tuple[int, int, int]):
+        mtimes = env_mtimes(version_dir, interpreter)
+        if mtimes is None:
+            return
+        fp = EnvFingerprint(pyvenv_cfg=mtimes[0],
+                            fluentpy_json=mtimes[1],
+                            interpreter=mtimes[2],
+                            interpreter_path=interpreter,
+                            name=name,
+                            version=version)
+        with self._lock:
+            self._load_locked()[version_dir.name] = fp
+            self._dirty = True
+
+    def forget(self, dirname: str):
+        with self._lock:
+            if self._load_locked().pop(dirname, None) is not None:
+                self._dirty = True
+
+    def save(self):
+        with self._lock:
+            if not self._dirty:
+                return
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            tmp = self.path.with_suffix('.tmp')
+            tmp.write_text(
+                json.dumps({k: v.model_dump()
+                            for k, v in self._load_locked().items()}),
+                "utf-8")
+            os.replace(tmp, self.path)
+            self._dirty = False
+
+
+def quarantine(version_dir: Path, quarantine_dir: Path, reason: str) -> Path:
+    """Move a broken environment out of the way instead of deleting it."""
+    quarantine_dir.mkdir(parents=True, exist_ok=True)
+    target = quarantine_dir / f"{version_dir.name}-{int(time.time())}"
+    shutil.move(str(version_dir), str(target))
+    (target / QUARANTINE_INFO).write_text(
+        QuarantineInfo(original=version_dir.name,
+                       reason=reason,
+                       quarantined_at=time.time()).model_dump_json(), "utf-8")
+    logger.warning(f"Quarantined {version_dir} to {target}: {reason}")
+    return target
+
+
+def quarantined(quarantine_dir: Path) -> list[tuple[Path, QuarantineInfo]]:
+    res = []
+    if not quarantine_dir.is_dir():
+        return res
+    for entry in sorted(quarantine_dir.iterdir()):
+        if not entry.is_dir():
+            continue
+        try:
+            info = QuarantineInfo.model_validate_json(
+                (entry / QUARANTINE_INFO).read_text("utf-8"))
+        except (OSError, ValidationError):
+            info = QuarantineInfo(original=entry.name.rsplit('-', 1)[0],
+                                  reason="unknown",
+                                  quarantined_at=entry.stat().st_mtime)
+        res.append((entry, info))
+    return res
@@ -1,13 +1,18 @@
-from PySide6.QtCore import Qt
+from PySide6.QtCore import Qt, QTimer
 from PySide6.QtGui import QIcon
 from PySide6.QtWidgets import QApplication, QMainWindow, QWidget
 from qfluentwidgets import FluentIcon as FIF
 from qfluentwidgets import (FluentWindow, NavigationItemPosition,
                             SubtitleLabel, setFont)
 
+from FluentPython.core.config import CFG
+from FluentPython.core.metrics import start_metrics_server
+from FluentPython.core.pool import get_pool
 from FluentPython.gui.home import PageHome
 from FluentPython.gui.jupyter import PageJupyter
+from FluentPython.gui.store import EnvironmentStore
 from FluentPython.gui.versions import PageVersions
+from FluentPython.gui.watchdog import StallWatchdog
 
 
 class FluentPythonMainWindow(FluentWindow):
@@ -15,9 +20,11 @@ class FluentPythonMainWindow(FluentWindow):
     def __init__(self, parent=None):
         super().__init__(parent)
 
+        self.store = EnvironmentStore(self)
+
         self.homeInterface = PageHome(self)
-        self.versionsInterface = PageVersions(self)
-        self.jupyterInterface = PageJupyter(self)
+        self.versionsInterface = PageVersions(self.store, self)
+        self.jupyterInterface = PageJupyter(self.store, self)
 
         self.initNavigation()
         self.initWindow()
@@ -40,6 +47,25 @@ class FluentPythonMainWindow(FluentWindow):
 
 def start_gui():
     app = QApplication()
+
+    if CFG.cfg.metrics_port:
+        start_metrics_server(CFG.cfg.metrics_host, CFG.cfg.metrics_port)
+
+    watchdog = None
+    if CFG.cfg.stall_watchdog:
+        watchdog = StallWatchdog(CFG.cfg.stall_threshold)
+        watchdog.start()
+
     w = FluentPythonMainWindow()
     w.show()
+    # scan environments only once the window has been painted
+    QTimer.singleShot(0, w.store.refresh)
+    # sessions run detached, so the ones from the last run may still be alive
+    QTimer.singleShot(0, w.jupyterInterface.reattach_live_sessions)
+    # a no-op unless pool_size is set; runs behind all interactive jobs
+    QTimer.singleShot(0, get_pool(CFG).schedule_refill)
     app.exec()
+
+    if watchdog is not None:
+        watchdog.stop()
+        watchdog.report()
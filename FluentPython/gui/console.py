@@ -1,22 +1,43 @@
 import json
-import os
+import re
 import subprocess
-import threading
-import time
 from datetime import datetime
+from pathlib import Path
 
 from loguru import logger
-from PySide6.QtCore import QEvent, QSize, Qt, Signal
-from PySide6.QtGui import QColor, QFont, QTextCursor
+from PySide6.QtCore import QEvent, QSize, Qt, QTimer, Signal
+from PySide6.QtGui import QColor, QFont, QTextBlock, QTextCursor
 from PySide6.QtWidgets import QLabel, QPushButton, QTextEdit, QWidget
 from qfluentwidgets import FluentIcon as FIF
-from qfluentwidgets import InfoBar, InfoBarPosition, PushButton
+from qfluentwidgets import (ComboBox, InfoBar, InfoBarPosition, LineEdit,
+                            PushButton)
+
+from FluentPython.core.config import CFG
+from FluentPython.core.lineindex import Level, LineIndex
+from FluentPython.core.monitor import get_sampler
+from FluentPython.core.readiness import ReadinessDetector
+from FluentPython.core.sessions import (LogTailer, SessionRecord,
+                                        launch_detached,
+                                        stop_session_async)
+from FluentPython.gui.logviewer import LogViewerPage
 
 
 class ConsoleExecutionPage(QWidget):
     terminalUpdated = Signal(str)
-
-    def __init__(self, cmd: list[str], tipbar: str, parent=None):
+    serverReady = Signal(object, float)
+    detachRequested = Signal()
+    focused = Signal()
+
+    _lineReceived = Signal(str)
+    _sessionEnded = Signal(object)
+    _stopFinished = Signal(list)
+
+    def __init__(self,
+                 cmd: list[str],
+                 tipbar: str,
+                 parent=None,
+                 environment: str | None = None,
+                 jupyter_kind: str | None = None):
         super().__init__(parent)
 
         self._parent = parent
@@ -30,6 +51,9 @@ class ConsoleExecutionPage(QWidget):
         )
         self.text_edit.setReadOnly(True)
         self.text_edit.setPlainText("[Runner] Not started yet")
+        # full history lives in the session log; keep the widget bounded
+        self.text_edit.document().setMaximumBlockCount(
+            CFG.cfg.console_max_blocks)
 
         self.idle_text = "Ready, click 'Start' to run \"" + (
             tipbar or "<program>").strip() + "\""
@@ -44,18 +68,73 @@ class ConsoleExecutionPage(QWidget):
         self.button_end = PushButton(FIF.PAUSE, "Stop", self)
         self.button_end.clicked.connect(self.stop_program)
 
-        self.buttons = [self.button_start, self.button_end]
+        self.button_log = PushButton(FIF.DOCUMENT, "Log", self)
+        self.button_log.clicked.connect(self.open_log)
+
+        self.button_detach = PushButton(FIF.CLOSE, "Detach", self)
+        self.button_detach.clicked.connect(self.detach)
+
+        self.search_edit = LineEdit(self)
+        self.search_edit.setPlaceholderText("搜索（正则）")
+        self.search_edit.setClearButtonEnabled(True)
+        self.search_edit.returnPressed.connect(self.find_next)
+
+        self.level_box = ComboBox(self)
+        self.level_box.addItems(["All levels", "WARNING+", "ERROR+"])
+
+        self.button_find = PushButton(FIF.SEARCH, "Find next", self)
+        self.button_find.clicked.connect(self.find_next)
+
+        self.button_next_error = PushButton(FIF.DOWN, "Next error", self)
+        self.button_next_error.clicked.connect(self.jump_next_error)
+
+        self.buttons = [
+            self.button_start, self.button_end, self.button_log,
+            self.button_detach, self.search_edit, self.level_box,
+            self.button_find, self.button_next_error
+        ]
         for button in self.buttons:
             button.setFont(QFont('MiSans', 10))
 
         self.reposition()
 
         self.child = None
+        self.record = None
+        self.tailer = None
         self.stopping = False
         self.cmd = cmd
+        self.tipbar = tipbar
+        self.log_dir = None
+        self.log_viewer = None
+        self.index = LineIndex()
+        self._search_pos = 0
+
+        # Jupyter servers report readiness through their runtime directory
+        self.environment = environment
+        self.jupyter_kind = jupyter_kind
+        self.detector = None
+
+        self._lineReceived.connect(self._outputReceived)
+        self._sessionEnded.connect(self.on_session_ended)
+        self._stopFinished.connect(self.on_stop_finished)
+
+        self._status = self.idle_text
+        self.sampler = get_sampler()
+        self.monitor_timer = QTimer(self)
+        self.monitor_timer.setInterval(int(self.sampler.interval * 1000))
+        self.monitor_timer.timeout.connect(self.renderStatus)
 
     def updateStatus(self, status: str):
-        self.status_label.setText(f"State: {status.strip()}")
+        self._status = status.strip()
+        self.renderStatus()
+
+    def renderStatus(self):
+        text = f"State: {self._status}"
+        sample = self.sampler.latest(
+            self.record.id) if self.record is not None else None
+        if sample is not None:
+            text += f" | {sample.describe()}"
+        self.status_label.setText(text)
 
     def reposition(self):
         sz = self.size()
@@ -73,45 +152,204 @@ class ConsoleExecutionPage(QWidget):
                                    window_height - 70)
 
         self.status_label.setGeometry(10, window_height - 60 + 20,
-                                      window_width - 150, 30)
+                                      window_width - 20, 30)
 
     def resizeEvent(self, event):
         self.reposition()
 
+    def showEvent(self, event):
+        super().showEvent(event)
+        self.focused.emit()
+
+    def open_log(self, event):
+        if self.log_dir is None:
+            InfoBar.info(title="暂无日志",
+                         content="程序启动后才会产生日志",
+                         orient=Qt.Orientation.Horizontal,
+                         isClosable=True,
+                         position=InfoBarPosition.TOP_RIGHT,
+                         duration=1500,
+                         parent=self.topLevelWidget())
+            return
+
+        self.log_viewer = LogViewerPage(self.log_dir)
+        self.log_viewer.show()
+
+    def _min_level(self):
+        return [Level.UNKNOWN, Level.WARNING,
+                Level.ERROR][max(self.level_box.currentIndex(), 0)]
+
+    def _notify_not_found(self, content: str):
+        InfoBar.info(title="未找到",
+                     content=content,
+                     orient=Qt.Orientation.Horizontal,
+                     isClosable=True,
+                     position=InfoBarPosition.TOP_RIGHT,
+                     duration=1500,
+                     parent=self.topLevelWidget())
+
+    def find_next(self, event=None):
+        pattern = self.search_edit.text()
+        if not pattern:
+            return
+        try:
+            rx = re.compile(pattern, re.MULTILINE)
+        except re.error as e:
+            InfoBar.error(title="正则表达式无效",
+                          content=str(e),
+                          orient=Qt.Orientation.Horizontal,
+                          isClosable=True,
+                          position=InfoBarPosition.TOP_RIGHT,
+                          duration=1500,
+                          parent=self.topLevelWidget())
+            return
+
+        min_level = self._min_level()
+        n = next(self.index.search(rx, self._search_pos, min_level), None)
+        if n is None and self._search_pos > 0:
+            n = next(self.index.search(rx, 0, min_level), None)
+        if n is None:
+            self._notify_not_found(f"没有匹配 {pattern} 的输出")
+            return
+        self.jump_to_line(n)
+
+    def jump_next_error(self, event=None):
+        n = self.index.next_error(self._search_pos)
+        if n is None and self._search_pos > 0:
+            n = self.index.next_error(0)
+        if n is None:
+            self._notify_not_found("输出中没有错误")
+            return
+        self.jump_to_line(n)
+
+    def jump_to_line(self, n: int):
+        self._search_pos = n + 1
+
+        block = self._block_for_line(n)
+        if block is None:
+            self.updateStatus(f"第 {n + 1} 行（已移出控制台，请在日志中查看）: "
+                              f"{self.index.line(n)[:80]}")
+            return
+
+        cursor = QTextCursor(block)
+        cursor.select(QTextCursor.SelectionType.BlockUnderCursor)
+        self.text_edit.setTextCursor(cursor)
+        self.text_edit.ensureCursorVisible()
+        self.updateStatus(f"第 {n + 1} 行")
+
+    def _block_for_line(self, n: int) -> QTextBlock | None:
+        """The block showing index line `n`, if it is still in the console.
+
+        Output blocks carry their line number as user state and appear in
+        order; untagged blocks (notices, trailing newlines) are skipped by
+        stepping back to the nearest tagged one.
+        """
+        doc = self.text_edit.document()
+        lo, hi = 0, doc.blockCount() - 1
+        while lo <= hi:
+            mid = (lo + hi) // 2
+            block = doc.findBlockByNumber(mid)
+            while block.userState() < 0 and block.blockNumber() > lo:
+                block = block.previous()
+            state = block.userState()
+            if state == n:
+                return block
+            if state < n:
+                lo = mid + 1
+            else:
+                hi = block.blockNumber() - 1
+        return None
+
+    @classmethod
+    def attach(cls, record: SessionRecord, parent=None, backlog: int = 500):
+        """A console following an already running (detached) session."""
+        page = cls(record.cmd,
+                   tipbar=record.title,
+                   parent=parent,
+                   environment=record.environment,
+                   jupyter_kind=record.kind)
+        page.updateTerminal(f"[Runner] Reattached to session {record.id}")
+        page._follow(record,
+                     None,
+                     backlog=backlog,
+                     fresh=False,
+                     history=True)
+        return page
+
+    def _index_history(self, lines: list[str]):
+        # runs on the tailer thread, before any line of the backlog arrives
+        for line in lines:
+            self.index.append(line.rstrip())
+
+    def _follow(self, record: SessionRecord, child: subprocess.Popen | None,
+                backlog: int, fresh: bool, history: bool = False):
+        self.record = record
+        self.child = child
+        self.log_dir = record.log_path
+
+        self.tailer = LogTailer(record,
+                                on_line=self._lineReceived.emit,
+                                on_exit=self._sessionEnded.emit,
+                                child=child,
+                                backlog=backlog,
+                                on_history=self._index_history
+                                if history else None)
+        self.tailer.start()
+
+        if record.kind is not None and record.runtime_dir is not None:
+            # launch latency is only meaningful for sessions we just started
+            self.detector = ReadinessDetector(
+                Path(record.runtime_dir),
+                on_ready=self.serverReady.emit,
+                environment=record.environment if fresh else None,
+                kind=record.kind)
+            self.detector.start()
+
+        self.sampler.watch(record.id, record.pid)
+        self.monitor_timer.start()
+        self.updateStatus("Running")
+
     def start_program(self, event):
-        self.child = subprocess.Popen(
-            self.cmd,
-            stderr=subprocess.STDOUT,
-            stdout=subprocess.PIPE,
-            cwd=os.getcwd(),
+        if self.record is not None:
+            return
+
+        record, child = launch_detached(self.cmd,
+                                        title=self.tipbar,
+                                        cfg=CFG.cfg,
+                                        environment=self.environment,
+                                        kind=self.jupyter_kind)
+        self._follow(record, child, backlog=0, fresh=True)
+
+    def _unfollow(self):
+        if self.tailer is not None:
+            self.tailer.stop()
+            self.tailer = None
+        if self.detector is not None:
+            self.detector.cancel()
+            self.detector = None
+        if self.record is not None:
+            self.sampler.unwatch(self.record.id)
+
+    def on_session_ended(self, returncode):
+        self.updateTerminal(
+            f"[Runner] Program stopped with code {returncode if returncode is not None else 'unknown'}"
         )
+        self._unfollow()
 
-        def _():
-            assert self.child is not None
-            assert self.child.stdout is not None
-
-            while self.child.poll() is None:
-                try:
-                    line = self.child.stdout.readline().decode('utf-8').strip()
-                except UnicodeDecodeError:
-                    line = self.child.stdout.readline().decode('gbk').strip()
-
-                self.updateTerminal(line)
-
-                if not self.stopping:
-                    self.updateStatus("Running")
-
-            self.updateTerminal(
-                f"[Runner] Program stopped with code {self.child.returncode}")
-            self.updateStatus(self.idle_text)
-
-            self.child = None
-            self.stopping = False
+        self.record = None
+        self.child = None
+        self.stopping = False
+        self.updateStatus(self.idle_text)
 
-        threading.Thread(target=_, daemon=True).start()
+    def detach(self, event=None):
+        """Stop following the session but leave it running."""
+        self._unfollow()
+        self.record = None
+        self.child = None
+        self.detachRequested.emit()
 
     def stop_program(self, event):
-        if self.child is not None:
+        if self.record is not None:
             if self.stopping:
                 InfoBar.warning(title="请稍等片刻",
                                 content="程序已经进入中止中的状态",
@@ -125,33 +363,50 @@ class ConsoleExecutionPage(QWidget):
             self.stopping = True
             self.updateStatus("Stopping...")
             self.updateTerminal("Stopping program...")
-            InfoBar.info(
-                title='正在停止程序...',
-                content=
-                "有时 JupyterLab 会无法中止，您可以直接在左侧选择其他 Tab，开启新的 Session。（持续优化中）",
-                orient=Qt.Orientation.Horizontal,
-                isClosable=True,
-                position=InfoBarPosition.TOP_RIGHT,
-                duration=1500,
-                parent=self.topLevelWidget())
-
-            self.child.terminate()
-            time.sleep(0.5)
-            self.child.kill()
-            self.child.wait()
+            InfoBar.info(title='正在停止程序...',
+                         content="正在结束程序及其启动的所有内核进程。",
+                         orient=Qt.Orientation.Horizontal,
+                         isClosable=True,
+                         position=InfoBarPosition.TOP_RIGHT,
+                         duration=1500,
+                         parent=self.topLevelWidget())
+
+            stop_session_async(self.record, self._stopFinished.emit)
+
+    def on_stop_finished(self, stragglers: list[int]):
+        self.stopping = False
+        if not stragglers:
+            return
+
+        self.updateTerminal(
+            f"[Runner] Processes still running after SIGKILL: {stragglers}")
+        InfoBar.error(title='部分进程未能结束',
+                      content=f"以下进程仍在运行：{', '.join(map(str, stragglers))}",
+                      orient=Qt.Orientation.Horizontal,
+                      isClosable=True,
+                      position=InfoBarPosition.TOP_RIGHT,
+                      duration=5000,
+                      parent=self.topLevelWidget())
+
+    def _outputReceived(self, text: str):
+        """A line of session output: indexed, and its block tagged with it."""
+        n = self.index.append(text.rstrip())
+        self.updateTerminal(text)
+
+        block = self.text_edit.document().lastBlock()
+        while block.isValid() and not block.text():
+            block = block.previous()
+        if block.isValid():
+            block.setUserState(n)
 
     def updateTerminal(self, text: str):
         text = text.rstrip() + '\n'
+        line = f"[{datetime.now().strftime('%Y-%m-%d %H:%M:%S.%f')[:-3]}] {text}"
 
-        self.text_edit.append(
-            f"[{datetime.now().strftime('%Y-%m-%d %H:%M:%S.%f')[:-3]}] {text}")
+        self.text_edit.append(line)
         self.text_edit.moveCursor(QTextCursor.MoveOperation.End)
 
         # logger.debug(text)
 
         # Emit the terminalUpdated signal
         self.terminalUpdated.emit(text)
-
-    def __del__(self):
-        if self.child is not None:
-            self.child.kill()
@@ -0,0 +1,55 @@
+from typing import Any, Callable
+
+from PySide6.QtCore import QObject, Signal
+
+from FluentPython.core.jobs import Job, Priority, get_scheduler
+
+
+class JobBridge(QObject):
+    """Submits jobs to the core scheduler and calls back on the UI thread."""
+
+    _done = Signal(object)
+    _progress = Signal(object)
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.scheduler = get_scheduler()
+        self._handlers: dict[int, tuple] = {}
+
+        self._done.connect(self._on_done)
+        self._progress.connect(self._on_progress)
+
+    def submit(self,
+               title: str,
+               fn: Callable[[Job], Any],
+               priority: Priority = Priority.INTERACTIVE,
+               resources: tuple[str, ...] = (),
+               on_success: Callable[[Any], None] | None = None,
+               on_error: Callable[[BaseException], None] | None = None,
+               on_progress: Callable[[Job], None] | None = None) -> Job:
+        job = self.scheduler.submit(title,
+                                    fn,
+                                    priority=priority,
+                                    resources=resources,
+                                    on_done=self._done.emit,
+                                    on_progress=self._progress.emit)
+        # completion is delivered through the event loop, so registering
+        # after submitting cannot miss it
+        self._handlers[job.id] = (on_success, on_error, on_progress)
+        return job
+
+    def _on_done(self, job: Job):
+        handlers = self._handlers.pop(job.id, None)
+        if handlers is None:
+            return
+        on_success, on_error, _ = handlers
+        if job.error is None:
+            if on_success is not None:
+                on_success(job.result)
+        elif on_error is not None:
+            on_error(job.error)
+
+    def _on_progress(self, job: Job):
+        handlers = self._handlers.get(job.id)
+        if handlers is not None and handlers[2] is not None:
+            handlers[2](job)
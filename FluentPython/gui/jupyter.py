@@ -1,12 +1,13 @@
-import socket
 import subprocess
+import uuid
 from dataclasses import dataclass
+from typing import Callable
 
 from loguru import logger
-from PySide6.QtCore import QEvent, QSize, Qt
+from PySide6.QtCore import QEvent, QSize, Qt, Signal
 from PySide6.QtWidgets import (QApplication, QFrame, QHBoxLayout, QLabel,
-                               QLineEdit, QListWidget, QPushButton,
-                               QSizePolicy, QVBoxLayout, QWidget)
+                               QLineEdit, QListWidget, QListWidgetItem,
+                               QPushButton, QSizePolicy, QVBoxLayout, QWidget)
 from qfluentwidgets import Action, BodyLabel, CommandBar
 from qfluentwidgets import FluentIcon as FIF
 from qfluentwidgets import (FluentWindow, InfoBar, InfoBarPosition, LineEdit,
@@ -15,26 +16,32 @@ from qfluentwidgets import (FluentWindow, InfoBar, InfoBarPosition, LineEdit,
                             TitleLabel, VBoxLayout, setFont)
 
 from FluentPython.core.config import CFG, FluentPyVersion
+from FluentPython.core.idle import IdleMonitor, IdleStatus
+from FluentPython.core.introspect import has_module
+from FluentPython.core.kernels import (get_host_version,
+                                       shared_server_command, sync_kernelspecs)
+from FluentPython.core.packages import index_args
+from FluentPython.core.precompile import precompile_if_enabled
+from FluentPython.core.readiness import ServerInfo, median_launch_seconds
+from FluentPython.core.sessions import (SessionRecord, colab_command,
+                                        jupyter_lab_command, live_sessions,
+                                        select_first_unused_port_from,
+                                        set_keep_alive)
+from FluentPython.globals import OperationFailure
 from FluentPython.gui.console import ConsoleExecutionPage
-
-
-def select_first_unused_port_from(start_port: int):
-    p = start_port
-
-    while True:
-        with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as s:
-            try:
-                s.bind(('localhost', p))
-                return p
-            except OSError:
-                p += 1
+from FluentPython.gui.jobs import JobBridge
+from FluentPython.gui.store import EnvironmentStore
 
 
 class PageJupyter(QWidget):
+    _idleWarning = Signal(object)
+    _idleCulled = Signal(object)
 
-    def __init__(self, parent=None):
+    def __init__(self, store: EnvironmentStore, parent=None):
         super().__init__(parent=parent)
 
+        self.store = store
+        self.jobs = JobBridge(self)
         self.setObjectName("JupyterLab")
 
         self.main_layout = VBoxLayout(self)
@@ -54,6 +61,10 @@ class PageJupyter(QWidget):
         act.triggered.connect(self.reload_versions)
         self.toolbar.addAction(act)
 
+        act = Action(FIF.LINK, "会话")
+        act.triggered.connect(self.reattach_live_sessions)
+        self.toolbar.addAction(act)
+
         self.main_layout.addWidget(self.toolbar)
 
         self.h_layout = QHBoxLayout()
@@ -70,14 +81,40 @@ class PageJupyter(QWidget):
 
         self.h_layout.addWidget(self.editing_frame)
 
-        self.reload_versions()
+        self.store.loadingChanged.connect(self.on_loading_changed)
+        self.store.versionsChanged.connect(self.on_versions_changed)
+        if self.store.versions is not None:
+            self.on_versions_changed(self.store.versions)
+        else:
+            self.on_loading_changed(True)
 
         self.clipboard = QApplication.clipboard()
 
+        self.shared_console = None
+        self.consoles: list[ConsoleExecutionPage] = []
+
+        self._idleWarning.connect(self.on_idle_warning)
+        self._idleCulled.connect(self.on_idle_culled)
+        self.idle = IdleMonitor(CFG.cfg,
+                                on_warning=self._idleWarning.emit,
+                                on_culled=self._idleCulled.emit)
+        self.idle.start()
+
     def reload_versions(self):
+        self.store.refresh()
+
+    def on_loading_changed(self, loading: bool):
+        if loading and self.store.versions is None:
+            self.version_list.clear()
+            placeholder = QListWidgetItem("加载中...")
+            placeholder.setFlags(Qt.ItemFlag.NoItemFlags)
+            self.version_list.addItem(placeholder)
+            self.subtitle_label.setText("Jupyter 环境 (loading...)")
+
+    def on_versions_changed(self, versions: list[FluentPyVersion]):
         self.version_list.clear()
 
-        for ver in CFG.list_versions():
+        for ver in versions:
             self.version_list.addItem(
                 f"{ver.name} [{'.'.join(map(str, ver.version))}]")
 
@@ -102,7 +139,7 @@ class PageJupyter(QWidget):
                 f"edit version: name={version_name}, version={version_version}"
             )
 
-            ver = CFG.get_version(version_name)
+            ver = self.store.get(version_name)
 
             assert ver is not None, "Version not found"
 
@@ -130,173 +167,300 @@ class PageJupyter(QWidget):
             colabBtn.clicked.connect(lambda: self.start_colab(ver))
             lo.addWidget(colabBtn)
 
-    def start_jupyter_lab(self, ver: FluentPyVersion):
-        # test if jupyterlab is installed
-        installed = False
-        try:
-            subprocess.check_output(
-                [ver.py_executable, "-m", "jupyterlab", "--version"])
-            logger.info("JupyterLab is already installed")
-            installed = True
-        except subprocess.CalledProcessError:
-            pass
-
-        if not installed:
-            w = MessageBox("警告", "JupyterLab 未安装，是否现在安装？（确认后请等候一下，完成后对话框自动关闭）",
-                           self.topLevelWidget())
-
-            if w.exec():
-                InfoBar.info(title='安装中',
-                             content="正在安装 JupyterLab，请等待...",
-                             orient=Qt.Orientation.Horizontal,
-                             isClosable=True,
-                             position=InfoBarPosition.BOTTOM_LEFT,
-                             duration=100,
-                             parent=self.topLevelWidget())
-
-                cmd = [
-                    ver.py_executable, "-m", "pip", "install", "jupyterlab",
-                    "--index", "https://pypi.tuna.tsinghua.edu.cn/simple"
-                ]
-                logger.debug(f"Running command: {cmd}")
-                subprocess.check_output(cmd)
-
-                InfoBar.success(title='安装成功',
-                                content="JupyterLab 安装成功，将启动 Jupyter Lab...",
-                                orient=Qt.Orientation.Horizontal,
-                                isClosable=True,
-                                position=InfoBarPosition.BOTTOM_LEFT,
-                                duration=1500,
-                                parent=self.topLevelWidget())
+    def _ensure_module(self, ver: FluentPyVersion, module: str,
+                       packages: list[str], label: str,
+                       then: Callable[[], None]):
+        """Call `then` once `module` is importable in `ver`, offering to install it."""
+
+        def checked(installed: bool):
+            if installed:
+                logger.info(f"{label} is already installed in {ver.name}")
+                then()
             else:
-                InfoBar.info(title='已取消',
-                             content="已取消安装，请手动安装 JupyterLab 后再试。",
-                             orient=Qt.Orientation.Horizontal,
-                             isClosable=True,
-                             position=InfoBarPosition.BOTTOM_LEFT,
-                             duration=2000,
-                             parent=self.topLevelWidget())
+                self._offer_install(ver, packages, label, then)
+
+        # a cache miss probes the interpreter in a subprocess
+        self.jobs.submit(f"check {label} in {ver.name}",
+                         lambda job: has_module(ver.py_executable, module),
+                         on_success=checked,
+                         on_error=self._on_job_error)
+
+    def _offer_install(self, ver: FluentPyVersion, packages: list[str],
+                       label: str, then: Callable[[], None]):
+        w = MessageBox("警告", f"环境 {ver.name} 中未安装 {label}，是否现在安装？",
+                       self.topLevelWidget())
+
+        if not w.exec():
+            InfoBar.info(title='已取消',
+                         content=f"已取消安装，请手动安装 {label} 后再试。",
+                         orient=Qt.Orientation.Horizontal,
+                         isClosable=True,
+                         position=InfoBarPosition.BOTTOM_LEFT,
+                         duration=2000,
+                         parent=self.topLevelWidget())
+            return
+
+        InfoBar.info(title='安装中',
+                     content=f"正在安装 {label}，请等待...",
+                     orient=Qt.Orientation.Horizontal,
+                     isClosable=True,
+                     position=InfoBarPosition.BOTTOM_LEFT,
+                     duration=1500,
+                     parent=self.topLevelWidget())
+
+        def install(job):
+            cmd = [
+                str(ver.py_executable), "-m", "pip", "install", *packages,
+                *index_args(CFG.cfg)
+            ]
+            logger.debug(f"Running command: {cmd}")
+            child = subprocess.Popen(cmd,
+                                     stdout=subprocess.PIPE,
+                                     stderr=subprocess.STDOUT)
+            job.attach_process(child)
+            out, _ = child.communicate()
+            job.check_cancelled()
+            if child.returncode != 0:
+                raise OperationFailure(
+                    f"pip install failed: {out.decode(errors='replace')[-500:]}"
+                )
+            precompile_if_enabled(ver, CFG.cfg)
+
+        def on_success(_):
+            InfoBar.success(title='安装成功',
+                            content=f"{label} 安装成功，正在启动...",
+                            orient=Qt.Orientation.Horizontal,
+                            isClosable=True,
+                            position=InfoBarPosition.BOTTOM_LEFT,
+                            duration=1500,
+                            parent=self.topLevelWidget())
+            then()
+
+        self.jobs.submit(f"install {label} into {ver.name}",
+                         install,
+                         resources=(f"pip:{ver.name}", ),
+                         on_success=on_success,
+                         on_error=self._on_job_error)
+
+    def _on_job_error(self, e: BaseException):
+        InfoBar.error(title='出错啦！',
+                      content=str(e),
+                      orient=Qt.Orientation.Horizontal,
+                      isClosable=True,
+                      position=InfoBarPosition.BOTTOM_LEFT,
+                      duration=3000,
+                      parent=self.topLevelWidget())
+
+    def start_shared_jupyter_lab(self, ver: FluentPyVersion):
+
+        def with_host(host: FluentPyVersion | None):
+            if host is None:
+                self._on_job_error(
+                    OperationFailure("Failed to create Jupyter host environment"))
                 return
+            self._ensure_module(host, "jupyterlab", ["jupyterlab"],
+                                "JupyterLab",
+                                lambda: self._launch_shared(ver, host))
+
+        self._ensure_module(
+            ver, "ipykernel", ["ipykernel"], "ipykernel",
+            lambda: self.jobs.submit("prepare Jupyter host",
+                                     lambda job: get_host_version(
+                                         CFG, create=True),
+                                     resources=("disk", ),
+                                     on_success=with_host,
+                                     on_error=self._on_job_error))
+
+    def _launch_shared(self, ver: FluentPyVersion, host: FluentPyVersion):
+
+        def sync(job):
+            CFG.mark_used(ver)
+            sync_kernelspecs(CFG, host)
+
+        self.jobs.submit("sync kernelspecs",
+                         sync,
+                         on_success=lambda _: self._open_shared(ver, host),
+                         on_error=self._on_job_error)
+
+    def _open_shared(self, ver: FluentPyVersion, host: FluentPyVersion):
+        tlw = self.topLevelWidget()
+        assert isinstance(tlw, FluentWindow), "Invalid top level widget"
 
-        cmd = [ver.py_executable, "-m", "jupyter", "lab"]
+        if self.shared_console is not None:
+            tlw.switchTo(self.shared_console)
+            InfoBar.info(title='共享 Jupyter Lab',
+                         content=f"共享服务器已在运行，请在内核列表中选择 {ver.name}。",
+                         orient=Qt.Orientation.Horizontal,
+                         isClosable=True,
+                         position=InfoBarPosition.BOTTOM_LEFT,
+                         duration=2000,
+                         parent=tlw)
+            return
+
+        cmd = shared_server_command(host)
         logger.debug(f"Running command: {cmd}")
 
-        win = ConsoleExecutionPage(
-            cmd,
-            tipbar=f"JupyterLab[{ver.name}, {'.'.join(map(str, ver.version))}]",
-            parent=self.topLevelWidget())
-
-        win.setObjectName("JupyterLab-tmp123")
+        win = ConsoleExecutionPage(cmd,
+                                   tipbar=f"JupyterLab[shared, {host.name}]",
+                                   parent=tlw,
+                                   environment=host.name,
+                                   jupyter_kind="shared")
+        self._open_console(win, "Shared Jupyter Lab")
+
+    def on_server_ready(self,
+                        win: ConsoleExecutionPage,
+                        env_name: str,
+                        kind: str,
+                        info: ServerInfo,
+                        elapsed: float,
+                        copy_url: bool = False):
+        url = info.local_url
+        message = f"【提示】服务器已就绪（用时 {elapsed:.1f}s）：{url}"
+        median = median_launch_seconds(env_name, kind)
+        if median is not None:
+            message += f"（该环境近期中位数 {median:.1f}s）"
+        win.updateTerminal(message)
+
+        if copy_url:
+            self.clipboard.setText(url)
+            win.updateTerminal("【提示】连接成功，连接地址已复制到剪贴板。")
+
+        InfoBar.success(title='启动成功',
+                        content="连接成功，连接地址已复制到剪贴板。"
+                        if copy_url else f"服务器已就绪，用时 {elapsed:.1f}s",
+                        orient=Qt.Orientation.Horizontal,
+                        isClosable=True,
+                        position=InfoBarPosition.BOTTOM_LEFT,
+                        duration=1500,
+                        parent=self.topLevelWidget())
 
-        tlw = self.topLevelWidget()
-        assert isinstance(tlw, FluentWindow), "Invalid top level widget"
-        tlw.addSubInterface(win, FIF.CODE, "[TMP] Jupyter Lab")
-        tlw.switchTo(win)
+    def start_jupyter_lab(self, ver: FluentPyVersion):
+        if CFG.cfg.jupyter_shared_server:
+            return self.start_shared_jupyter_lab(ver)
 
-        def cleanup():
-            win.stop_program(None)
+        self._ensure_module(ver, "jupyterlab", ["jupyterlab"], "JupyterLab",
+                            lambda: self._launch_jupyter_lab(ver))
 
-            tlw.stackedWidget.view.removeWidget(win)
-            tlw.navigationInterface.removeWidget(win.objectName())
+    def _launch_jupyter_lab(self, ver: FluentPyVersion):
+        CFG.mark_used(ver)
+        cmd = jupyter_lab_command(ver)
+        logger.debug(f"Running command: {cmd}")
 
-        tlw.stackedWidget.currentChanged.connect(lambda: cleanup())
+        win = ConsoleExecutionPage(
+            cmd,
+            tipbar=f"JupyterLab[{ver.name}, {'.'.join(map(str, ver.version))}]",
+            parent=self.topLevelWidget(),
+            environment=ver.name,
+            jupyter_kind="jupyterlab")
+        self._open_console(win, f"Jupyter Lab [{ver.name}]")
 
     def start_colab(self, ver: FluentPyVersion):
-        # test if jupyterlab is installed
-        installed = False
-        try:
-            subprocess.check_output(
-                [ver.py_executable, "-m", "notebook", "--version"])
-            logger.info("JupyterNotebook is already installed")
-            installed = True
-        except subprocess.CalledProcessError:
-            pass
-
-        if not installed:
-            w = MessageBox(
-                "警告", "Jupyter Notebook 未安装，是否现在安装？（确认后请等候一下，完成后对话框自动关闭）",
-                self.topLevelWidget())
-
-            if w.exec():
-                InfoBar.info(title='安装中',
-                             content="正在安装 JupyterNotebook，请等待...",
-                             orient=Qt.Orientation.Horizontal,
-                             isClosable=True,
-                             position=InfoBarPosition.BOTTOM_LEFT,
-                             duration=100,
-                             parent=self.topLevelWidget())
-
-                cmd = [
-                    ver.py_executable, "-m", "pip", "install", "notebook",
-                    "jupyterlab", "--index",
-                    "https://pypi.tuna.tsinghua.edu.cn/simple"
-                ]
-                logger.debug(f"Running command: {cmd}")
-                subprocess.check_output(cmd)
-
-                InfoBar.success(
-                    title='安装成功',
-                    content="JupyterNotebook 安装成功，将启动 Jupyter Notebook...",
-                    orient=Qt.Orientation.Horizontal,
-                    isClosable=True,
-                    position=InfoBarPosition.BOTTOM_LEFT,
-                    duration=1500,
-                    parent=self.topLevelWidget())
-            else:
-                InfoBar.info(title='已取消',
-                             content="已取消安装，请手动安装 Jupyter Notebook 后再试。",
-                             orient=Qt.Orientation.Horizontal,
-                             isClosable=True,
-                             position=InfoBarPosition.BOTTOM_LEFT,
-                             duration=2000,
-                             parent=self.topLevelWidget())
-                return
+        self._ensure_module(ver, "notebook", ["notebook", "jupyterlab"],
+                            "Jupyter Notebook",
+                            lambda: self._launch_colab(ver))
 
+    def _launch_colab(self, ver: FluentPyVersion):
+        CFG.mark_used(ver)
         port = select_first_unused_port_from(8888)
 
-        cmd = [
-            ver.py_executable, "-m", "jupyter", "notebook",
-            "--NotebookApp.allow_origin='https://colab.research.google.com'",
-            f"--port={port}", "--no-browser"
-        ]
+        cmd = colab_command(ver, port)
         logger.debug(f"Running command: {cmd}")
 
         win = ConsoleExecutionPage(
             cmd,
             tipbar=f"ColabRt[{ver.name}, {'.'.join(map(str, ver.version))}]",
-            parent=self.topLevelWidget())
+            parent=self.topLevelWidget(),
+            environment=ver.name,
+            jupyter_kind="colab")
+        self._open_console(win, f"Colab Local Runtime [{ver.name}]")
 
-        win.setObjectName("ColabRt-tmp123")
+        win.updateTerminal("【提示】启动后，复制连接地址到 Google Colab 即可连接本地运行时。")
+        win.updateTerminal("【提示 2.0】运行时就绪后会出现一条通知，自动复制连接地址。提示出现后放心粘贴即可。")
 
+    def _open_console(self, win: ConsoleExecutionPage, title: str):
+        """Add a console tab; sessions keep running when it is detached."""
         tlw = self.topLevelWidget()
         assert isinstance(tlw, FluentWindow), "Invalid top level widget"
-        tlw.addSubInterface(win, FIF.CODE, "[TMP] Colab Local Runtime")
-        tlw.switchTo(win)
 
-        tlw.stackedWidget.currentChanged.connect(lambda: cleanup())
+        win.setObjectName(f"Console-{uuid.uuid4().hex[:8]}")
+        win.serverReady.connect(lambda info, elapsed: self.on_server_ready(
+            win, win.environment or "", win.jupyter_kind or "", info, elapsed,
+            copy_url=win.jupyter_kind == "colab"))
 
-        win.updateTerminal("【提示】启动后，复制连接地址到 Google Colab 即可连接本地运行时。")
-        win.updateTerminal("【提示 2.0】运行时就绪后会出现一条通知，自动复制连接地址。提示出现后放心粘贴即可。")
+        if win.jupyter_kind == "shared":
+            self.shared_console = win
 
-        def _termhandler(data: str):
-            logger.debug(f"Terminal output: {data}".strip())
-            if data.startswith("http://localhost:") and "?token=" in data:
-                data = data.replace("/tree", "/")
-                data = data.replace("/lab", "/")
-                self.clipboard.setText(data)
-                InfoBar.success(title='启动成功',
-                                content="连接成功，连接地址已复制到剪贴板。",
-                                orient=Qt.Orientation.Horizontal,
-                                isClosable=True,
-                                position=InfoBarPosition.BOTTOM_LEFT,
-                                duration=1500,
-                                parent=self.topLevelWidget())
-                win.updateTerminal("【提示】连接成功，连接地址已复制到剪贴板。")
-
-        win.terminalUpdated.connect(_termhandler)
-
-        def cleanup():
-            win.stop_program(None)
+        def close():
+            if self.shared_console is win:
+                self.shared_console = None
+            self.consoles.remove(win)
 
+            tlw.switchTo(self)
             tlw.stackedWidget.view.removeWidget(win)
             tlw.navigationInterface.removeWidget(win.objectName())
+            win.deleteLater()
+
+        win.detachRequested.connect(close)
+        win.focused.connect(lambda: win.record is not None and self.idle.touch(
+            win.record.id))
+
+        tlw.addSubInterface(win, FIF.CODE, title)
+        tlw.switchTo(win)
+
+        self.consoles.append(win)
+
+    def attach_session(self, record: SessionRecord):
+        win = ConsoleExecutionPage.attach(record, parent=self.topLevelWidget())
+        self._open_console(win, f"[会话] {record.title}")
+
+    def reattach_live_sessions(self):
+        """Open a console for every running session not shown yet."""
+        attached = {w.record.id for w in self.consoles if w.record is not None}
+        records = [
+            r for r in live_sessions()
+            if r.id not in attached and r.kind is not None
+        ]
+        for record in records:
+            if record.kind == "shared" and self.shared_console is not None:
+                continue
+            logger.info(f"Reattaching session {record.id} ({record.title})")
+            self.attach_session(record)
+
+        if records:
+            InfoBar.info(title='已恢复会话',
+                         content=f"已重新连接 {len(records)} 个正在运行的会话。",
+                         orient=Qt.Orientation.Horizontal,
+                         isClosable=True,
+                         position=InfoBarPosition.BOTTOM_LEFT,
+                         duration=2000,
+                         parent=self.topLevelWidget())
+
+    def on_idle_warning(self, status: IdleStatus):
+        record = status.record
+        bar = InfoBar.warning(
+            title='会话即将关闭',
+            content=
+            f"{record.title} 已空闲 {status.idle_seconds / 60:.0f} 分钟，将在 {status.remaining / 60:.0f} 分钟后自动关闭。",
+            orient=Qt.Orientation.Horizontal,
+            isClosable=True,
+            position=InfoBarPosition.BOTTOM_LEFT,
+            duration=-1,
+            parent=self.topLevelWidget())
+
+        def keep_alive():
+            set_keep_alive(record.id, True)
+            bar.close()
+
+        btn = PushButton("保持运行")
+        btn.clicked.connect(keep_alive)
+        bar.addWidget(btn)
+
+    def on_idle_culled(self, status: IdleStatus):
+        InfoBar.info(title='已关闭空闲会话',
+                     content=
+                     f"{status.record.title} 空闲超过 {CFG.cfg.idle_timeout / 60:.0f} 分钟，已关闭。",
+                     orient=Qt.Orientation.Horizontal,
+                     isClosable=True,
+                     position=InfoBarPosition.BOTTOM_LEFT,
+                     duration=5000,
+                     parent=self.topLevelWidget())
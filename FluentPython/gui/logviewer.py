@@ -0,0 +1,127 @@
+from pathlib import Path
+
+from PySide6.QtCore import Qt
+from PySide6.QtGui import QFont
+from PySide6.QtWidgets import (QHBoxLayout, QPlainTextEdit, QScrollBar,
+                               QVBoxLayout, QWidget)
+from qfluentwidgets import ComboBox, PushButton
+from qfluentwidgets import FluentIcon as FIF
+
+from FluentPython.core.logs import ACTIVE_SEGMENT, MappedLog, open_segment
+
+SCROLL_STEPS = 10000
+
+
+class LogViewerPage(QWidget):
+    """Pages through a session log directory without loading it whole."""
+
+    def __init__(self, log_dir: Path, parent=None):
+        super().__init__(parent)
+
+        self.log_dir = log_dir
+        self.setWindowTitle(f"日志 - {log_dir.name}")
+        self.resize(900, 600)
+
+        self.segment_box = ComboBox(self)
+        self.segment_box.currentIndexChanged.connect(self.open_selected)
+
+        self.reload_button = PushButton(FIF.SYNC, "刷新", self)
+        self.reload_button.clicked.connect(self.reload)
+
+        self.text_view = QPlainTextEdit(self)
+        self.text_view.setReadOnly(True)
+        self.text_view.setFont(QFont('Consolas', 11))
+        self.text_view.setLineWrapMode(QPlainTextEdit.LineWrapMode.NoWrap)
+        self.text_view.setVerticalScrollBarPolicy(
+            Qt.ScrollBarPolicy.ScrollBarAlwaysOff)
+        self.text_view.wheelEvent = self.wheelEvent
+
+        self.scrollbar = QScrollBar(Qt.Orientation.Vertical, self)
+        self.scrollbar.setRange(0, SCROLL_STEPS)
+        self.scrollbar.valueChanged.connect(self.on_scroll)
+
+        top = QHBoxLayout()
+        top.addWidget(self.segment_box, 1)
+        top.addWidget(self.reload_button)
+
+        body = QHBoxLayout()
+        body.addWidget(self.text_view, 1)
+        body.addWidget(self.scrollbar)
+
+        lo = QVBoxLayout(self)
+        lo.addLayout(top)
+        lo.addLayout(body)
+
+        self.log: MappedLog | None = None
+        self.offset = 0
+        self.reload()
+
+    def visible_lines(self):
+        height = self.text_view.viewport().height()
+        return max(1, height // self.text_view.fontMetrics().lineSpacing())
+
+    def reload(self):
+        segments = sorted(p.name for p in self.log_dir.iterdir()
+                          if p.name != ACTIVE_SEGMENT)
+        if (self.log_dir / ACTIVE_SEGMENT).is_file():
+            segments.append(ACTIVE_SEGMENT)
+
+        self.segment_box.blockSignals(True)
+        self.segment_box.clear()
+        self.segment_box.addItems(segments)
+        self.segment_box.setCurrentIndex(len(segments) - 1)
+        self.segment_box.blockSignals(False)
+
+        self.open_selected()
+
+    def open_selected(self):
+        if self.log is not None:
+            self.log.close()
+            self.log = None
+
+        name = self.segment_box.currentText()
+        if not name:
+            self.text_view.setPlainText("(empty)")
+            return
+
+        self.log = open_segment(self.log_dir / name)
+        _, self.offset = self.log.tail(self.visible_lines())
+        self.render()
+
+    def render(self):
+        if self.log is None:
+            return
+        lines, _ = self.log.window(self.offset, self.visible_lines())
+        self.text_view.setPlainText('\n'.join(lines))
+
+        self.scrollbar.blockSignals(True)
+        self.scrollbar.setValue(
+            self.offset * SCROLL_STEPS // self.log.size if self.log.size else 0)
+        self.scrollbar.blockSignals(False)
+
+    def on_scroll(self, value: int):
+        if self.log is None:
+            return
+        self.offset = self.log.line_start(self.log.size * value //
+                                          SCROLL_STEPS)
+        self.render()
+
+    def wheelEvent(self, event):
+        if self.log is None:
+            return
+        steps = -event.angleDelta().y() // 40
+        if steps < 0:
+            self.offset = self.log.back(self.offset, -steps)
+        elif steps > 0:
+            _, self.offset = self.log.window(self.offset, steps)
+        self.render()
+
+    def resizeEvent(self, event):
+        super().resizeEvent(event)
+        self.render()
+
+    def closeEvent(self, event):
+        if self.log is not None:
+            self.log.close()
+            self.log = None
+        super().closeEvent(event)
@@ -0,0 +1,80 @@
+from loguru import logger
+from PySide6.QtCore import QObject, Signal
+
+from FluentPython.core.config import CFG, FluentPyVersion
+from FluentPython.core.jobs import Priority, get_scheduler
+
+
+class EnvironmentStore(QObject):
+    """Application-wide list of environments, scanned off the UI thread.
+
+    Pages subscribe to `versionsChanged` instead of listing environments
+    themselves, so one scan serves every page.
+    """
+
+    versionsChanged = Signal(list)
+    loadingChanged = Signal(bool)
+    scanFailed = Signal(str)
+
+    _scanned = Signal(list)
+    _scanError = Signal(str)
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+
+        self._versions: list[FluentPyVersion] | None = None
+        self._loading = False
+        self._pending = False
+
+        self._scanned.connect(self._on_scanned)
+        self._scanError.connect(self._on_scan_error)
+
+    @property
+    def versions(self) -> list[FluentPyVersion] | None:
+        return self._versions
+
+    @property
+    def loading(self):
+        return self._loading
+
+    def get(self, name: str) -> FluentPyVersion | None:
+        for ver in self._versions or []:
+            if ver.name == name or ver.hash == name:
+                return ver
+        return None
+
+    def refresh(self):
+        if self._loading:
+            # rescan once the running scan finishes, it may already be stale
+            self._pending = True
+            return
+
+        self._set_loading(True)
+        get_scheduler().submit("scan environments",
+                               self._scan,
+                               priority=Priority.INTERACTIVE,
+                               resources=("scan", ))
+
+    def _scan(self, job):
+        try:
+            self._scanned.emit(CFG.list_versions())
+        except Exception as e:
+            logger.exception(e)
+            self._scanError.emit(str(e))
+
+    def _set_loading(self, loading: bool):
+        self._loading = loading
+        self.loadingChanged.emit(loading)
+
+    def _on_scanned(self, versions: list):
+        self._versions = versions
+        self._set_loading(False)
+        self.versionsChanged.emit(versions)
+
+        if self._pending:
+            self._pending = False
+            self.refresh()
+
+    def _on_scan_error(self, message: str):
+        self._set_loading(False)
+        self.scanFailed.emit(message)
@@ -1,10 +1,11 @@
 from dataclasses import dataclass
+from pathlib import Path
 
 from loguru import logger
 from PySide6.QtCore import QSize, Qt
-from PySide6.QtWidgets import (QFrame, QHBoxLayout, QLabel, QLineEdit,
-                               QListWidget, QPushButton, QSizePolicy,
-                               QVBoxLayout, QWidget)
+from PySide6.QtWidgets import (QFileDialog, QFrame, QHBoxLayout, QLabel,
+                               QLineEdit, QListWidget, QListWidgetItem,
+                               QPushButton, QSizePolicy, QVBoxLayout, QWidget)
 from qfluentwidgets import Action, BodyLabel, CommandBar
 from qfluentwidgets import FluentIcon as FIF
 from qfluentwidgets import (InfoBar, InfoBarPosition, LineEdit, ListWidget,
@@ -13,6 +14,11 @@ from qfluentwidgets import (InfoBar, InfoBarPosition, LineEdit, ListWidget,
                             TitleLabel, VBoxLayout, setFont)
 
 from FluentPython.core.config import CFG, FluentPyVersion
+from FluentPython.core.jobs import Priority
+from FluentPython.core.packages import sync_environment
+from FluentPython.core.pkgindex import PackageMatch, get_package_index
+from FluentPython.gui.jobs import JobBridge
+from FluentPython.gui.store import EnvironmentStore
 
 
 @dataclass
@@ -49,9 +55,11 @@ class CreateEnvironmentDialog(MessageBoxBase):
 
 class PageVersions(QWidget):
 
-    def __init__(self, parent=None):
+    def __init__(self, store: EnvironmentStore, parent=None):
         super().__init__(parent=parent)
 
+        self.store = store
+        self.jobs = JobBridge(self)
         self.setObjectName("Versions")
 
         self.main_layout = VBoxLayout(self)
@@ -73,6 +81,14 @@ class PageVersions(QWidget):
 
         self.main_layout.addWidget(self.toolbar)
 
+        self.package_edit = LineEdit()
+        self.package_edit.setPlaceholderText("按已安装的包筛选环境，如 torch>=2")
+        self.package_edit.setClearButtonEnabled(True)
+        self.package_edit.returnPressed.connect(self.query_package)
+        self.main_layout.addWidget(self.package_edit)
+
+        self.package_index = get_package_index()
+
         self.h_layout = QHBoxLayout()
         self.main_layout.addLayout(self.h_layout)
 
@@ -87,12 +103,28 @@ class PageVersions(QWidget):
 
         self.h_layout.addWidget(self.editing_frame)
 
-        self.reload_versions()
+        self.store.loadingChanged.connect(self.on_loading_changed)
+        self.store.versionsChanged.connect(self.on_versions_changed)
+        if self.store.versions is not None:
+            self.on_versions_changed(self.store.versions)
+        else:
+            self.on_loading_changed(True)
 
     def reload_versions(self):
+        self.store.refresh()
+
+    def on_loading_changed(self, loading: bool):
+        if loading and self.store.versions is None:
+            self.version_list.clear()
+            placeholder = QListWidgetItem("加载中...")
+            placeholder.setFlags(Qt.ItemFlag.NoItemFlags)
+            self.version_list.addItem(placeholder)
+            self.subtitle_label.setText("Versions (loading...)")
+
+    def on_versions_changed(self, versions: list[FluentPyVersion]):
         self.version_list.clear()
 
-        for ver in CFG.list_versions():
+        for ver in versions:
             self.version_list.addItem(
                 f"{ver.name} [{'.'.join(map(str, ver.version))}]")
 
@@ -102,6 +134,46 @@ class PageVersions(QWidget):
         else:
             self.subtitle_label.setText("Versions (no versions)")
 
+    def query_package(self):
+        query = self.package_edit.text().strip()
+        if not query:
+            # rebuilding the list drops the filter
+            self.on_versions_changed(self.store.versions or [])
+            return
+
+        versions = list(self.store.versions or [])
+
+        def run(job):
+            self.package_index.update(versions)
+            return self.package_index.which(query)
+
+        self.jobs.submit(
+            f"which-env {query}",
+            run,
+            resources=("scan", ),
+            on_success=lambda matches: self.on_package_matches(query, matches),
+            on_error=self.on_package_query_failed)
+
+    def on_package_matches(self, query: str, matches: list[PackageMatch]):
+        found = {m.environment: m for m in matches}
+        for idx in range(self.version_list.count()):
+            item = self.version_list.item(idx)
+            name = " [".join(item.text().split(" [")[0:-1])
+            m = found.get(name)
+            item.setHidden(m is None)
+            item.setToolTip(f"{m.name}=={m.version}" if m is not None else "")
+
+        self.subtitle_label.setText(f"Versions ({len(found)} 个环境满足 {query})")
+
+    def on_package_query_failed(self, error: BaseException):
+        InfoBar.error(title='查询失败',
+                      content=str(error),
+                      orient=Qt.Orientation.Horizontal,
+                      isClosable=True,
+                      position=InfoBarPosition.BOTTOM_LEFT,
+                      duration=2000,
+                      parent=self.topLevelWidget())
+
     def on_selecting_version(self, current, previous):
         selected_item = self.version_list.currentItem()
         if selected_item:
@@ -117,7 +189,7 @@ class PageVersions(QWidget):
                 f"edit version: name={version_name}, version={version_version}"
             )
 
-            ver = CFG.get_version(version_name)
+            ver = self.store.get(version_name)
 
             assert ver is not None, "Version not found"
 
@@ -157,15 +229,20 @@ class PageVersions(QWidget):
 
             lo.addStretch()
 
+            syncBtn = PushButton(FIF.SYNC, '同步依赖', self.editing_frame)
+            syncBtn.clicked.connect(lambda: self.sync_version(ver))
+
+            lo.addWidget(syncBtn)
+
             removeBtn = PushButton(FIF.DELETE, '移除环境', self.editing_frame)
             removeBtn.clicked.connect(lambda: self.remove_version(ver))
 
             lo.addWidget(removeBtn)
 
     def remove_version(self, ver):
-        try:
-            logger.info(f"remove version: {ver.name}")
-            CFG.remove_environment(ver)
+        logger.info(f"remove version: {ver.name}")
+
+        def on_success(_):
             self.reload_versions()
 
             InfoBar.success(title='成功！',
@@ -174,22 +251,66 @@ class PageVersions(QWidget):
                             position=InfoBarPosition.TOP_RIGHT,
                             duration=1500,
                             parent=self.topLevelWidget())
-        except FileNotFoundError:
+
+        def on_error(e):
             InfoBar.error(title='出错啦！',
-                          content="版本已不存在",
+                          content="版本已不存在" if isinstance(
+                              e, FileNotFoundError) else
+                          f"移除版本 {ver.name} 失败：{e}",
                           isClosable=True,
                           position=InfoBarPosition.TOP_RIGHT,
                           duration=1500,
                           parent=self.topLevelWidget())
-        except Exception as e:
-            logger.exception(e)
+
+        self.jobs.submit(f"remove {ver.name}",
+                         lambda job: CFG.remove_environment(ver),
+                         resources=("disk", ),
+                         on_success=on_success,
+                         on_error=on_error)
+
+    def sync_version(self, ver):
+        path, _ = QFileDialog.getOpenFileName(self, '选择 requirements 文件', '',
+                                              'Requirements (*.txt);;All (*)')
+        if not path:
+            return
+
+        logger.info(f"sync version: {ver.name} <- {path}")
+
+        def on_success(plan):
+            # also restores the subtitle used for progress
+            self.reload_versions()
+            InfoBar.success(
+                title='成功！',
+                content=
+                f"已同步环境 {ver.name}：安装 {len(plan.install)} 个，移除 {len(plan.remove)} 个",
+                isClosable=True,
+                position=InfoBarPosition.TOP_RIGHT,
+                duration=1500,
+                parent=self.topLevelWidget())
+
+        def on_error(e):
+            self.reload_versions()
             InfoBar.error(title='出错啦！',
-                          content=f"移除版本 {ver.name} 失败：{e}",
+                          content=f"同步环境 {ver.name} 失败：{e}",
                           isClosable=True,
                           position=InfoBarPosition.TOP_RIGHT,
                           duration=1500,
                           parent=self.topLevelWidget())
 
+        def on_progress(job):
+            if job.progress is not None:
+                self.subtitle_label.setText(
+                    f"同步 {ver.name}：{job.progress:.0%} {job.message}")
+
+        self.jobs.submit(
+            f"sync {ver.name}",
+            lambda job: sync_environment(ver, Path(path), CFG.cfg, job),
+            priority=Priority.NORMAL,
+            resources=(f"pip:{ver.name}", ),
+            on_success=on_success,
+            on_error=on_error,
+            on_progress=on_progress)
+
     def create_env(self):
         dialog = CreateEnvironmentDialog(self)
         btn_res = dialog.exec()
@@ -206,10 +327,9 @@ class PageVersions(QWidget):
         res = dialog.compile()
 
         if res.name:
-            try:
-                logger.info(f"create environment: {res.name}")
-                ver = CFG.create_environment(res.name, res.interpreter_path
-                                             or None)
+            logger.info(f"create environment: {res.name}")
+
+            def on_success(ver):
                 logger.debug(f"created version: {ver}")
                 self.reload_versions()
                 InfoBar.success(
@@ -220,14 +340,22 @@ class PageVersions(QWidget):
                     position=InfoBarPosition.TOP_RIGHT,
                     duration=1500,
                     parent=self.topLevelWidget())
-            except Exception as e:
-                logger.exception(e)
+
+            def on_error(e):
                 InfoBar.error(title='出错啦！',
                               content=f"创建环境 {res.name} 失败：{e}",
                               isClosable=True,
                               position=InfoBarPosition.TOP_RIGHT,
                               duration=1500,
                               parent=self.topLevelWidget())
+
+            self.jobs.submit(
+                f"create {res.name}",
+                lambda job: CFG.create_environment(
+                    res.name, res.interpreter_path or None),
+                resources=("disk", ),
+                on_success=on_success,
+                on_error=on_error)
         else:
             InfoBar.warning(title='警告！',
                             content="环境名称不能为空（但是解释器路径可以）",
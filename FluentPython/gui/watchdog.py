@@ -0,0 +1,111 @@
+import statistics
+import sys
+import threading
+import time
+import traceback
+from collections import Counter
+
+from loguru import logger
+from PySide6.QtCore import QObject, QTimer
+
+PACKAGE_MARKER = 'FluentPython'
+
+
+def _blamed_frame(stack: traceback.StackSummary) -> str:
+    """The innermost frame in our own code, which is what blocked the loop."""
+    for frame in reversed(stack):
+        if PACKAGE_MARKER in frame.filename:
+            return f"{frame.filename}:{frame.lineno} in {frame.name}"
+    frame = stack[-1]
+    return f"{frame.filename}:{frame.lineno} in {frame.name}"
+
+
+class StallWatchdog(QObject):
+    """Detects stalls of the Qt event loop from a background thread.
+
+    A timer on the UI thread records a heartbeat every `interval` seconds;
+    the watchdog thread logs the main thread's stack once the heartbeat is
+    `threshold` seconds late, and the full duration once it resumes.
+    """
+
+    def __init__(self,
+                 threshold: float = 0.5,
+                 interval: float = 0.1,
+                 parent=None):
+        super().__init__(parent)
+        self.threshold = threshold
+        self.interval = interval
+
+        self._main_ident = threading.main_thread().ident
+        self._last_beat = time.monotonic()
+        self._stall_started: float | None = None
+        self._stall_site: str | None = None
+
+        self.durations: list[float] = []
+        self.sites: Counter[str] = Counter()
+
+        self._timer = QTimer(self)
+        self._timer.setInterval(int(interval * 1000))
+        self._timer.timeout.connect(self._beat)
+        self._stop = threading.Event()
+        self._thread = None
+
+    def _beat(self):
+        self._last_beat = time.monotonic()
+
+    def start(self):
+        self._beat()
+        self._timer.start()
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run,
+                                        name="StallWatchdog",
+                                        daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._timer.stop()
+
+    def _run(self):
+        while not self._stop.wait(self.interval / 2):
+            late = time.monotonic() - self._last_beat - self.interval
+
+            if late >= self.threshold and self._stall_started is None:
+                self._stall_started = self._last_beat + self.interval
+                self._capture(late)
+            elif late < self.threshold and self._stall_started is not None:
+                duration = self._last_beat - self._stall_started
+                self.durations.append(duration)
+                self.sites[self._stall_site or "<unknown>"] += 1
+                logger.warning(
+                    f"UI event loop was blocked for {duration:.2f}s at {self._stall_site}"
+                )
+                self._stall_started = None
+                self._stall_site = None
+
+    def _capture(self, late: float):
+        frame = sys._current_frames().get(self._main_ident)
+        if frame is None:
+            return
+        stack = traceback.extract_stack(frame)
+        self._stall_site = _blamed_frame(stack)
+        logger.warning(
+            f"UI event loop blocked for {late:.2f}s so far; main thread stack:\n"
+            + "".join(stack.format()))
+
+    def report(self):
+        """Log aggregate stall statistics; meant to run at exit."""
+        if not self.durations:
+            logger.info("Stall watchdog: no UI stalls recorded")
+            return
+
+        durations = sorted(self.durations)
+        p95 = durations[min(len(durations) - 1, int(len(durations) * 0.95))]
+        lines = [
+            f"Stall watchdog: {len(durations)} stalls, "
+            f"total {sum(durations):.2f}s, median {statistics.median(durations):.2f}s, "
+            f"p95 {p95:.2f}s, max {durations[-1]:.2f}s"
+        ]
+        for site, count in self.sites.most_common(10):
+            lines.append(f"  {count:4d}x {site}")
+        logger.info("\n".join(lines))
@@ -0,0 +1,88 @@
+"""The agent protocol, over a real `python -m FluentPython.core agent`.
+
+The client talks to the agent through the agent's stdin and stdout,
+exactly as it would through ssh, so this covers process startup, line
+framing, pipelining and batches as well as the handlers themselves.
+"""
+import json
+import subprocess
+import sys
+from pathlib import Path
+
+import pytest
+
+from FluentPython.core.agent import INVALID_PARAMS, OPERATION_FAILED, Agent
+from FluentPython.globals import OperationFailure
+
+REPO = Path(__file__).resolve().parents[1]
+AGENT = [sys.executable, "-m", "FluentPython.core", "agent"]
+
+
+@pytest.fixture
+def home(tmp_path, monkeypatch):
+    # the agent inherits this environment and working directory
+    monkeypatch.setenv("HOME", str(tmp_path))
+    monkeypatch.setenv("USERPROFILE", str(tmp_path))
+    monkeypatch.chdir(REPO)
+    return tmp_path
+
+
+@pytest.fixture
+def remote(home):
+    from FluentPython.core.agent import RemoteConfig
+
+    res = RemoteConfig(AGENT)
+    yield res
+    res.close()
+
+
+def test_round_trip(remote):
+    assert remote.call("ping") == "pong"
+    assert remote.cfg.preferred_python_interpreter
+    assert remote.list_versions() == []
+    assert remote.get_version("missing") is None
+    assert remote.list_sessions() == []
+
+
+def test_pipelined_and_batched(remote):
+    futures = [remote.submit("ping") for _ in range(8)]
+    assert [f.result(timeout=30) for f in futures] == ["pong"] * 8
+    assert remote.batch([("ping", ), ("list_versions", ),
+                         ("get_version", "missing")]) == ["pong", [], None]
+
+
+def test_errors(remote):
+    with pytest.raises(OperationFailure, match="Unknown method"):
+        remote.call("no_such_method")
+    with pytest.raises(OperationFailure, match="not found"):
+        remote.stop_session("missing")
+
+
+def test_raw_lines(home):
+    lines = [
+        {"jsonrpc": "2.0", "method": "ping"},
+        {"jsonrpc": "2.0", "id": 1, "method": "get_version", "params": []},
+        {"jsonrpc": "2.0", "id": 2, "method": "ping"},
+    ]
+    out = subprocess.run(AGENT,
+                         input="".join(json.dumps(l) + "\n" for l in lines),
+                         capture_output=True,
+                         text=True,
+                         timeout=60).stdout
+    responses = {r["id"]: r for r in map(json.loads, out.splitlines())}
+
+    # the notification gets no reply at all
+    assert set(responses) == {1, 2}
+    assert responses[1]["error"]["code"] == INVALID_PARAMS
+    assert responses[2]["result"] == "pong"
+
+
+def test_type_error_inside_handler_is_not_invalid_params():
+    agent = Agent(gcfg=None)
+
+    def broken():
+        return len(None)
+
+    agent.methods["broken"] = broken
+    response = agent.handle({"jsonrpc": "2.0", "id": 1, "method": "broken"})
+    assert response["error"]["code"] == OPERATION_FAILED
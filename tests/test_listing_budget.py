@@ -0,0 +1,90 @@
+"""Warm listings must stay on the fingerprint fast path.
+
+`list_versions()` and `get_version()` run on every refresh and from the
+session server's scheduler, so once environments are fingerprinted they
+must not start interpreters, create directories or read files. Audit
+events cover processes, directory listings and opens; `os.stat` raises
+no audit event, so it is counted by wrapping it.
+"""
+import os
+import sys
+from collections import Counter
+
+import pytest
+
+ENVIRONMENTS = ("budget-a", "budget-b")
+# per warm call: the environments directory is listed once, and each
+# environment costs a directory check plus the fingerprint's mtimes
+LISTDIR_BUDGET = 1
+STAT_BUDGET_PER_ENV = 4
+
+_counting = False
+_events = Counter()
+
+
+def _audit(event, args):
+    if _counting:
+        _events[event] += 1
+
+
+sys.addaudithook(_audit)
+
+
+@pytest.fixture(scope="module")
+def gcfg(tmp_path_factory):
+    home = tmp_path_factory.mktemp("home")
+    patch = pytest.MonkeyPatch()
+    patch.setenv("HOME", str(home))
+    patch.setenv("USERPROFILE", str(home))
+
+    from FluentPython.core.config import _GlobalConfig
+
+    patch.setattr(_GlobalConfig, "_environments_dir", None)
+    res = _GlobalConfig()
+    for name in ENVIRONMENTS:
+        res.create_environment(name, sys.executable)
+
+    # the first listing validates and fingerprints
+    res.list_versions()
+
+    yield res
+    patch.undo()
+
+
+@pytest.fixture
+def budget(monkeypatch):
+    global _counting
+    stats = Counter()
+    real_stat = os.stat
+
+    def counting_stat(*args, **kwargs):
+        if _counting:
+            stats["os.stat"] += 1
+        return real_stat(*args, **kwargs)
+
+    monkeypatch.setattr(os, "stat", counting_stat)
+    _events.clear()
+    _counting = True
+    try:
+        yield _events, stats
+    finally:
+        _counting = False
+
+
+@pytest.mark.parametrize(
+    "call", [
+        lambda cfg: cfg.list_versions(),
+        lambda cfg: cfg.get_version(ENVIRONMENTS[-1]),
+    ],
+    ids=["list_versions", "get_version"])
+def test_warm_listing_budget(gcfg, budget, call):
+    events, stats = budget
+
+    res = call(gcfg)
+
+    assert res
+    assert events["subprocess.Popen"] == 0
+    assert events["os.mkdir"] == 0
+    assert events["open"] == 0
+    assert events["os.listdir"] + events["os.scandir"] <= LISTDIR_BUDGET
+    assert stats["os.stat"] <= STAT_BUDGET_PER_ENV * len(ENVIRONMENTS)